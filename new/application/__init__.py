@@ -1,5 +1,9 @@
 """Application层 - 应用服务"""
 from .workflow_engine import WorkflowEngine
 from .team_orchestrator import TeamOrchestrator
+from .session_manager import Session, SessionManager
+from .job_queue import Job, JobQueue
+from .round_policy import RoundPolicy, FixedRoundPolicy, AdaptiveRoundPolicy
 
-__all__ = ['WorkflowEngine', 'TeamOrchestrator']
+__all__ = ['WorkflowEngine', 'TeamOrchestrator', 'Session', 'SessionManager', 'Job', 'JobQueue',
+           'RoundPolicy', 'FixedRoundPolicy', 'AdaptiveRoundPolicy']
@@ -0,0 +1,113 @@
+"""
+共识预检 - 在调用大模型判断共识之前，用本地文本相似度快速分类一轮讨论
+"""
+import math
+import re
+from typing import Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # 未安装NumPy时使用纯Python实现
+    np = None
+
+
+DIVERGENT = "divergent"
+CONVERGENT = "convergent"
+UNCERTAIN = "uncertain"
+
+_IGNORED_CHARS = re.compile(r"[\s\W_]+", re.UNICODE)
+
+
+def _ngrams(text: str, n: int) -> List[str]:
+    """去掉空白和标点后按字符切分n-gram（中文没有分词边界，字符二元组即可反映用词重合）"""
+    text = _IGNORED_CHARS.sub("", text.lower())
+    if len(text) <= n:
+        return [text] if text else []
+    return [text[i:i + n] for i in range(len(text) - n + 1)]
+
+
+class ConsensusPrecheck:
+    """
+    共识预检
+
+    将一轮中的每条意见表示为字符n-gram的TF-IDF向量，计算两两余弦相似度的平均值：
+    低于divergent_below时判定为明显分歧（无需调用大模型判断），
+    高于convergent_above时判定为明显一致（只需让大模型总结共识），其余为不确定。
+    安装了NumPy时整轮一次向量化计算，否则使用纯Python实现。
+    """
+
+    def __init__(self, divergent_below: float = 0.1, convergent_above: float = 0.7, ngram: int = 2):
+        self.divergent_below = divergent_below
+        self.convergent_above = convergent_above
+        self.ngram = ngram
+
+    def classify(self, texts: List[str]) -> str:
+        """判定一轮意见的一致程度：divergent、convergent或uncertain"""
+        return self.verdict(self.similarity(texts))
+
+    def verdict(self, similarity: Optional[float]) -> str:
+        """按已计算的相似度判定一致程度"""
+        if similarity is None:
+            return UNCERTAIN
+        if similarity < self.divergent_below:
+            return DIVERGENT
+        if similarity > self.convergent_above:
+            return CONVERGENT
+        return UNCERTAIN
+
+    def similarity(self, texts: List[str]) -> Optional[float]:
+        """意见两两之间TF-IDF余弦相似度的平均值，意见少于2条时返回None"""
+        documents = [_ngrams(text, self.ngram) for text in texts]
+        documents = [document for document in documents if document]
+        if len(documents) < 2:
+            return None
+        if np is not None:
+            return self._similarity_numpy(documents)
+        return self._similarity_python(documents)
+
+    @staticmethod
+    def _similarity_numpy(documents: List[List[str]]) -> float:
+        """向量化计算：词频矩阵 → TF-IDF → 行归一化 → 相似度矩阵上三角的平均值"""
+        vocabulary: Dict[str, int] = {}
+        for document in documents:
+            for term in document:
+                vocabulary.setdefault(term, len(vocabulary))
+        counts = np.zeros((len(documents), len(vocabulary)))
+        for row, document in enumerate(documents):
+            np.add.at(counts[row], [vocabulary[term] for term in document], 1)
+        tf = counts / counts.sum(axis=1, keepdims=True)
+        df = np.count_nonzero(counts, axis=0)
+        idf = np.log((1 + len(documents)) / (1 + df)) + 1
+        vectors = tf * idf
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        similarities = vectors @ vectors.T
+        upper = np.triu_indices(len(documents), k=1)
+        return float(similarities[upper].mean())
+
+    @staticmethod
+    def _similarity_python(documents: List[List[str]]) -> float:
+        """纯Python实现（与NumPy实现结果一致）"""
+        term_counts = []
+        df: Dict[str, int] = {}
+        for document in documents:
+            counts: Dict[str, int] = {}
+            for term in document:
+                counts[term] = counts.get(term, 0) + 1
+            term_counts.append(counts)
+            for term in counts:
+                df[term] = df.get(term, 0) + 1
+        vectors = []
+        for document, counts in zip(documents, term_counts):
+            vector = {
+                term: count / len(document) * (math.log((1 + len(documents)) / (1 + df[term])) + 1)
+                for term, count in counts.items()
+            }
+            norm = math.sqrt(sum(value * value for value in vector.values()))
+            vectors.append({term: value / norm for term, value in vector.items()})
+        total = 0.0
+        pairs = 0
+        for i in range(len(vectors)):
+            for j in range(i + 1, len(vectors)):
+                total += sum(value * vectors[j].get(term, 0.0) for term, value in vectors[i].items())
+                pairs += 1
+        return total / pairs
@@ -0,0 +1,209 @@
+"""
+任务队列 - 在后台线程中执行耗时的需求处理
+"""
+import queue
+import threading
+import uuid
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+
+@dataclass
+class Job:
+    """后台作业"""
+    id: str
+    payload: Dict
+    status: str = "queued"  # queued, running, succeeded, failed, cancelled
+    result: Any = None
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    serial_key: Optional[str] = None    # 相同键的作业依次执行
+    _cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    _done_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def is_cancelled(self) -> bool:
+        """是否已请求取消（供执行函数在检查点轮询）"""
+        return self._cancel_event.is_set()
+
+    def is_finished(self) -> bool:
+        """是否已结束"""
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待作业结束"""
+        return self._done_event.wait(timeout)
+
+    def to_dict(self) -> dict:
+        """转换为字典"""
+        return {
+            "id": self.id,
+            "status": self.status,
+            "payload": self.payload,
+            "error": self.error,
+            "created_at": self.created_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "started_at": self.started_at.strftime("%Y-%m-%d %H:%M:%S") if self.started_at else None,
+            "finished_at": self.finished_at.strftime("%Y-%m-%d %H:%M:%S") if self.finished_at else None
+        }
+
+
+class JobQueue:
+    """
+    作业队列
+
+    固定数量的工作线程从有界队列中取出作业执行；队列已满时拒绝新作业，
+    由调用方决定如何提示（例如返回429）。排队中的作业取消后直接跳过，
+    执行中的作业只设置取消标志，由执行函数在检查点（如讨论轮次之间）自行退出。
+
+    带serial_key的作业按键串行：同一个键同时只有一个作业交给工作线程（排队或执行中），
+    其余作业在队列外按提交顺序等待，前一个结束后才派发。工作线程因此不会被同一个键的作业占满。
+    """
+
+    def __init__(self, max_workers: int = 1, max_queue_depth: int = 10, max_finished_jobs: int = 100):
+        """
+        Args:
+            max_workers: 工作线程数
+            max_queue_depth: 等待执行的作业上限
+            max_finished_jobs: 保留的已结束作业数，超出后淘汰最早结束的作业
+        """
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self.max_finished_jobs = max_finished_jobs
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue_depth)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._finished_ids: List[str] = []
+        # 按键串行：已派发作业的键，以及每个键等待派发的作业
+        self._dispatched_keys = set()
+        self._held: Dict[str, Deque[Tuple[Job, Callable]]] = {}
+        self._held_count = 0
+        self._lock = threading.Lock()
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, fn: Callable[[Job], Any], payload: Optional[Dict] = None,
+               serial_key: Optional[str] = None) -> Optional[Job]:
+        """
+        提交作业
+
+        Args:
+            fn: 执行函数，接收Job本身（可通过job.is_cancelled()检查取消），返回值作为作业结果
+            payload: 作业参数，仅用于展示
+            serial_key: 串行键（如会话ID），相同键的作业依次执行
+
+        Returns:
+            Job，队列已满（包括按键等待的作业）时返回None
+        """
+        job = Job(id=str(uuid.uuid4()), payload=payload or {}, serial_key=serial_key)
+        with self._lock:
+            if self._queue.qsize() + self._held_count >= self.max_queue_depth:
+                return None
+            if serial_key is not None and serial_key in self._dispatched_keys:
+                self._held.setdefault(serial_key, deque()).append((job, fn))
+                self._held_count += 1
+            else:
+                self._queue.put_nowait((job, fn))
+                if serial_key is not None:
+                    self._dispatched_keys.add(serial_key)
+            self._jobs[job.id] = job
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        """获取作业"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """取消作业，作业不存在时返回None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.is_finished():
+                return job
+            job._cancel_event.set()
+            if job.status == "queued":
+                self._finish(job, "cancelled")
+            return job
+
+    def has_pending(self, serial_key: str) -> bool:
+        """该键是否有尚未结束的作业（排队、执行中或等待派发）"""
+        with self._lock:
+            return serial_key in self._dispatched_keys
+
+    def get_stats(self) -> Dict:
+        """获取队列统计"""
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                "max_workers": self.max_workers,
+                "max_queue_depth": self.max_queue_depth,
+                "queued": counts.get("queued", 0),
+                "held": self._held_count,
+                "running": counts.get("running", 0),
+                "succeeded": counts.get("succeeded", 0),
+                "failed": counts.get("failed", 0),
+                "cancelled": counts.get("cancelled", 0)
+            }
+
+    def _worker_loop(self):
+        """工作线程主循环"""
+        while True:
+            job, fn = self._queue.get()
+            try:
+                with self._lock:
+                    if job.is_finished():
+                        continue  # 排队期间已被取消
+                    job.status = "running"
+                    job.started_at = datetime.now()
+
+                try:
+                    result = fn(job)
+                except Exception as e:
+                    with self._lock:
+                        # 请求取消后执行函数在检查点抛出的异常视为取消
+                        if job.is_cancelled():
+                            self._finish(job, "cancelled")
+                        else:
+                            job.error = str(e)
+                            self._finish(job, "failed")
+                else:
+                    with self._lock:
+                        job.result = result
+                        self._finish(job, "succeeded")
+            finally:
+                if job.serial_key is not None:
+                    with self._lock:
+                        self._dispatch_next(job.serial_key)
+                self._queue.task_done()
+
+    def _dispatch_next(self, serial_key: str):
+        """派发该键下一个等待的作业，没有时释放该键（调用方持有锁）"""
+        held = self._held.get(serial_key)
+        while held:
+            job, fn = held.popleft()
+            self._held_count -= 1
+            if not job.is_finished():     # 等待期间被取消的作业直接丢弃
+                self._queue.put_nowait((job, fn))
+                break
+        else:
+            self._dispatched_keys.discard(serial_key)
+        if not held:
+            self._held.pop(serial_key, None)
+
+    def _finish(self, job: Job, status: str):
+        """结束作业并淘汰过旧的已结束作业（调用方持有锁）"""
+        job.status = status
+        job.finished_at = datetime.now()
+        job._done_event.set()
+        self._finished_ids.append(job.id)
+        while len(self._finished_ids) > self.max_finished_jobs:
+            self._jobs.pop(self._finished_ids.pop(0), None)
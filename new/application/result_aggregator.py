@@ -0,0 +1,87 @@
+"""
+结果汇总 - 以map-reduce方式逐层压缩子任务结果，供总agent生成最终反馈
+"""
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+
+
+class ResultAggregator:
+    """
+    分层汇总器
+
+    map：每个子任务结果到达后立即开始压缩（与仍在执行的任务重叠），
+    不超过digest_threshold字的结果直接使用原文。
+    reduce：同一层凑满fan_in条摘要时立即合并为上一层的一条摘要；所有结果到达后，
+    剩余的摘要继续按fan_in分组合并，直到不超过fan_in条，作为最终汇总调用的输入。
+
+    digest(text)、merge(texts)返回None表示调用失败，此时分别退回为截断的原文、拼接的输入。
+    """
+
+    def __init__(self, digest: Callable[[str], Awaitable[Optional[str]]],
+                 merge: Callable[[List[str]], Awaitable[Optional[str]]],
+                 fan_in: int = 4, digest_threshold: int = 300):
+        if fan_in < 2:
+            raise ValueError("fan_in必须不小于2")
+        self._digest = digest
+        self._merge = merge
+        self.fan_in = fan_in
+        self.digest_threshold = digest_threshold
+        self._levels: List[List[str]] = []     # 各层尚未合并的摘要
+        self._pending = set()                   # 进行中的压缩、合并任务
+        self.calls = 0                          # 发起的压缩、合并调用次数
+
+    def add(self, text: str):
+        """加入一条子任务结果（需在事件循环中调用）"""
+        if len(text) <= self.digest_threshold:
+            self._push(0, text)
+            return
+        self._spawn(self._run_digest(text))
+
+    async def reduce(self) -> List[str]:
+        """等待所有结果压缩完毕，返回不超过fan_in条的摘要"""
+        while self._pending:
+            await asyncio.gather(*list(self._pending))
+        items = [item for level in self._levels for item in level]
+        self._levels = []
+        while len(items) > self.fan_in:
+            groups = [items[i:i + self.fan_in] for i in range(0, len(items), self.fan_in)]
+            items = await asyncio.gather(*(
+                self._merge_group(group) if len(group) > 1 else self._identity(group[0]) for group in groups
+            ))
+        return list(items)
+
+    def cancel(self):
+        """取消进行中的压缩、合并"""
+        for task in self._pending:
+            task.cancel()
+
+    def _spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def _push(self, level: int, text: str):
+        """加入第level层，凑满fan_in条时合并为上一层的一条"""
+        while len(self._levels) <= level:
+            self._levels.append([])
+        self._levels[level].append(text)
+        if len(self._levels[level]) >= self.fan_in:
+            group, self._levels[level] = self._levels[level], []
+            self._spawn(self._run_merge(level + 1, group))
+
+    async def _run_digest(self, text: str):
+        self.calls += 1
+        digest = await self._digest(text)
+        self._push(0, digest if digest else text[:self.digest_threshold])
+
+    async def _run_merge(self, level: int, group: List[str]):
+        self._push(level, await self._merge_group(group))
+
+    async def _merge_group(self, group: List[str]) -> str:
+        self.calls += 1
+        merged = await self._merge(group)
+        return merged if merged else "\n".join(group)
+
+    @staticmethod
+    async def _identity(text: str) -> str:
+        return text
@@ -0,0 +1,96 @@
+"""
+轮次策略 - 每轮讨论结束后决定继续讨论、判断共识还是直接强制达成共识
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional
+
+
+CONTINUE = "continue"   # 不判断共识，直接进入下一轮
+CHECK = "check"         # 判断是否达成共识，未达成则进入下一轮（已是最后一轮时强制达成共识）
+FORCE = "force"         # 不再讨论，直接强制达成共识
+
+
+@dataclass
+class RoundSignals:
+    """一轮讨论结束时可观测的信号"""
+    round: int
+    max_rounds: int
+    # 本轮意见相对之前各轮的新颖度（1减去TF-IDF余弦相似度），第一轮或无意见时为None
+    novelty: Optional[float]
+    # 本轮意见两两之间的平均相似度（与共识预检相同的计算），意见少于2条时为None
+    similarity: Optional[float]
+    elapsed: float          # 讨论开始至今的耗时（秒）
+    tokens_used: int        # 讨论至今消耗的token
+
+
+@dataclass
+class RoundDecision:
+    """策略的一次决定"""
+    action: str
+    reason: str
+
+    def to_dict(self, signals: RoundSignals) -> Dict:
+        """与决定依据的信号一起转换为字典（用于遥测）"""
+        return dict(asdict(signals), action=self.action, reason=self.reason)
+
+
+class RoundPolicy(ABC):
+    """轮次策略基类：子类实现decide"""
+
+    @abstractmethod
+    def decide(self, signals: RoundSignals) -> RoundDecision:
+        """根据一轮结束时的信号决定下一步"""
+
+
+class FixedRoundPolicy(RoundPolicy):
+    """固定策略：从第check_from_round轮开始每轮判断共识，直到最大轮数"""
+
+    def __init__(self, check_from_round: int = 2):
+        self.check_from_round = check_from_round
+
+    def decide(self, signals: RoundSignals) -> RoundDecision:
+        if signals.round < self.check_from_round:
+            return RoundDecision(CONTINUE, "未到判断共识的轮次")
+        return RoundDecision(CHECK, "固定轮次判断共识")
+
+
+class AdaptiveRoundPolicy(RoundPolicy):
+    """
+    自适应策略
+
+    按以下顺序决定：
+    1. 预计再进行一轮会超出token预算（token_budget）或时间预算（time_budget）时强制达成共识，
+       每轮的消耗按已进行各轮的平均值估计
+    2. 本轮新颖度低于novelty_floor（讨论在重复之前的内容）时强制达成共识
+    3. 达到check_from_round轮，或本轮意见相似度已高于early_check_similarity时判断共识
+    4. 否则继续讨论
+    """
+
+    def __init__(self, check_from_round: int = 2, early_check_similarity: float = 0.5,
+                 novelty_floor: float = 0.2, token_budget: Optional[int] = None,
+                 time_budget: Optional[float] = None):
+        self.check_from_round = check_from_round
+        self.early_check_similarity = early_check_similarity
+        self.novelty_floor = novelty_floor
+        self.token_budget = token_budget
+        self.time_budget = time_budget
+
+    def decide(self, signals: RoundSignals) -> RoundDecision:
+        if signals.round < signals.max_rounds:
+            if self._exceeds(self.token_budget, signals.tokens_used, signals.round):
+                return RoundDecision(FORCE, "token预算不足以再进行一轮")
+            if self._exceeds(self.time_budget, signals.elapsed, signals.round):
+                return RoundDecision(FORCE, "时间预算不足以再进行一轮")
+        if signals.novelty is not None and signals.novelty < self.novelty_floor:
+            return RoundDecision(FORCE, "本轮意见缺少新内容")
+        if signals.round >= self.check_from_round:
+            return RoundDecision(CHECK, "达到判断共识的轮次")
+        if signals.similarity is not None and signals.similarity >= self.early_check_similarity:
+            return RoundDecision(CHECK, "意见已趋于一致，提前判断共识")
+        return RoundDecision(CONTINUE, "意见尚未收敛")
+
+    @staticmethod
+    def _exceeds(budget: Optional[float], used: float, rounds: int) -> bool:
+        """按每轮平均消耗估计，再进行一轮是否会超出预算"""
+        return budget is not None and used + used / rounds > budget
@@ -0,0 +1,268 @@
+"""
+会话管理 - 每个会话拥有独立的编排器和状态
+"""
+import hashlib
+import hmac
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from infrastructure.admission import TokenBucket
+from infrastructure.ai_service import AIService, AIConfig, ModelProfile
+from infrastructure.async_ai_service import create_async_ai_service
+from infrastructure.concurrency import SharedLimiter
+from infrastructure.state_backend import StateBackend
+from application.workflow_engine import WorkflowEngine
+from application.team_orchestrator import TeamOrchestrator
+from application.round_policy import RoundPolicy
+from application.job_queue import JobQueue
+
+# 无需申请即可使用的默认会话
+DEFAULT_SESSION_ID = "default"
+
+
+class InvalidSessionError(Exception):
+    """会话ID不是由本服务签发的"""
+    pass
+
+
+class SessionLimitError(Exception):
+    """会话数已达上限且没有可回收的会话"""
+    pass
+
+
+@dataclass
+class Session:
+    """
+    会话
+
+    lock用于串行化同一会话内修改状态的操作（处理需求、执行任务、编辑计划等），
+    不同会话之间互不阻塞。job_queue为处理需求的作业队列，会话ID即作业的串行键。
+    """
+    id: str
+    orchestrator: TeamOrchestrator
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    job_queue: Optional[JobQueue] = field(default=None, repr=False)
+    created_at: float = field(default_factory=time.time)
+    last_active: float = field(default_factory=time.time)
+
+    def touch(self):
+        """记录最近一次访问"""
+        self.last_active = time.time()
+
+    def is_busy(self) -> bool:
+        """会话是否正在使用：有修改操作、未结束的作业（排队或等待派发）或事件流订阅者"""
+        return (
+            self.lock.locked()
+            or (self.job_queue is not None and self.job_queue.has_pending(self.id))
+            or self.orchestrator.event_bus.subscriber_count() > 0
+        )
+
+    def has_state(self) -> bool:
+        """会话是否已有团队、讨论或计划"""
+        store = self.orchestrator.state_store
+        return any(obj is not None for obj in (
+            store.get_current_team(), store.get_current_discussion(), store.get_current_plan()
+        ))
+
+    def to_dict(self) -> dict:
+        """转换为字典"""
+        return {
+            "id": self.id,
+            "stage": self.orchestrator.current_stage,
+            "busy": self.is_busy(),
+            "created_at": self.created_at,
+            "last_active": self.last_active
+        }
+
+
+class SessionManager:
+    """
+    会话管理器
+
+    按会话ID惰性创建编排器，所有会话共享同一个AI服务（连接池、缓存、单飞合并）、
+    工作流引擎和任务并发限制器，各自持有独立的状态存储、事件总线和阶段信息。
+    超过session_ttl未访问且空闲的会话会被回收。
+
+    会话ID由issue_session_id签发（随机ID加HMAC签名），除默认会话外只接受签名有效的ID，
+    客户端无法用任意ID创建会话；签发按客户端限速，单个客户端无法大量申请会话挤占其他会话。
+    会话数达到max_sessions时只回收不会丢失状态的空闲会话（尚无状态，或状态已由state_backend持久化），
+    最久未访问的优先；没有可回收的会话时拒绝创建新会话。
+
+    Args:
+        max_concurrent_tasks: 所有会话同时执行的任务总数上限
+        max_tasks_per_plan: 单个计划同时执行的任务数上限
+        max_tasks_per_agent: 单个计划中同一负责人同时执行的任务数上限
+        summary_fan_in: 汇总子任务结果时每次合并的摘要条数（见ResultAggregator）
+        task_timeout: 单个任务的执行超时（秒）
+        model_profiles: 各调用点的模型配置（见WorkflowEngine、TeamOrchestrator）
+        max_rounds: 讨论的最大轮数
+        round_policy: 共享的工作流引擎使用的轮次策略（见RoundPolicy）
+        state_backend: 所有会话共享的状态持久化后端（见StateBackend），服务重启后按会话ID恢复状态
+        max_sessions: 同时保留的会话数上限，None表示不限制
+        session_secret: 签发会话ID的密钥，默认每次启动随机生成；使用state_backend在重启后恢复会话时需固定
+        job_queue: 处理需求的作业队列，会话有未结束的作业时视为忙（不回收、不删除）
+        session_issue_rate: 每个客户端每秒可申请的会话ID数，None表示不限制
+        session_issue_burst: 每个客户端可连续申请的会话ID数
+    """
+
+    # 记录限速状态的客户端数上限，超出后淘汰最久未申请的客户端
+    MAX_TRACKED_CLIENTS = 4096
+
+    def __init__(self, ai_config: AIConfig = None, async_ai_service=None, session_ttl: Optional[float] = 3600,
+                 max_concurrent_tasks: int = 8, max_tasks_per_plan: int = 4, task_timeout: Optional[float] = 300,
+                 model_profiles: Optional[Dict[str, ModelProfile]] = None, max_rounds: int = 3,
+                 round_policy: Optional[RoundPolicy] = None, max_tasks_per_agent: Optional[int] = 2,
+                 summary_fan_in: int = 4, state_backend: Optional[StateBackend] = None,
+                 max_sessions: Optional[int] = 100, session_secret: Optional[str] = None,
+                 job_queue: Optional[JobQueue] = None, session_issue_rate: Optional[float] = 0.1,
+                 session_issue_burst: int = 5):
+        self.ai_config = ai_config or AIConfig(
+            base_url="http://192.168.1.159:19000/v1",
+            model="Qwen3Coder",
+            api_key="empty"
+        )
+        self.session_ttl = session_ttl
+        self.ai_service = AIService(self.ai_config)
+        self.async_ai_service = async_ai_service or create_async_ai_service(self.ai_service)
+        self.model_profiles = model_profiles
+        self.max_rounds = max_rounds
+        self.workflow_engine = WorkflowEngine(self.ai_service, self.async_ai_service, model_profiles=model_profiles,
+                                              round_policy=round_policy)
+        self.task_limiter = SharedLimiter(max_concurrent_tasks)
+        self.max_tasks_per_plan = max_tasks_per_plan
+        self.max_tasks_per_agent = max_tasks_per_agent
+        self.summary_fan_in = summary_fan_in
+        self.task_timeout = task_timeout
+        self.state_backend = state_backend
+        self.max_sessions = max_sessions
+        self._secret = session_secret.encode("utf-8") if session_secret else os.urandom(32)
+        self.job_queue = job_queue
+        self.session_issue_rate = session_issue_rate
+        self.session_issue_burst = session_issue_burst
+        self._issue_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._sessions: Dict[str, Session] = {}
+        self._lock = threading.Lock()
+
+    def issue_session_id(self, client: Optional[str] = None) -> Optional[str]:
+        """
+        签发新的会话ID（会话在首次访问时创建）
+
+        Args:
+            client: 客户端标识（如IP地址），用于限速
+
+        Returns:
+            会话ID，该客户端申请过于频繁时返回None
+        """
+        if not self._allow_issue(client):
+            return None
+        token = uuid.uuid4().hex
+        return f"{token}.{self._sign(token)}"
+
+    def _allow_issue(self, client: Optional[str]) -> bool:
+        """按客户端限速"""
+        if self.session_issue_rate is None:
+            return True
+        with self._lock:
+            bucket = self._issue_buckets.pop(client, None)
+            if bucket is None:
+                bucket = TokenBucket(self.session_issue_rate, self.session_issue_burst)
+            self._issue_buckets[client] = bucket
+            while len(self._issue_buckets) > self.MAX_TRACKED_CLIENTS:
+                self._issue_buckets.popitem(last=False)
+            bucket.refill(time.monotonic())
+            if not bucket.can_take(1):
+                return False
+            bucket.take(1)
+            return True
+
+    def is_valid_session_id(self, session_id: str) -> bool:
+        """会话ID是否为默认会话或由本服务签发"""
+        if session_id == DEFAULT_SESSION_ID:
+            return True
+        token, _, signature = session_id.partition(".")
+        return bool(token) and hmac.compare_digest(signature, self._sign(token))
+
+    def _sign(self, token: str) -> str:
+        return hmac.new(self._secret, token.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+    def get_or_create(self, session_id: str) -> Session:
+        """
+        获取会话，不存在时创建
+
+        Raises:
+            InvalidSessionError: 会话ID不是由本服务签发的
+            SessionLimitError: 会话数已达上限且没有可回收的会话
+        """
+        if not self.is_valid_session_id(session_id):
+            raise InvalidSessionError("无效的会话ID")
+        with self._lock:
+            self._evict_expired()
+            session = self._sessions.get(session_id)
+            if session is None:
+                self._evict_for_capacity()
+                orchestrator = TeamOrchestrator(
+                    self.ai_config,
+                    async_ai_service=self.async_ai_service,
+                    session_id=session_id,
+                    ai_service=self.ai_service,
+                    workflow_engine=self.workflow_engine,
+                    task_limiter=self.task_limiter,
+                    max_tasks_per_plan=self.max_tasks_per_plan,
+                    max_tasks_per_agent=self.max_tasks_per_agent,
+                    summary_fan_in=self.summary_fan_in,
+                    task_timeout=self.task_timeout,
+                    model_profiles=self.model_profiles,
+                    max_rounds=self.max_rounds,
+                    state_backend=self.state_backend
+                )
+                session = Session(id=session_id, orchestrator=orchestrator, job_queue=self.job_queue)
+                self._sessions[session_id] = session
+            session.touch()
+            return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """获取已存在的会话"""
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def remove(self, session_id: str) -> bool:
+        """删除会话（会话忙时不删除）"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.is_busy():
+                return False
+            del self._sessions[session_id]
+            return True
+
+    def list_sessions(self) -> List[Session]:
+        """获取所有会话"""
+        with self._lock:
+            return list(self._sessions.values())
+
+    def _evict_expired(self):
+        """回收过期的空闲会话（调用方持有锁）"""
+        if not self.session_ttl:
+            return
+        deadline = time.time() - self.session_ttl
+        expired = [
+            session_id for session_id, session in self._sessions.items()
+            if session.last_active < deadline and not session.is_busy()
+        ]
+        for session_id in expired:
+            del self._sessions[session_id]
+
+    def _evict_for_capacity(self):
+        """会话数达到上限时回收最久未访问的、不会丢失状态的空闲会话（调用方持有锁）"""
+        if self.max_sessions is None or len(self._sessions) < self.max_sessions:
+            return
+        evictable = [
+            session for session in self._sessions.values()
+            if not session.is_busy() and (self.state_backend is not None or not session.has_state())
+        ]
+        if not evictable:
+            raise SessionLimitError("会话数已达上限，请稍后再试")
+        del self._sessions[min(evictable, key=lambda session: session.last_active).id]
@@ -0,0 +1,138 @@
+"""
+任务调度器 - 按任务间的依赖关系以DAG方式执行计划
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional
+from domain.task import Task
+
+
+class TaskScheduler:
+    """
+    任务调度器
+
+    前置任务全部成功后任务进入就绪状态，就绪任务并行执行；同时执行的任务数不超过max_concurrency，
+    同一负责人同时执行的任务数不超过max_per_assignee（None表示不限）。
+    名额有限时优先执行关键路径更长（以该任务为起点的最长依赖链更长）的任务，
+    使总耗时接近最长依赖链的耗时。
+
+    依赖不在本次执行范围内的任务视为已满足；前置任务失败的任务不再执行。
+    """
+
+    def __init__(self, max_concurrency: int = 4, max_per_assignee: Optional[int] = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_per_assignee = max(1, max_per_assignee) if max_per_assignee is not None else None
+
+    @staticmethod
+    def topological_order(tasks: List[Task]) -> List[Task]:
+        """按依赖关系排序（忽略范围外的依赖），存在循环依赖时抛出ValueError"""
+        by_id = {task.id: task for task in tasks}
+        order: List[Task] = []
+        state: Dict[str, int] = {}   # 1：访问中，2：已完成
+
+        def visit(task: Task):
+            if state.get(task.id) == 2:
+                return
+            if state.get(task.id) == 1:
+                raise ValueError(f"任务依赖存在循环：{task.description}")
+            state[task.id] = 1
+            for dependency_id in task.depends_on:
+                if dependency_id in by_id:
+                    visit(by_id[dependency_id])
+            state[task.id] = 2
+            order.append(task)
+
+        for task in tasks:
+            visit(task)
+        return order
+
+    @classmethod
+    def critical_path_lengths(cls, tasks: List[Task]) -> Dict[str, int]:
+        """以每个任务为起点的最长依赖链长度（任务数）"""
+        lengths: Dict[str, int] = {}
+        dependents = cls._dependents(tasks)
+        for task in reversed(cls.topological_order(tasks)):
+            lengths[task.id] = 1 + max((lengths[d.id] for d in dependents[task.id]), default=0)
+        return lengths
+
+    @staticmethod
+    def _dependents(tasks: List[Task]) -> Dict[str, List[Task]]:
+        """每个任务的直接后继（范围内）"""
+        dependents: Dict[str, List[Task]] = {task.id: [] for task in tasks}
+        for task in tasks:
+            for dependency_id in task.depends_on:
+                if dependency_id in dependents:
+                    dependents[dependency_id].append(task)
+        return dependents
+
+    async def run(self, tasks: List[Task],
+                  run_task: Callable[[Task, List[Task]], Awaitable[bool]],
+                  skip_task: Callable[[Task, List[Task]], None],
+                  all_tasks: Optional[List[Task]] = None) -> Dict[str, bool]:
+        """
+        执行任务
+
+        Args:
+            tasks: 本次执行的任务
+            run_task: run_task(task, upstream) 执行一个任务并返回是否成功，upstream为已有结果的前置任务
+            skip_task: skip_task(task, failed_upstream) 前置任务失败时代替执行调用
+            all_tasks: 计划中的所有任务，用于查找范围外的前置任务（提供其已有结果）
+
+        Returns:
+            {任务ID: 是否成功}
+        """
+        lengths = self.critical_path_lengths(tasks)
+        dependents = self._dependents(tasks)
+        lookup = {task.id: task for task in (all_tasks or tasks)}
+        position = {task.id: index for index, task in enumerate(tasks)}
+        remaining = {
+            task.id: sum(1 for dependency_id in task.depends_on if dependency_id in lengths)
+            for task in tasks
+        }
+        ready = [task for task in tasks if remaining[task.id] == 0]
+        succeeded: Dict[str, bool] = {}
+        running: Dict[asyncio.Future, Task] = {}
+        per_assignee: Dict[Optional[str], int] = {}
+
+        def upstream_of(task: Task) -> List[Task]:
+            return [lookup[dependency_id] for dependency_id in task.depends_on if dependency_id in lookup]
+
+        def mark_ready(task: Task):
+            for dependent in dependents[task.id]:
+                remaining[dependent.id] -= 1
+                if remaining[dependent.id] == 0:
+                    ready.append(dependent)
+
+        try:
+            while ready or running:
+                # 按关键路径长度从长到短启动有名额的就绪任务
+                ready.sort(key=lambda t: (-lengths[t.id], position[t.id]))
+                for task in list(ready):
+                    if len(running) >= self.max_concurrency:
+                        break
+                    failed = [t for t in upstream_of(task) if succeeded.get(t.id) is False]
+                    if failed:
+                        ready.remove(task)
+                        skip_task(task, failed)
+                        succeeded[task.id] = False
+                        mark_ready(task)
+                        continue
+                    assignee = task.assignee_name
+                    if self.max_per_assignee is not None and per_assignee.get(assignee, 0) >= self.max_per_assignee:
+                        continue
+                    ready.remove(task)
+                    per_assignee[assignee] = per_assignee.get(assignee, 0) + 1
+                    upstream = [t for t in upstream_of(task) if t.result is not None]
+                    running[asyncio.ensure_future(run_task(task, upstream))] = task
+                if not running:
+                    # 跳过的任务可能使新的任务就绪
+                    continue
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    per_assignee[task.assignee_name] -= 1
+                    succeeded[task.id] = bool(future.result())
+                    mark_ready(task)
+        finally:
+            for future in running:
+                future.cancel()
+        return succeeded
@@ -1,20 +1,73 @@
 """
 团队编排器 - 协调整个流程的入口
 """
+import asyncio
+import hashlib
+import threading
 import uuid
-from typing import Dict, List
+from collections import OrderedDict
+from typing import Dict, List, Optional
 from domain.team import Team
 from domain.agent import Agent
 from domain.consensus import Consensus
-from infrastructure.ai_service import AIService, AIConfig
+from infrastructure.ai_service import AIService, AIConfig, ModelProfile
+from infrastructure.async_ai_service import create_async_ai_service, run_sync
+from infrastructure.concurrency import SharedLimiter
+from infrastructure.event_bus import EventBus
 from infrastructure.state_store import StateStore
-from application.workflow_engine import WorkflowEngine
+from infrastructure.state_backend import StateBackend
+from application.workflow_engine import WorkflowEngine, WorkflowCancelledError
+from application.round_policy import RoundPolicy
+from application.task_scheduler import TaskScheduler
+from application.result_aggregator import ResultAggregator
 
 
 class TeamOrchestrator:
-    """团队编排器 - 应用层的门面"""
+    """
+    团队编排器 - 应用层的门面
     
-    def __init__(self, ai_config: AIConfig = None):
+    流程中的阶段变化、讨论消息、任务进度等以增量事件发布到event_bus，
+    供服务端推送使用。stream_opinions为True时讨论意见以流式方式生成。
+    
+    每个编排器对应一个会话，持有该会话独立的状态存储、事件总线和执行状态；
+    多个会话可以通过ai_service、workflow_engine参数共享同一个AI服务及其连接池。
+    
+    任务按依赖关系以DAG方式执行（见TaskScheduler），前置任务的结果会提供给后续任务。
+    任务执行的并发受三级限制：task_limiter为全局上限（多个会话共享同一个实例时，
+    对所有会话、所有计划生效），max_tasks_per_plan为单次执行一个计划时的上限，
+    max_tasks_per_agent为同一负责人同时执行的任务数上限（None表示不限）。
+    单个任务超过task_timeout秒未完成时记为超时失败。
+    
+    子任务结果以map-reduce方式汇总（见ResultAggregator）：每个任务完成后立即压缩其结果，
+    摘要按summary_fan_in条一组逐层合并，总agent只基于不超过summary_fan_in条摘要生成最终反馈。
+    
+    model_profiles为各调用点的模型配置：recommend_roles、task_execution、result_digest、result_merge、
+    summary由编排器使用，
+    未传入workflow_engine时同一份配置也传给新建的工作流引擎（见WorkflowEngine）。
+    
+    max_rounds为讨论的最大轮数，round_policy为新建的工作流引擎使用的轮次策略（见RoundPolicy），
+    策略可以在达到最大轮数之前结束讨论。
+    
+    state_backend为状态存储的持久化后端（见StateBackend），提供时团队、讨论、计划在每次保存时持久化，
+    以同一session_id重新创建编排器（如服务重启后）即可恢复会话的状态；未提供时只保存在内存中。
+    """
+    
+    # 只需简短结构化输出的调用点默认限制生成长度
+    DEFAULT_MODEL_PROFILES: Dict[str, ModelProfile] = {
+        "recommend_roles": ModelProfile(max_tokens=300),
+        "result_digest": ModelProfile(max_tokens=300),
+        "result_merge": ModelProfile(max_tokens=500)
+    }
+    
+    # 结果压缩、合并调用的记忆条数（相同输入直接复用）
+    DIGEST_MEMO_SIZE = 256
+    
+    def __init__(self, ai_config: AIConfig = None, async_ai_service=None, stream_opinions: bool = True,
+                 session_id: str = "default", ai_service: AIService = None, workflow_engine: WorkflowEngine = None,
+                 task_limiter: SharedLimiter = None, max_tasks_per_plan: int = 4, task_timeout: Optional[float] = 300,
+                 model_profiles: Optional[Dict[str, ModelProfile]] = None, max_rounds: int = 3,
+                 round_policy: Optional[RoundPolicy] = None, max_tasks_per_agent: Optional[int] = 2,
+                 summary_fan_in: int = 4, state_backend: Optional[StateBackend] = None):
         # 使用默认配置或传入的配置
         self.ai_config = ai_config or AIConfig(
             base_url="http://192.168.1.159:19000/v1",
@@ -22,13 +75,37 @@ class TeamOrchestrator:
             api_key="empty"
         )
         
-        self.ai_service = AIService(self.ai_config)
-        self.workflow_engine = WorkflowEngine(self.ai_service)
-        self.state_store = StateStore()
+        self.session_id = session_id
+        self.ai_service = ai_service or AIService(self.ai_config)
+        # 异步工作流使用的AI服务：默认为原生AsyncAIService，未安装aiohttp时适配同步服务
+        self.async_ai_service = async_ai_service or create_async_ai_service(self.ai_service)
+        self.workflow_engine = workflow_engine or WorkflowEngine(
+            self.ai_service, self.async_ai_service, model_profiles=model_profiles, round_policy=round_policy
+        )
+        self.model_profiles = {**self.DEFAULT_MODEL_PROFILES, **(model_profiles or {})}
+        self.task_limiter = task_limiter or SharedLimiter(8)
+        self.max_tasks_per_plan = max_tasks_per_plan
+        self.max_tasks_per_agent = max_tasks_per_agent
+        self.task_timeout = task_timeout
+        self.max_rounds = max_rounds
+        self.summary_fan_in = summary_fan_in
+        self._digest_memo: "OrderedDict[str, str]" = OrderedDict()
+        self.state_store = StateStore(state_backend, session_id)
+        self.event_bus = EventBus()
+        self.execution_status = {"status": "idle", "message": "未执行任务"}
+        self._execution_lock = threading.Lock()
+        self.stream_opinions = stream_opinions
         self.current_stage = "idle"
         self.current_message = "就绪：等待处理需求"
     
-    def handle_user_requirement(self, requirement: str, agent_count: int = 3) -> Dict:
+    def _set_stage(self, stage: str, message: str):
+        """更新当前阶段并发布事件"""
+        self.current_stage = stage
+        self.current_message = message
+        self.event_bus.publish("stage_changed", {"stage": stage, "message": message})
+    
+    def handle_user_requirement(self, requirement: str, agent_count: int = 3, stream_callback=None,
+                                should_cancel=None, max_rounds: Optional[int] = None) -> Dict:
         """
         处理用户需求 - 主流程入口
         
@@ -43,6 +120,10 @@ class TeamOrchestrator:
         Args:
             requirement: 用户需求描述
             agent_count: Agent数量
+            stream_callback: 可选，讨论意见流式生成时的回调 (discussion, message, delta)
+            should_cancel: 可选，返回True时在下一个检查点（讨论轮次之间、制定计划前）
+                取消处理并抛出WorkflowCancelledError
+            max_rounds: 可选，本次讨论的最大轮数，默认使用编排器的max_rounds
             
         Returns:
             {
@@ -58,14 +139,13 @@ class TeamOrchestrator:
         print(f"{'#'*60}\n")
         
         # 1. 推荐角色并创建团队
-        self.current_stage = "analyzing"
-        self.current_message = "分析需求，创建团队..."
+        self._set_stage("analyzing", "分析需求，创建团队...")
         team = self._create_team_with_recommended_roles(requirement, agent_count)
         self.state_store.save_team(team)
+        self.event_bus.publish("team_created", {"team": team.to_dict()})
         
         # 2. 团队讨论
-        self.current_stage = "discussing"
-        self.current_message = "团队讨论中..."
+        self._set_stage("discussing", "团队讨论中...")
         # 立即保存阶段信息，以便前端能够获取到
         
         # 创建讨论对象并保存到state_store中
@@ -74,24 +154,36 @@ class TeamOrchestrator:
         discussion = Discussion(
             id=str(uuid.uuid4()),
             topic=f"如何实现：{requirement}",
-            max_rounds=3
+            max_rounds=max_rounds or self.max_rounds
         )
         self.state_store.save_discussion(discussion)
+        self.event_bus.publish("discussion_started", {"discussion": discussion.to_dict()})
+        
+        # 流式生成意见（增量通过message_delta事件推送）
+        def forward_delta(d, message, delta):
+            if stream_callback:
+                stream_callback(d, message, delta)
         
         # 运行讨论并每轮保存结果
         # 注意：我们需要使用同一个discussion对象，以便前端能够获取到一致的ID
-        self.workflow_engine.run_discussion_with_callback(
-            discussion=discussion,
-            agents=team.get_all_agents(),
-            save_callback=lambda d: self.state_store.save_discussion(d)
-        )
+        try:
+            self.workflow_engine.run_discussion_with_callback(
+                discussion=discussion,
+                agents=team.get_all_agents(),
+                save_callback=lambda d: self.state_store.save_discussion(d),
+                stream_callback=forward_delta if (stream_callback or self.stream_opinions) else None,
+                event_callback=self.event_bus.publish,
+                should_cancel=should_cancel
+            )
+        except WorkflowCancelledError:
+            self._set_stage("cancelled", "需求处理已取消")
+            raise
         # 保存最终结果
         self.state_store.save_discussion(discussion)
         
         # 3. 检查是否达成共识
         if not discussion.consensus:
-            self.current_stage = "error"
-            self.current_message = "讨论未能达成共识"
+            self._set_stage("error", "讨论未能达成共识")
             return {
                 "team": team,
                 "discussion": discussion,
@@ -102,24 +194,26 @@ class TeamOrchestrator:
             }
         
         # 4. 基于共识创建计划
-        self.current_stage = "consensus"
-        self.current_message = "达成共识中..."
+        self._set_stage("consensus", "达成共识中...")
         consensus = Consensus(
             content=discussion.consensus,
             discussion_id=discussion.id
         )
         
-        self.current_stage = "planning"
-        self.current_message = "制定执行计划..."
+        if should_cancel and should_cancel():
+            self._set_stage("cancelled", "需求处理已取消")
+            raise WorkflowCancelledError("需求处理已取消")
+        
+        self._set_stage("planning", "制定执行计划...")
         plan = self.workflow_engine.create_plan_from_consensus(
             goal=requirement,
             consensus=consensus,
             agents=team.get_all_agents()
         )
         self.state_store.save_plan(plan)
+        self.event_bus.publish("plan_created", {"plan": plan.to_dict()})
         
-        self.current_stage = "completed"
-        self.current_message = "任务处理完成"
+        self._set_stage("completed", "任务处理完成")
         print(f"\n{'#'*60}")
         print(f"✓ 需求处理完成")
         print(f"{'#'*60}\n")
@@ -144,11 +238,13 @@ class TeamOrchestrator:
             return {"success": False, "message": "任务不存在"}
         
         task.update_progress(progress)
+        self._publish_task_progress(plan, task)
         
         # 检查计划是否完成
         if plan.is_completed():
             plan.complete()
             print(f"\n✓ 计划已完成：{plan.goal}")
+        self.state_store.save_plan(plan)
         
         return {
             "success": True,
@@ -156,11 +252,43 @@ class TeamOrchestrator:
             "plan_progress": plan.get_progress()
         }
     
-    def get_current_status(self) -> Dict:
-        """获取当前状态"""
+    def get_status_version(self) -> int:
+        """获取当前状态的版本号（团队、讨论、计划中最新的版本）"""
+        team = self.state_store.get_current_team()
+        discussion = self.state_store.get_current_discussion()
+        plan = self.state_store.get_current_plan()
+        return max(
+            team.get_version() if team else 0,
+            discussion.version if discussion else 0,
+            plan.get_version() if plan else 0
+        )
+    
+    def get_status_etag(self, since: Optional[int] = None) -> str:
+        """
+        计算状态快照的ETag（无需序列化完整状态）
+        
+        覆盖get_current_status返回的全部字段；AI调用统计为所有会话共享的全局数据，不在快照中（见get_ai_stats）。
+        """
+        raw = "|".join(str(value) for value in (
+            self.get_status_version(), since, self.current_stage, self.current_message, self._get_session_tokens(),
+            self.event_bus.get_last_seq()
+        ))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    
+    def get_current_status(self, since: Optional[int] = None) -> Dict:
+        """
+        获取当前状态
+        
+        Args:
+            since: 提供时返回增量：只包含该版本之后变化过的团队、讨论消息和任务，
+                未变化的团队、讨论、计划不出现在结果中
+        """
+        # 先读取事件序号再生成快照：客户端从该序号订阅事件流不会遗漏变更
+        event_seq = self.event_bus.get_last_seq()
         team = self.state_store.get_current_team()
         discussion = self.state_store.get_current_discussion()
         plan = self.state_store.get_current_plan()
+        version = self.get_status_version()
         
         # 确定状态
         if self.current_stage == "idle":
@@ -172,15 +300,43 @@ class TeamOrchestrator:
         else:
             status = "processing"
         
-        return {
+        result = {
+            "session_id": self.session_id,
             "status": status,
             "stage": self.current_stage,
             "message": self.current_message,
-            "team": team.to_dict() if team else None,
-            "discussion": discussion.to_dict() if discussion else None,
-            "plan": plan.to_dict() if plan else None,
-            "total_tokens": self.ai_service.get_total_tokens()
+            "total_tokens": self._get_session_tokens(),
+            "event_seq": event_seq,
+            "version": version
         }
+        
+        if since is None:
+            result["team"] = team.to_dict() if team else None
+            result["discussion"] = discussion.to_dict() if discussion else None
+            result["plan"] = plan.to_dict() if plan else None
+            return result
+        
+        result["since"] = since
+        if team and team.get_version() > since:
+            result["team"] = team.to_dict()
+        if discussion and discussion.version > since:
+            result["discussion"] = discussion.to_dict(since=since)
+        if plan and plan.get_version() > since:
+            result["plan"] = plan.to_dict(since=since)
+        return result
+    
+    def _get_session_tokens(self) -> int:
+        """当前讨论消耗的token（只统计本会话；record_tokens不推进版本号，需单独计入ETag）"""
+        discussion = self.state_store.get_current_discussion()
+        return discussion.tokens_used if discussion else 0
+    
+    def get_total_tokens(self) -> int:
+        """获取总token消耗（异步服务与同步服务共享统计，见create_async_ai_service）"""
+        return self.ai_service.get_total_tokens()
+    
+    def get_ai_stats(self) -> Dict:
+        """获取AI调用统计（缓存、请求合并等）"""
+        return self.ai_service.get_stats()
     
     def update_goal(self, goal: str) -> Dict:
         """更新需求"""
@@ -188,8 +344,9 @@ class TeamOrchestrator:
         if not plan:
             return {"success": False, "message": "没有当前计划"}
         
-        plan.goal = goal
+        plan.update_goal(goal)
         self.state_store.save_plan(plan)
+        self.event_bus.publish("plan_updated", {"plan_id": plan.id, "goal": goal})
         
         return {"success": True, "message": "需求修改成功"}
     
@@ -203,17 +360,27 @@ class TeamOrchestrator:
         if not task:
             return {"success": False, "message": "任务不存在"}
         
-        task.description = description
-        task.assignee_name = assignee_name
+        task.update_details(description, assignee_name)
         self.state_store.save_plan(plan)
+        self.event_bus.publish("task_updated", {"plan_id": plan.id, "task": task.to_dict()})
         
         return {"success": True, "message": "任务修改成功"}
     
-    def execute_tasks(self, task_ids: List[str]) -> Dict:
-        """并行执行选中的任务"""
-        import threading
-        import time
+    def execute_tasks(self, task_ids: List[str], reuse_results: bool = False) -> Dict:
+        """按依赖关系并行执行选中的任务（同步封装）"""
+        return run_sync(self.aexecute_tasks(task_ids, reuse_results))
+    
+    async def aexecute_tasks(self, task_ids: List[str], reuse_results: bool = False) -> Dict:
+        """
+        按依赖关系并行执行选中的任务（异步，所有任务在同一事件循环中并发）
         
+        前置任务完成后任务才开始执行，提示词中附带前置任务的结果；前置任务失败的任务不再执行。
+        同时执行的任务数不超过max_tasks_per_plan，同一负责人不超过max_tasks_per_agent，
+        并与其他计划共同受task_limiter的全局上限约束，超出上限的任务排队等待。
+        
+        reuse_results为True时，输入指纹（任务描述、负责人、前置任务结果构成的提示词，以及模型配置）
+        与上次成功执行时相同的任务直接复用已有结果，不调用大模型；最终反馈同理。
+        """
         plan = self.state_store.get_current_plan()
         if not plan:
             return {"success": False, "message": "没有当前计划"}
@@ -226,44 +393,99 @@ class TeamOrchestrator:
                 return {"success": False, "message": f"任务 {task_id} 不存在"}
             tasks.append(task)
         
-        # 执行状态
-        self.execution_status = {
-            "status": "processing",
-            "message": "任务执行中...",
-            "completed_tasks": 0,
+        try:
+            TaskScheduler.topological_order(tasks)
+        except ValueError as e:
+            return {"success": False, "message": str(e)}
+        
+        # 执行状态（可能被请求线程同时读取，整体替换并在锁内更新）
+        with self._execution_lock:
+            self.execution_status = {
+                "status": "processing",
+                "message": "任务执行中...",
+                "completed_tasks": 0,
+                "reused_tasks": 0,
+                "total_tasks": len(tasks)
+            }
+        self.event_bus.publish("execution_started", {
+            "plan_id": plan.id,
+            "task_ids": [task.id for task in tasks],
             "total_tasks": len(tasks)
-        }
-        
-        # 并行执行任务
-        def execute_task(task):
-            print(f"开始执行任务：{task.description}")
-            # 调用大模型执行任务
-            prompt = f"你是{task.assignee_name}，请完成以下任务：{task.description}。\n\n请直接给出任务的执行结果，不要包含任何思考过程。"
-            result = self.ai_service.generate(prompt)
+        })
+        
+        # 子任务结果在任务完成时即开始压缩，与其余任务的执行重叠
+        aggregator = ResultAggregator(self._digest_result, self._merge_digests, fan_in=self.summary_fan_in)
+        
+        # 执行单个任务（前置任务均已完成）
+        async def execute_task(task, upstream) -> bool:
+            prompt = self._build_task_prompt(task, upstream)
+            fingerprint = self._fingerprint(prompt, "task_execution")
+            if reuse_results and task.fingerprint == fingerprint:
+                # 输入未变化，复用上次的结果
+                print(f"复用任务结果：{task.description}")
+                with self._execution_lock:
+                    self.execution_status["reused_tasks"] += 1
+                finish_task(task, task.result, True, reused=True)
+                return True
+            async with self.task_limiter:
+                print(f"开始执行任务：{task.description}")
+                # 调用大模型执行任务；超时取消调用时等待请求真正结束（见AsyncAIServiceAdapter），
+                # 结束前不释放并发名额
+                try:
+                    result = await asyncio.wait_for(self.async_ai_service.generate(
+                        prompt, traffic_class="execution", profile=self.model_profiles.get("task_execution")
+                    ), self.task_timeout)
+                except asyncio.TimeoutError:
+                    result = {"text": "", "tokens": 0, "success": False, "error": f"任务执行超时（{self.task_timeout}秒）"}
             if result["success"]:
                 task_result = result["text"]
                 # 保存任务结果
-                task.result = task_result
+                task.set_result(task_result, fingerprint)
                 print(f"任务执行结果：{task_result[:100]}...")
             else:
                 task_result = "任务执行失败"
-                task.result = task_result
+                task.set_result(task_result)
                 print(f"任务执行失败：{result.get('error', '未知错误')}")
+            finish_task(task, task_result, result["success"])
+            return result["success"]
+        
+        # 前置任务失败的任务不再执行
+        def skip_task(task, failed_upstream):
+            task_result = "前置任务执行失败，未执行：" + "、".join(t.description for t in failed_upstream)
+            task.set_result(task_result)
+            print(f"跳过任务：{task.description}")
+            finish_task(task, task_result, False)
+        
+        def finish_task(task, task_result: str, success: bool, reused: bool = False):
+            self.event_bus.publish("task_result", {
+                "plan_id": plan.id,
+                "task_id": task.id,
+                "result": task_result,
+                "success": success,
+                "reused": reused
+            })
+            aggregator.add(self._format_task_result(task))
             # 标记任务完成
             task.update_progress(100)
-            self.execution_status["completed_tasks"] += 1
+            self.state_store.save_plan(plan)
+            with self._execution_lock:
+                self.execution_status["completed_tasks"] += 1
+                completed_tasks = self.execution_status["completed_tasks"]
+            self._publish_task_progress(plan, task)
+            self.event_bus.publish("execution_progress", {
+                "plan_id": plan.id,
+                "completed_tasks": completed_tasks,
+                "total_tasks": len(tasks)
+            })
             print(f"任务完成：{task.description}")
         
-        # 创建线程
-        threads = []
-        for task in tasks:
-            thread = threading.Thread(target=execute_task, args=(task,))
-            threads.append(thread)
-            thread.start()
-        
-        # 等待所有线程完成
-        for thread in threads:
-            thread.join()
+        # 按依赖关系并发执行并等待所有任务完成
+        scheduler = TaskScheduler(self.max_tasks_per_plan, self.max_tasks_per_agent)
+        try:
+            await scheduler.run(tasks, execute_task, skip_task, all_tasks=plan.tasks)
+        except BaseException:
+            aggregator.cancel()
+            raise
         
         # 由总agent调用大模型，结合子agent的结果和任务，以及需求目标，最终给出反馈
         print("\n总agent正在汇总子任务执行结果...")
@@ -277,36 +499,113 @@ class TeamOrchestrator:
                 "result": task.result
             })
         
-        # 构建总agent的prompt
-        task_results_str = "\n".join([
-            f"- 任务：{result['description']}\n  负责人：{result['assignee']}\n  结果：{result['result']}"
-            for result in task_results
-        ])
-        
-        prompt = f"你是总agent，负责汇总和分析子任务的执行结果，结合需求目标，给出最终的反馈。\n\n需求目标：{plan.goal}\n\n子任务执行结果：\n{task_results_str}\n\n请根据以上信息，给出最终的反馈，包括：\n1. 子任务执行情况的总结\n2. 需求目标的达成情况\n3. 最终的结论和建议\n\n请直接给出最终反馈，不要包含任何思考过程。"
-        
-        # 调用大模型获取最终反馈
-        final_result = self.ai_service.generate(prompt)
-        if final_result["success"]:
-            final_feedback = final_result["text"]
-            print(f"总agent反馈：{final_feedback[:100]}...")
+        # 最终反馈的输入指纹：需求目标与按计划顺序排列的全部任务结果（摘要的合并顺序与完成顺序有关，不计入）
+        fingerprint = self._fingerprint("\n".join(
+            [plan.goal, str(self.summary_fan_in)] + [self._format_task_result(task) for task in tasks]
+        ), "summary")
+        if reuse_results and plan.feedback_fingerprint == fingerprint:
+            # 目标和所有任务结果都未变化，复用上次的最终反馈
+            aggregator.cancel()
+            final_feedback = plan.final_feedback
+            print("复用总agent反馈")
         else:
-            final_feedback = "总agent汇总失败"
-            print(f"总agent汇总失败：{final_result.get('error', '未知错误')}")
+            # 等待各任务结果压缩、逐层合并为不超过summary_fan_in条摘要
+            digests = await aggregator.reduce()
+            print(f"子任务结果已合并为{len(digests)}条摘要（压缩、合并调用{aggregator.calls}次）")
+            
+            # 构建总agent的prompt
+            task_results_str = "\n\n".join(digests)
+            prompt = f"你是总agent，负责汇总和分析子任务的执行结果，结合需求目标，给出最终的反馈。\n\n需求目标：{plan.goal}\n\n子任务执行结果：\n{task_results_str}\n\n请根据以上信息，给出最终的反馈，包括：\n1. 子任务执行情况的总结\n2. 需求目标的达成情况\n3. 最终的结论和建议\n\n请直接给出最终反馈，不要包含任何思考过程。"
+            
+            # 调用大模型获取最终反馈（同样占用全局并发名额）
+            async with self.task_limiter:
+                final_result = await self.async_ai_service.generate(prompt, traffic_class="execution",
+                                                                    profile=self.model_profiles.get("summary"))
+            if final_result["success"]:
+                final_feedback = final_result["text"]
+                plan.set_final_feedback(final_feedback, fingerprint)
+                print(f"总agent反馈：{final_feedback[:100]}...")
+            else:
+                final_feedback = "总agent汇总失败"
+                plan.set_final_feedback(final_feedback)
+                print(f"总agent汇总失败：{final_result.get('error', '未知错误')}")
         
         # 更新执行状态
-        self.execution_status["status"] = "completed"
-        self.execution_status["message"] = final_feedback
-        self.execution_status["final_feedback"] = final_feedback
-        self.execution_status["task_results"] = task_results
+        with self._execution_lock:
+            self.execution_status["status"] = "completed"
+            self.execution_status["message"] = final_feedback
+            self.execution_status["final_feedback"] = final_feedback
+            self.execution_status["task_results"] = task_results
+            execution_status = dict(self.execution_status)
         
         # 保存计划
         self.state_store.save_plan(plan)
+        self.event_bus.publish("execution_completed", execution_status)
         
         return {"success": True, "message": "任务执行完成", "final_feedback": final_feedback}
     
+    @staticmethod
+    def _format_task_result(task) -> str:
+        """子任务结果的文本表示（汇总的输入）"""
+        return f"- 任务：{task.description}\n  负责人：{task.assignee_name}\n  结果：{task.result}"
+    
+    async def _digest_result(self, text: str) -> Optional[str]:
+        """压缩一条子任务结果（map）"""
+        prompt = f"请将以下子任务的执行结果压缩为不超过200字的摘要，保留任务名称、负责人、关键产出和存在的问题：\n\n{text}\n\n直接给出摘要，不要解释。"
+        return await self._memoized_generate(prompt, "result_digest")
+    
+    async def _merge_digests(self, digests: List[str]) -> Optional[str]:
+        """合并多条子任务结果摘要（reduce）"""
+        joined = "\n\n".join(digests)
+        prompt = f"请将以下多条子任务结果摘要合并为一条不超过400字的摘要，保留每个任务的关键产出和存在的问题：\n\n{joined}\n\n直接给出合并后的摘要，不要解释。"
+        return await self._memoized_generate(prompt, "result_merge")
+    
+    async def _memoized_generate(self, prompt: str, call_site: str) -> Optional[str]:
+        """调用大模型（占用全局并发名额），相同输入复用之前成功的结果；失败时返回None"""
+        key = self._fingerprint(prompt, call_site)
+        if key in self._digest_memo:
+            self._digest_memo.move_to_end(key)
+            return self._digest_memo[key]
+        async with self.task_limiter:
+            result = await self.async_ai_service.generate(prompt, traffic_class="execution",
+                                                          profile=self.model_profiles.get(call_site))
+        if not result["success"]:
+            return None
+        self._digest_memo[key] = result["text"]
+        while len(self._digest_memo) > self.DIGEST_MEMO_SIZE:
+            self._digest_memo.popitem(last=False)
+        return result["text"]
+    
+    @staticmethod
+    def _build_task_prompt(task, upstream) -> str:
+        """构造执行任务的提示词（附带前置任务的结果）"""
+        prompt = f"你是{task.assignee_name}，请完成以下任务：{task.description}。"
+        if upstream:
+            upstream_results = "\n".join(
+                f"- {t.description}（{t.assignee_name}）：{t.result[:500]}" for t in upstream
+            )
+            prompt += f"\n\n本任务依赖的前置任务及其结果：\n{upstream_results}"
+        return prompt + "\n\n请直接给出任务的执行结果，不要包含任何思考过程。"
+    
+    def _fingerprint(self, prompt: str, call_site: str) -> str:
+        """调用的输入指纹：提示词与该调用点实际使用的模型配置"""
+        config = self.ai_service.config
+        profile = self.model_profiles.get(call_site) or ModelProfile()
+        raw = "|".join([
+            profile.model or config.model,
+            str(profile.max_tokens or config.max_tokens),
+            str(profile.temperature if profile.temperature is not None else config.temperature),
+            prompt
+        ])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
     def reexecute_plan(self) -> Dict:
-        """重新执行计划"""
+        """
+        重新执行计划
+        
+        只重新计算输入指纹发生变化的任务（如通过update_task修改过的任务）及结果随之变化的后续任务，
+        其余任务和最终反馈复用上次的结果。
+        """
         plan = self.state_store.get_current_plan()
         if not plan:
             return {"success": False, "message": "没有当前计划"}
@@ -314,17 +613,28 @@ class TeamOrchestrator:
         # 重置所有任务进度
         for task in plan.tasks:
             task.update_progress(0)
+            self._publish_task_progress(plan, task)
         
-        # 重新执行所有任务
+        # 重新执行所有任务（输入未变化的任务复用结果）
         task_ids = [task.id for task in plan.tasks]
-        return self.execute_tasks(task_ids)
+        return self.execute_tasks(task_ids, reuse_results=True)
+    
+    def _publish_task_progress(self, plan, task):
+        """发布任务进度事件"""
+        self.event_bus.publish("task_progress", {
+            "plan_id": plan.id,
+            "task_id": task.id,
+            "progress": task.progress,
+            "status": task.status.value,
+            "plan_progress": plan.get_progress()
+        })
     
     def get_execution_status(self) -> Dict:
-        """获取执行状态"""
-        if hasattr(self, 'execution_status'):
-            return self.execution_status
-        else:
-            return {"status": "idle", "message": "未执行任务"}
+        """获取执行状态（附带全局任务并发统计）"""
+        with self._execution_lock:
+            status = dict(self.execution_status)
+        status["concurrency"] = self.task_limiter.get_stats()
+        return status
     
     def _create_team_with_recommended_roles(self, requirement: str, agent_count: int) -> Team:
         """根据需求推荐角色并创建团队"""
@@ -366,7 +676,8 @@ class TeamOrchestrator:
 
 只返回角色列表，不要添加其他内容。"""
         
-        result = self.ai_service.generate(prompt)
+        result = self.ai_service.generate(prompt, traffic_class="planning",
+                                          profile=self.model_profiles.get("recommend_roles"))
         
         if not result["success"]:
             # 返回默认角色
@@ -1,21 +1,112 @@
 """
 工作流引擎 - 执行"讨论→共识→协作"的核心流程
 """
+import asyncio
+import re
+import time
 import uuid
-from typing import List, Optional
+from typing import Callable, Dict, Hashable, List, Optional
 from domain.agent import Agent
-from domain.discussion import Discussion
+from domain.discussion import Discussion, Message
 from domain.consensus import Consensus
 from domain.plan import Plan
 from domain.task import Task
-from infrastructure.ai_service import AIService
+from infrastructure.ai_service import AIService, ModelProfile
+from infrastructure.async_ai_service import create_async_ai_service, run_sync
+from application.consensus_precheck import ConsensusPrecheck, CONVERGENT, DIVERGENT
+from application.round_policy import RoundPolicy, RoundSignals, FixedRoundPolicy, CONTINUE, FORCE
+
+
+def _ignore_event(event_type: str, data: dict):
+    """未提供事件回调时的空实现"""
+
+
+class WorkflowCancelledError(Exception):
+    """流程在检查点被取消"""
+
+
+class _SpeculativeOpinion:
+    """提前生成的意见：被采用前流式增量先缓存，采用后补发缓存并转为实时转发"""
+    
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+        self._buffer: List[str] = []
+        self._sink: Optional[Callable[[str], None]] = None
+    
+    def on_delta(self, delta: str):
+        if self._sink is None:
+            self._buffer.append(delta)
+        else:
+            self._sink(delta)
+    
+    async def consume(self, on_delta: Optional[Callable[[str], None]] = None) -> Dict:
+        """采用提前生成的结果"""
+        if on_delta is not None:
+            for delta in self._buffer:
+                on_delta(delta)
+            self._buffer.clear()
+            self._sink = on_delta
+        return await self.task
+    
+    def cancel(self):
+        self.task.cancel()
 
 
 class WorkflowEngine:
-    """工作流引擎"""
+    """
+    工作流引擎
+    
+    核心流程以异步方式实现（arun_discussion_with_callback、acreate_plan_from_consensus），
+    同名的同步方法是对异步实现的薄封装。
+    
+    Args:
+        parallel_rounds: 并行轮次模式。开启后同一轮中所有Agent基于本轮开始前的讨论快照
+            同时生成意见，消息仍按Agent顺序写入讨论；非流式且AI服务启用了微批（AIConfig.batch_window）时
+            整轮意见合并为一次批量调用，否则每条意见单独调用
+        max_round_concurrency: 并行轮次模式下同时进行的单条意见生成数量上限
+        model_profiles: 各调用点的模型配置，键为调用点名称（opinion、consensus_check、
+            consensus_summary、force_consensus、extract_tasks），与默认配置合并；未配置的调用点使用AIConfig
+        speculative_rounds: 推测执行模式。共识判断进行的同时提前生成下一轮中只依赖当前讨论状态的意见
+            （并行轮次模式下为整轮，否则为第一个Agent的意见）；达成共识则取消，否则在下一轮中直接采用。
+            提前生成的意见在采用前不写入讨论，讨论记录与顺序执行时一致
+        precheck_consensus: 共识预检。判断共识前先在本地比较本轮意见的相似度（ConsensusPrecheck），
+            明显分歧时不调用大模型，明显一致时改用更简短的总结提示词
+        round_policy: 轮次策略，每轮结束后根据新颖度、意见相似度、耗时和token消耗决定继续讨论、
+            判断共识还是强制达成共识（见RoundPolicy），默认FixedRoundPolicy（第2轮起每轮判断共识）。
+            每次决定及其依据记录在Discussion.round_decisions中，并发布round_decision事件
+        summary_memory: 滚动摘要。每轮结束后将本轮意见并入讨论摘要（Discussion.summary，调用点round_summary），
+            意见和强制共识的提示词使用摘要加上尚未并入摘要的最近消息，提示词长度不随轮数增长。
+            摘要更新与共识判断并发进行，达成共识时取消。每轮多一次调用，默认关闭，适合轮数较多的讨论
+    """
+    
+    # 只需简短结构化输出的调用点默认限制生成长度
+    DEFAULT_MODEL_PROFILES: Dict[str, ModelProfile] = {
+        "consensus_check": ModelProfile(max_tokens=500),
+        "consensus_summary": ModelProfile(max_tokens=500),
+        "round_summary": ModelProfile(max_tokens=400),
+        "extract_tasks": ModelProfile(max_tokens=600)
+    }
+    
+    # 滚动摘要的最大长度（字符）
+    SUMMARY_MAX_CHARS = 600
     
-    def __init__(self, ai_service: AIService):
+    def __init__(self, ai_service: AIService, async_ai_service=None,
+                 parallel_rounds: bool = False, max_round_concurrency: int = 4,
+                 model_profiles: Optional[Dict[str, ModelProfile]] = None,
+                 precheck_consensus: bool = True, speculative_rounds: bool = False,
+                 round_policy: Optional[RoundPolicy] = None, summary_memory: bool = False):
         self.ai_service = ai_service
+        # 默认使用原生异步服务，未安装aiohttp时使用线程池适配同步服务
+        self.async_ai_service = async_ai_service or create_async_ai_service(ai_service)
+        self.parallel_rounds = parallel_rounds
+        self.max_round_concurrency = max_round_concurrency
+        self.model_profiles = {**self.DEFAULT_MODEL_PROFILES, **(model_profiles or {})}
+        self.consensus_precheck = ConsensusPrecheck() if precheck_consensus else None
+        self.speculative_rounds = speculative_rounds
+        self.round_policy = round_policy or FixedRoundPolicy()
+        self.summary_memory = summary_memory
+        # 轮次信号使用与共识预检相同的相似度计算
+        self._text_similarity = self.consensus_precheck or ConsensusPrecheck()
     
     def run_discussion(self, topic: str, agents: List[Agent], max_rounds: int = 3, save_callback=None) -> Discussion:
         """
@@ -38,67 +129,191 @@ class WorkflowEngine:
         
         return discussion
     
-    def run_discussion_with_callback(self, discussion: Discussion, agents: List[Agent], save_callback=None):
+    def run_discussion_with_callback(self, discussion: Discussion, agents: List[Agent], save_callback=None,
+                                     stream_callback=None, event_callback=None, should_cancel=None):
+        """运行讨论流程（带回调，同步封装）"""
+        run_sync(self.arun_discussion_with_callback(
+            discussion, agents, save_callback, stream_callback, event_callback, should_cancel
+        ))
+    
+    async def arun_discussion_with_callback(self, discussion: Discussion, agents: List[Agent], save_callback=None,
+                                            stream_callback=None, event_callback=None, should_cancel=None):
         """
-        运行讨论流程（带回调）
+        运行讨论流程（带回调，异步）
         
         流程：
         1. 使用已有的discussion对象
         2. 多轮讨论
         3. 每轮讨论后保存结果
         4. 尝试达成共识
+        
+        提供stream_callback时，意见以流式方式生成：消息先以空内容加入讨论，
+        生成的文本逐段追加到消息中，并以 stream_callback(discussion, message, delta) 通知调用方。
+        
+        提供event_callback时，以 event_callback(event_type, data) 发布讨论过程中的增量事件：
+        round_started、message_added、message_delta、message_completed、message_removed、
+        round_decision、consensus_reached、discussion_failed。
+        
+        提供should_cancel时，每轮开始前调用should_cancel()，返回True则讨论标记为失败，
+        并抛出WorkflowCancelledError。
         """
+        emit = event_callback or _ignore_event
+        started_at = time.monotonic()
+        
         print(f"\n{'='*60}")
         print(f"开始讨论：{discussion.topic}")
         print(f"参与者：{', '.join([a.name for a in agents])}")
         print(f"{'='*60}\n")
         
         # 多轮讨论
-        for round_num in range(1, discussion.max_rounds + 1):
-            discussion.start_new_round()
-            print(f"\n--- 第 {round_num} 轮讨论 ---")
-            
-            # 每个Agent发表意见
-            for agent in agents:
-                opinion = self._generate_opinion(agent, discussion)
-                if opinion:
-                    discussion.add_message(agent.id, agent.name, opinion)
-                    print(f"{agent.name}（{agent.role}）：{opinion[:100]}...")
-            
-            # 每轮讨论后保存结果
-            if save_callback:
-                save_callback(discussion)
-            
-            # 检查是否达成共识
-            if round_num >= 2:  # 至少2轮后才尝试达成共识
-                consensus = self._check_consensus(discussion, agents)
-                if consensus:
-                    discussion.reach_consensus(consensus)
-                    print(f"\n✓ 达成共识：{consensus[:100]}...")
-                    # 达成共识后保存结果
-                    if save_callback:
-                        save_callback(discussion)
-                    break
+        speculations: Dict[Hashable, object] = {}
+        try:
+            await self._run_rounds(discussion, agents, save_callback, stream_callback, emit, should_cancel,
+                                   speculations, started_at)
+        finally:
+            self._cancel_speculations(speculations)
         
         # 如果未达成共识，强制生成共识
         if not discussion.is_finished():
-            consensus = self._force_consensus(discussion, agents)
+            consensus = await self._force_consensus(discussion, agents)
             if consensus:
                 discussion.reach_consensus(consensus)
                 print(f"\n✓ 强制达成共识：{consensus[:100]}...")
+                emit("consensus_reached", {
+                    "discussion_id": discussion.id,
+                    "consensus": consensus,
+                    "forced": True
+                })
             else:
                 discussion.fail()
                 print("\n✗ 讨论失败，未能达成共识")
+                emit("discussion_failed", {"discussion_id": discussion.id})
             # 强制达成共识后保存结果
             if save_callback:
                 save_callback(discussion)
     
+    async def _run_rounds(self, discussion: Discussion, agents: List[Agent], save_callback, stream_callback, emit,
+                          should_cancel, speculations: Dict[Hashable, object], started_at: float):
+        """
+        逐轮讨论直到达成共识、轮次策略决定强制达成共识或达到最大轮数
+        
+        speculations保存推测执行中的下一轮意见，started_at为讨论开始的时间（monotonic）。
+        返回时摘要已覆盖到最后一轮（达成共识时除外）。
+        """
+        for round_num in range(1, discussion.max_rounds + 1):
+            if should_cancel and should_cancel():
+                discussion.fail()
+                if save_callback:
+                    save_callback(discussion)
+                emit("discussion_failed", {"discussion_id": discussion.id, "cancelled": True})
+                raise WorkflowCancelledError("讨论已取消")
+            discussion.start_new_round()
+            print(f"\n--- 第 {round_num} 轮讨论 ---")
+            emit("round_started", {"discussion_id": discussion.id, "round": discussion.current_round})
+            
+            # 每个Agent发表意见（优先采用推测执行的结果）
+            await self._run_round(discussion, agents, stream_callback, emit, speculations)
+            self._cancel_speculations(speculations)
+            
+            # 每轮讨论后保存结果
+            if save_callback:
+                save_callback(discussion)
+            
+            # 更新滚动摘要（与轮次决定、共识判断并发进行）
+            summary_update = asyncio.ensure_future(self._update_summary(discussion)) if self.summary_memory else None
+            try:
+                if await self._decide_next_step(discussion, agents, save_callback, stream_callback, emit,
+                                                speculations, started_at, summary_update):
+                    return
+                if summary_update is not None:
+                    await summary_update
+            finally:
+                if summary_update is not None:
+                    summary_update.cancel()
+    
+    async def _decide_next_step(self, discussion: Discussion, agents: List[Agent], save_callback, stream_callback,
+                                emit, speculations: Dict[Hashable, object], started_at: float,
+                                summary_update: Optional[asyncio.Future]) -> bool:
+        """
+        由轮次策略决定一轮结束后的下一步，需要时检查共识
+        
+        Returns:
+            是否结束讨论轮次（达成共识或策略决定强制达成共识）
+        """
+        signals = self._round_signals(discussion, started_at)
+        decision = self.round_policy.decide(signals)
+        telemetry = decision.to_dict(signals)
+        print(f"  轮次策略：{decision.action}（{decision.reason}）")
+        if decision.action == CONTINUE:
+            self._record_round_decision(discussion, telemetry, emit)
+            return False
+        if decision.action == FORCE:
+            self._record_round_decision(discussion, telemetry, emit)
+            # 强制共识的提示词使用摘要
+            if summary_update is not None:
+                await summary_update
+            return True
+        
+        # 检查是否达成共识
+        check = asyncio.ensure_future(self._check_consensus(discussion, agents, signals.similarity))
+        try:
+            if self.speculative_rounds and discussion.current_round < discussion.max_rounds:
+                # 下一轮的提示词包含摘要，需等摘要更新后再提前生成
+                if summary_update is not None:
+                    await summary_update
+                speculations.update(self._speculate_next_round(discussion, agents, stream_callback))
+            consensus = await check
+        finally:
+            check.cancel()
+        telemetry["consensus_reached"] = consensus is not None
+        self._record_round_decision(discussion, telemetry, emit)
+        if consensus:
+            discussion.reach_consensus(consensus)
+            print(f"\n✓ 达成共识：{consensus[:100]}...")
+            emit("consensus_reached", {
+                "discussion_id": discussion.id,
+                "consensus": consensus,
+                "forced": False
+            })
+            # 达成共识后保存结果
+            if save_callback:
+                save_callback(discussion)
+            return True
+        return False
+    
+    def _round_signals(self, discussion: Discussion, started_at: float) -> RoundSignals:
+        """收集本轮结束时轮次策略所需的信号"""
+        current = [msg.content for msg in discussion.messages if msg.round == discussion.current_round]
+        previous = [msg.content for msg in discussion.messages if msg.round < discussion.current_round]
+        novelty = None
+        if current and previous:
+            similarity = self._text_similarity.similarity(["\n".join(previous), "\n".join(current)])
+            novelty = None if similarity is None else 1.0 - similarity
+        return RoundSignals(
+            round=discussion.current_round,
+            max_rounds=discussion.max_rounds,
+            novelty=novelty,
+            similarity=self._text_similarity.similarity(current),
+            elapsed=time.monotonic() - started_at,
+            tokens_used=discussion.tokens_used
+        )
+    
+    @staticmethod
+    def _record_round_decision(discussion: Discussion, telemetry: Dict, emit=_ignore_event):
+        """记录轮次策略的决定并发布事件"""
+        discussion.record_round_decision(telemetry)
+        emit("round_decision", dict(telemetry, discussion_id=discussion.id))
+    
     def create_plan_from_consensus(self, goal: str, consensus: Consensus, agents: List[Agent]) -> Plan:
+        """基于共识创建执行计划（同步封装）"""
+        return run_sync(self.acreate_plan_from_consensus(goal, consensus, agents))
+    
+    async def acreate_plan_from_consensus(self, goal: str, consensus: Consensus, agents: List[Agent]) -> Plan:
         """
-        基于共识创建执行计划
+        基于共识创建执行计划（异步）
         
         流程：
-        1. 基于共识提取任务
+        1. 基于共识提取任务及其依赖关系
         2. 为每个任务分配合适的Agent
         3. 创建计划
         """
@@ -107,7 +322,7 @@ class WorkflowEngine:
         print(f"{'='*60}\n")
         
         # 提取任务
-        tasks = self._extract_tasks(goal, consensus, agents)
+        tasks = await self._extract_tasks(goal, consensus, agents)
         
         # 创建计划
         plan = Plan(
@@ -116,30 +331,150 @@ class WorkflowEngine:
             consensus=consensus
         )
         
-        for task_desc, agent in tasks:
+        created: List[Task] = []
+        for task_desc, agent, dependencies in tasks:
             task = Task(
                 id=str(uuid.uuid4()),
-                description=task_desc
+                description=task_desc,
+                depends_on=[created[index].id for index in dependencies]
             )
             task.assign_to(agent.id, agent.name)
             plan.add_task(task)
-            print(f"任务：{task_desc[:50]}... → {agent.name}（{agent.role}）")
+            created.append(task)
+            after = f"（依赖任务{'、'.join(str(index + 1) for index in dependencies)}）" if dependencies else ""
+            print(f"任务：{task_desc[:50]}... → {agent.name}（{agent.role}）{after}")
         
         return plan
     
-    def _generate_opinion(self, agent: Agent, discussion: Discussion) -> Optional[str]:
-        """生成Agent的意见"""
-        # 获取之前的讨论内容
-        recent_messages = discussion.get_recent_messages(3)
+    async def _run_round(self, discussion: Discussion, agents: List[Agent], stream_callback=None,
+                         emit=_ignore_event, speculations: Optional[Dict[Hashable, object]] = None):
+        """
+        进行一轮讨论：每个Agent发表意见
+        
+        speculations中提示词与本轮实际提示词相同的推测结果会被采用（并从中移除），其余的由调用方取消。
+        """
+        speculations = speculations if speculations is not None else {}
+        if self.parallel_rounds:
+            # 所有Agent基于本轮开始前的同一份上下文快照生成意见
+            recent_messages = discussion.get_unsummarized_messages(3)
+            prompts = [self._build_opinion_prompt(agent, discussion, recent_messages) for agent in agents]
+            if not stream_callback and self._batch_opinions():
+                # 启用微批时整轮意见通过一次多提示词请求生成
+                speculation = speculations.pop(tuple(prompts), None)
+                if speculation is not None:
+                    results = await speculation
+                else:
+                    results = await self._request_opinions(prompts, discussion)
+                for agent, result in zip(agents, results):
+                    self._record_opinion(discussion, agent, result["text"] if result["success"] else None,
+                                         emit=emit)
+                return
+            # 流式消息按Agent顺序预先占位，非流式消息在全部生成后按Agent顺序写入，保证消息顺序确定
+            messages = [
+                self._start_stream_message(discussion, agent, emit) if stream_callback else None for agent in agents
+            ]
+            semaphore = asyncio.Semaphore(max(1, self.max_round_concurrency))
+            
+            async def generate(prompt: str, message: Message) -> Optional[str]:
+                speculation = speculations.pop(prompt, None)
+                if speculation is not None:
+                    return await self._generate_opinion(prompt, discussion, message, stream_callback, emit,
+                                                        speculation)
+                async with semaphore:
+                    return await self._generate_opinion(prompt, discussion, message, stream_callback, emit)
+            
+            opinions = await asyncio.gather(*(
+                generate(prompt, message) for prompt, message in zip(prompts, messages)
+            ))
+            for agent, opinion, message in zip(agents, opinions, messages):
+                self._record_opinion(discussion, agent, opinion, message, emit)
+        else:
+            for agent in agents:
+                prompt = self._build_opinion_prompt(agent, discussion, discussion.get_unsummarized_messages(3))
+                message = self._start_stream_message(discussion, agent, emit) if stream_callback else None
+                opinion = await self._generate_opinion(prompt, discussion, message, stream_callback, emit,
+                                                       speculations.pop(prompt, None))
+                self._record_opinion(discussion, agent, opinion, message, emit)
+    
+    def _speculate_next_round(self, discussion: Discussion, agents: List[Agent],
+                              stream_callback=None) -> Dict[Hashable, object]:
+        """
+        提前开始下一轮中只依赖当前讨论状态的意见生成
+        
+        Returns:
+            {提示词: _SpeculativeOpinion}；并行非流式时为 {提示词元组: 批量生成任务}
+        """
+        next_round = discussion.current_round + 1
+        recent_messages = discussion.get_unsummarized_messages(3)
+        # 顺序模式下后续Agent的提示词依赖同一轮前面的意见，只能提前生成第一个
+        speculated_agents = agents if self.parallel_rounds else agents[:1]
+        prompts = [
+            self._build_opinion_prompt(agent, discussion, recent_messages, next_round)
+            for agent in speculated_agents
+        ]
+        if self.parallel_rounds and not stream_callback and self._batch_opinions():
+            return {tuple(prompts): asyncio.ensure_future(self._request_opinions(prompts, discussion))}
+        semaphore = asyncio.Semaphore(max(1, self.max_round_concurrency))
+        speculations = {}
+        for prompt in prompts:
+            speculation = _SpeculativeOpinion()
+            speculation.task = asyncio.ensure_future(
+                self._speculate_opinion(prompt, discussion, speculation, semaphore, stream_callback is not None)
+            )
+            speculations[prompt] = speculation
+        return speculations
+    
+    async def _speculate_opinion(self, prompt: str, discussion: Discussion, speculation: _SpeculativeOpinion,
+                                 semaphore: asyncio.Semaphore, stream: bool) -> Dict:
+        """推测执行一条意见的生成"""
+        async with semaphore:
+            return await self._request_opinion(prompt, discussion, speculation.on_delta if stream else None)
+    
+    @staticmethod
+    def _cancel_speculations(speculations: Dict[Hashable, object]):
+        """取消未被采用的推测执行（已发出的请求结果被丢弃）"""
+        for speculation in speculations.values():
+            speculation.cancel()
+        speculations.clear()
+    
+    def _start_stream_message(self, discussion: Discussion, agent: Agent, emit=_ignore_event) -> Message:
+        """为流式意见创建占位消息"""
+        message = discussion.start_message(agent.id, agent.name)
+        emit("message_added", {"discussion_id": discussion.id, "message": message.to_dict()})
+        return message
+    
+    def _record_opinion(self, discussion: Discussion, agent: Agent, opinion: Optional[str],
+                        message: Optional[Message] = None, emit=_ignore_event):
+        """将意见写入讨论（流式消息则完成或丢弃占位消息）"""
+        if message is not None:
+            if opinion:
+                discussion.finish_message(message, opinion)
+                emit("message_completed", {"discussion_id": discussion.id, "message": message.to_dict()})
+            else:
+                discussion.discard_message(message)
+                emit("message_removed", {"discussion_id": discussion.id, "message_id": message.id})
+        elif opinion:
+            message = discussion.add_message(agent.id, agent.name, opinion)
+            emit("message_added", {"discussion_id": discussion.id, "message": message.to_dict()})
+        if opinion:
+            print(f"{agent.name}（{agent.role}）：{opinion[:100]}...")
+    
+    def _build_opinion_prompt(self, agent: Agent, discussion: Discussion, recent_messages: List[Message],
+                              round_number: Optional[int] = None) -> str:
+        """构造Agent发表意见的提示词（round_number默认为当前轮次，recent_messages为尚未并入摘要的最近消息）"""
+        # 之前的讨论内容：滚动摘要 + 尚未并入摘要的消息
         context = "\n".join([
             f"{msg.agent_name}：{msg.content[:100]}"
             for msg in recent_messages
-        ]) if recent_messages else "这是第一轮讨论"
+        ])
+        if discussion.summary:
+            context = f"前{discussion.summary_round}轮讨论摘要：{discussion.summary}" + (f"\n{context}" if context else "")
+        context = context or "这是第一轮讨论"
         
-        prompt = f"""作为 {agent.name}（{agent.role}），直接发表你对以下主题的专业意见：
+        return f"""作为 {agent.name}（{agent.role}），直接发表你对以下主题的专业意见：
 
 主题：{discussion.topic}
-当前轮次：第 {discussion.current_round} 轮
+当前轮次：第 {round_number or discussion.current_round} 轮
 
 之前的讨论：
 {context}
@@ -153,12 +488,58 @@ class WorkflowEngine:
 6. 长度控制在300-500字之间
 
 请直接开始你的观点，不要有任何引言或开场白。"""
+    
+    async def _generate_opinion(self, prompt: str, discussion: Discussion, message: Optional[Message] = None,
+                                stream_callback=None, emit=_ignore_event,
+                                speculation: Optional[_SpeculativeOpinion] = None) -> Optional[str]:
+        """生成Agent的意见（提供message时流式写入该消息；提供speculation时采用推测执行的结果）"""
+        on_delta = None
+        if message is not None:
+            def on_delta(delta: str):
+                discussion.append_to_message(message, delta)
+                stream_callback(discussion, message, delta)
+                emit("message_delta", {
+                    "discussion_id": discussion.id,
+                    "message_id": message.id,
+                    "delta": delta
+                })
         
-        result = self.ai_service.generate(prompt)
+        if speculation is not None:
+            result = await speculation.consume(on_delta)
+        else:
+            result = await self._request_opinion(prompt, discussion, on_delta)
         return result["text"] if result["success"] else None
     
-    def _check_consensus(self, discussion: Discussion, agents: List[Agent]) -> Optional[str]:
-        """检查是否达成共识"""
+    async def _request_opinion(self, prompt: str, discussion: Discussion,
+                               on_delta: Optional[Callable[[str], None]] = None) -> Dict:
+        """调用AI生成意见（提供on_delta时流式生成）"""
+        if on_delta is None:
+            result = await self.async_ai_service.generate(prompt, traffic_class="discussion",
+                                                          affinity_key=discussion.id,
+                                                          profile=self.model_profiles.get("opinion"))
+        else:
+            result = await self.async_ai_service.generate_stream(prompt, on_delta, traffic_class="discussion",
+                                                                 affinity_key=discussion.id,
+                                                                 profile=self.model_profiles.get("opinion"))
+        discussion.record_tokens(result["tokens"])
+        return result
+    
+    def _batch_opinions(self) -> bool:
+        """并行非流式的整轮意见是否合并为一次批量请求（AI服务启用了微批时才合并，部分端点不接受多提示词请求）"""
+        config = getattr(self.async_ai_service, "config", None)
+        return config is not None and config.batch_window is not None
+    
+    async def _request_opinions(self, prompts: List[str], discussion: Discussion) -> List[Dict]:
+        """通过一次多提示词请求生成多条意见"""
+        results = await self.async_ai_service.generate_batch(prompts, traffic_class="discussion",
+                                                             affinity_key=discussion.id,
+                                                             profile=self.model_profiles.get("opinion"))
+        discussion.record_tokens(sum(result["tokens"] for result in results))
+        return results
+    
+    async def _check_consensus(self, discussion: Discussion, agents: List[Agent],
+                               similarity: Optional[float] = None) -> Optional[str]:
+        """检查是否达成共识（similarity为已计算的本轮意见相似度，未提供时由共识预检计算）"""
         # 获取最近一轮的所有意见
         recent_messages = [
             msg for msg in discussion.messages
@@ -168,12 +549,24 @@ class WorkflowEngine:
         if not recent_messages:
             return None
         
-        # 让AI判断是否达成共识
         opinions = "\n".join([
             f"{msg.agent_name}：{msg.content}"
             for msg in recent_messages
         ])
         
+        if self.consensus_precheck is not None:
+            if similarity is None:
+                similarity = self.consensus_precheck.similarity([msg.content for msg in recent_messages])
+            verdict = self.consensus_precheck.verdict(similarity)
+            discussion.record_consensus_precheck(verdict)
+            if verdict == DIVERGENT:
+                # 意见明显分歧，不调用大模型判断
+                print("  共识预检：意见分歧明显，跳过共识判断")
+                return None
+            if verdict == CONVERGENT:
+                return await self._summarize_consensus(discussion, opinions)
+        
+        # 让AI判断是否达成共识
         prompt = f"""分析以下团队讨论，判断是否达成共识：
 
 主题：{discussion.topic}
@@ -186,7 +579,10 @@ class WorkflowEngine:
 
 只返回共识内容或"未达成共识"，不要添加其他解释。"""
         
-        result = self.ai_service.generate(prompt)
+        result = await self.async_ai_service.generate(prompt, traffic_class="discussion",
+                                                      affinity_key=discussion.id,
+                                                      profile=self.model_profiles.get("consensus_check"))
+        discussion.record_tokens(result["tokens"])
         if result["success"]:
             consensus = result["text"]
             # 如果不是"未达成共识"，则认为达成了共识
@@ -195,12 +591,31 @@ class WorkflowEngine:
         
         return None
     
-    def _force_consensus(self, discussion: Discussion, agents: List[Agent]) -> Optional[str]:
-        """强制生成共识"""
+    async def _summarize_consensus(self, discussion: Discussion, opinions: str) -> Optional[str]:
+        """意见明显一致时直接总结共识（不需要判断是否一致）"""
+        prompt = f"""以下团队成员的意见基本一致，请用简洁的语言总结他们的共识：
+
+主题：{discussion.topic}
+
+本轮意见：
+{opinions}
+
+直接给出共识内容，不要解释。"""
+        
+        result = await self.async_ai_service.generate(prompt, traffic_class="discussion",
+                                                      affinity_key=discussion.id,
+                                                      profile=self.model_profiles.get("consensus_summary"))
+        discussion.record_tokens(result["tokens"])
+        return result["text"] if result["success"] else None
+    
+    async def _force_consensus(self, discussion: Discussion, agents: List[Agent]) -> Optional[str]:
+        """强制生成共识（有滚动摘要时使用摘要加上尚未并入摘要的消息）"""
         all_opinions = "\n".join([
             f"{msg.agent_name}：{msg.content[:150]}"
-            for msg in discussion.messages
+            for msg in discussion.get_unsummarized_messages()
         ])
+        if discussion.summary:
+            all_opinions = f"讨论摘要：{discussion.summary}" + (f"\n{all_opinions}" if all_opinions else "")
         
         prompt = f"""团队已经讨论了 {discussion.current_round} 轮关于"{discussion.topic}"的话题。
 
@@ -209,15 +624,49 @@ class WorkflowEngine:
 
 请基于以上讨论，总结一个平衡的共识方案。直接给出共识内容，不要解释。"""
         
-        result = self.ai_service.generate(prompt)
+        result = await self.async_ai_service.generate(prompt, traffic_class="discussion",
+                                                      affinity_key=discussion.id,
+                                                      profile=self.model_profiles.get("force_consensus"))
+        discussion.record_tokens(result["tokens"])
         return result["text"] if result["success"] else None
     
-    def _extract_tasks(self, goal: str, consensus: Consensus, agents: List[Agent]) -> List[tuple]:
+    async def _update_summary(self, discussion: Discussion):
+        """将尚未并入摘要的意见合并到滚动摘要中（失败时保留原摘要，下次一并合并）"""
+        messages = discussion.get_unsummarized_messages()
+        if not messages:
+            return
+        summary_round = discussion.current_round
+        opinions = "\n".join([
+            f"{msg.agent_name}（第{msg.round}轮）：{msg.content[:300]}"
+            for msg in messages
+        ])
+        prompt = f"""你负责维护一场团队讨论的摘要。请将新的意见合并到已有摘要中：
+
+主题：{discussion.topic}
+
+已有摘要：
+{discussion.summary or "（无）"}
+
+新的意见：
+{opinions}
+
+要求：保留每位成员的核心观点、已形成的共识和仍存在的分歧，删除重复内容，不超过{self.SUMMARY_MAX_CHARS}字。
+直接给出摘要，不要解释。"""
+        
+        result = await self.async_ai_service.generate(prompt, traffic_class="discussion",
+                                                      affinity_key=discussion.id,
+                                                      profile=self.model_profiles.get("round_summary"))
+        discussion.record_tokens(result["tokens"])
+        if result["success"] and result["text"].strip():
+            discussion.update_summary(result["text"].strip()[:self.SUMMARY_MAX_CHARS], summary_round)
+    
+    async def _extract_tasks(self, goal: str, consensus: Consensus, agents: List[Agent]) -> List[tuple]:
         """
         从共识中提取任务并分配
         
         Returns:
-            List[(task_description, assigned_agent)]
+            List[(task_description, assigned_agent, dependencies)]，dependencies为所依赖任务在列表中的下标，
+            只保留对排在前面的任务的依赖（保证无环）
         """
         agent_info = "\n".join([
             f"- {agent.name}（{agent.role}）：{', '.join(agent.skills)}"
@@ -232,40 +681,61 @@ class WorkflowEngine:
 团队成员：
 {agent_info}
 
-请提取3-6个具体任务，每个任务一行，格式：
-任务描述 | 负责人姓名
+请提取3-6个具体任务，每个任务一行，按执行的先后顺序排列，格式：
+序号. 任务描述 | 负责人姓名 | 依赖的任务序号
+
+依赖的任务序号指必须先完成、其结果会被本任务用到的任务，多个用逗号分隔，只能依赖序号更小的任务，没有依赖时写"无"。
 
 只返回任务列表，不要添加其他内容。"""
         
-        result = self.ai_service.generate(prompt)
+        result = await self.async_ai_service.generate(prompt, traffic_class="planning",
+                                                      profile=self.model_profiles.get("extract_tasks"))
         if not result["success"]:
             # 如果AI调用失败，返回默认任务
-            return [(f"执行任务{i+1}", agents[i % len(agents)]) for i in range(3)]
+            return [(f"执行任务{i+1}", agents[i % len(agents)], []) for i in range(3)]
         
         # 解析任务
         tasks = []
         lines = result["text"].strip().split('\n')
         
+        numbers: Dict[str, int] = {}    # 模型输出的序号 → 任务下标
         for line in lines:
             if '|' in line:
                 parts = line.split('|')
-                if len(parts) == 2:
-                    task_desc = parts[0].strip()
+                if len(parts) in (2, 3):
+                    number, task_desc = self._split_task_number(parts[0].strip())
                     assignee_name = parts[1].strip()
                     
-                    # 查找对应的Agent
-                    agent = next((a for a in agents if a.name == assignee_name), None)
-                    if agent:
-                        tasks.append((task_desc, agent))
-                    else:
-                        # 如果找不到，分配给第一个Agent
-                        tasks.append((task_desc, agents[0]))
+                    # 查找对应的Agent，如果找不到，分配给第一个Agent
+                    agent = next((a for a in agents if a.name == assignee_name), agents[0])
+                    
+                    # 解析依赖（只保留对前面任务的依赖）
+                    dependencies = []
+                    if len(parts) == 3:
+                        for ref in re.split(r"[,，、\s]+", parts[2].strip()):
+                            index = numbers.get(ref)
+                            if index is not None and index not in dependencies:
+                                dependencies.append(index)
+                    # 没有序号时按行的顺序编号
+                    numbers[number or str(len(tasks) + 1)] = len(tasks)
+                    tasks.append((task_desc, agent, dependencies))
         
-        # 限制任务数量最多6个
-        tasks = tasks[:6]
+        # 限制任务数量最多6个（去掉的任务不再作为依赖）
+        tasks = [
+            (task_desc, agent, [index for index in dependencies if index < 6])
+            for task_desc, agent, dependencies in tasks[:6]
+        ]
         
         # 如果没有提取到任务，返回默认任务
         if not tasks:
-            tasks = [(f"执行任务{i+1}", agents[i % len(agents)]) for i in range(3)]
+            tasks = [(f"执行任务{i+1}", agents[i % len(agents)], []) for i in range(3)]
         
         return tasks
+    
+    @staticmethod
+    def _split_task_number(text: str) -> tuple:
+        """拆分任务行开头的序号，返回 (序号, 任务描述)，没有序号时序号为None"""
+        match = re.match(r"^(\d+)\s*[.、．)）:：]\s*(.*)$", text)
+        if match and match.group(2):
+            return match.group(1), match.group(2).strip()
+        return None, text
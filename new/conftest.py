@@ -0,0 +1,153 @@
+"""
+测试公共设施 - 本地的补全接口桩服务与桩AI服务
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from infrastructure.ai_service import AIConfig  # noqa: E402
+
+
+class _CompletionHandler(BaseHTTPRequestHandler):
+    """按服务的responder生成 /v1/completions 的响应"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(payload)
+        self.server.clients.append(self.client_address)
+        status, body = self.server.responder(payload)
+        if payload.get("stream") and status == 200:
+            chunks = "".join(
+                f"data: {json.dumps({'choices': [{'text': piece}]})}\n\n" for piece in body["pieces"]
+            )
+            chunks += f"data: {json.dumps({'choices': [], 'usage': {'total_tokens': body['tokens']}})}\n\n"
+            data = (chunks + "data: [DONE]\n\n").encode("utf-8")
+            content_type = "text/event-stream"
+        else:
+            data = json.dumps(body).encode("utf-8")
+            content_type = "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def echo_completion(payload):
+    """默认响应：回显提示词（多提示词请求按index返回各提示词）"""
+    prompts = payload["prompt"] if isinstance(payload["prompt"], list) else [payload["prompt"]]
+    if payload.get("stream"):
+        return 200, {"pieces": ["echo:", prompts[0]], "tokens": 5}
+    return 200, {
+        "choices": [{"index": index, "text": f"echo:{prompt}"} for index, prompt in enumerate(prompts)],
+        "usage": {"total_tokens": 5 * len(prompts)}
+    }
+
+
+@pytest.fixture
+def completion_server():
+    """在本地线程中运行的补全接口，url为可直接用作base_url的地址，clients按请求顺序记录客户端地址"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _CompletionHandler)
+    server.daemon_threads = True
+    server.requests = []
+    server.clients = []     # 每个请求的客户端地址，用于判断连接是否复用
+    server.responder = echo_completion
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class StubAIService:
+    """
+    桩AI服务（同步接口），不发起网络请求
+
+    reply(prompt)返回回复文本，返回None表示调用失败；calls按调用顺序记录(流量类别, 提示词)。
+    """
+
+    def __init__(self, reply=None, tokens: int = 10):
+        self.config = AIConfig(base_url="http://stub/v1", model="stub-model", api_key="empty")
+        self.reply = reply or (lambda prompt: "桩回复")
+        self.tokens = tokens
+        self.calls = []
+        self.total_tokens = 0
+
+    def generate(self, prompt, max_tokens=None, traffic_class="default", affinity_key=None, profile=None):
+        self.calls.append((traffic_class, prompt))
+        text = self.reply(prompt)
+        if text is None:
+            return {"text": "", "tokens": 0, "success": False, "error": "stub failure"}
+        self.total_tokens += self.tokens
+        return {"text": text, "tokens": self.tokens, "success": True, "error": None}
+
+    def generate_batch(self, prompts, max_tokens=None, traffic_class="default", affinity_key=None, profile=None):
+        return [self.generate(prompt, max_tokens, traffic_class, affinity_key, profile) for prompt in prompts]
+
+    def generate_stream(self, prompt, on_delta, max_tokens=None, traffic_class="default", affinity_key=None,
+                        profile=None):
+        result = self.generate(prompt, max_tokens, traffic_class, affinity_key, profile)
+        if result["success"]:
+            half = len(result["text"]) // 2
+            for delta in (result["text"][:half], result["text"][half:]):
+                on_delta(delta)
+        return result
+
+    def prompts(self, traffic_class=None):
+        """记录的提示词（可只取某个流量类别）"""
+        return [prompt for cls, prompt in self.calls if traffic_class is None or cls == traffic_class]
+
+    def get_total_tokens(self):
+        return self.total_tokens
+
+    def get_stats(self):
+        return {"total_tokens": self.total_tokens}
+
+
+class StubAsyncAIService:
+    """桩AI服务（异步接口），委托给同步桩sync；delay(prompt)为每次调用前等待的秒数"""
+
+    def __init__(self, sync: StubAIService):
+        self.sync = sync
+        self.config = sync.config
+        self.delay = lambda prompt: 0
+
+    async def generate(self, prompt, max_tokens=None, traffic_class="default", affinity_key=None, profile=None):
+        await asyncio.sleep(self.delay(prompt))
+        return self.sync.generate(prompt, max_tokens, traffic_class, affinity_key, profile)
+
+    async def generate_batch(self, prompts, max_tokens=None, traffic_class="default", affinity_key=None,
+                             profile=None):
+        await asyncio.sleep(max([self.delay(prompt) for prompt in prompts] or [0]))
+        return self.sync.generate_batch(prompts, max_tokens, traffic_class, affinity_key, profile)
+
+    async def generate_stream(self, prompt, on_delta, max_tokens=None, traffic_class="default",
+                              affinity_key=None, profile=None):
+        await asyncio.sleep(self.delay(prompt))
+        return self.sync.generate_stream(prompt, on_delta, max_tokens, traffic_class, affinity_key, profile)
+
+    def get_total_tokens(self):
+        return self.sync.get_total_tokens()
+
+    def get_stats(self):
+        return self.sync.get_stats()
+
+
+@pytest.fixture
+def stub_ai():
+    """桩AI服务：stub_ai为异步接口，stub_ai.sync为共享调用记录的同步接口"""
+    return StubAsyncAIService(StubAIService())
@@ -5,6 +5,7 @@ from .discussion import Discussion, Message, DiscussionStatus
 from .consensus import Consensus
 from .task import Task, TaskStatus
 from .plan import Plan
+from .events import EventSource
 
 __all__ = [
     'Agent', 'AgentStatus',
@@ -12,5 +13,6 @@ __all__ = [
     'Discussion', 'Message', 'DiscussionStatus',
     'Consensus',
     'Task', 'TaskStatus',
-    'Plan'
+    'Plan',
+    'EventSource'
 ]
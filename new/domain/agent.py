@@ -4,6 +4,7 @@ Agent实体 - 代表团队中的一个智能体成员
 from dataclasses import dataclass, field
 from typing import Optional, List, Dict
 from enum import Enum
+from .versioning import next_version, observe_version
 
 
 class AgentStatus(Enum):
@@ -22,20 +23,24 @@ class Agent:
     skills: List[str] = field(default_factory=list)
     status: AgentStatus = AgentStatus.IDLE
     current_task: Optional[str] = None
+    version: int = field(default_factory=next_version)
     
     def start_discussion(self):
         """开始讨论"""
         self.status = AgentStatus.DISCUSSING
+        self.version = next_version()
     
     def start_working(self, task: str):
         """开始工作"""
         self.status = AgentStatus.WORKING
         self.current_task = task
+        self.version = next_version()
     
     def finish_work(self):
         """完成工作"""
         self.status = AgentStatus.IDLE
         self.current_task = None
+        self.version = next_version()
     
     def is_available(self) -> bool:
         """是否可用"""
@@ -49,5 +54,20 @@ class Agent:
             "role": self.role,
             "skills": self.skills,
             "status": self.status.value,
-            "current_task": self.current_task
+            "current_task": self.current_task,
+            "version": self.version
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Agent":
+        """从字典恢复（to_dict的逆操作）"""
+        observe_version(data["version"])
+        return cls(
+            id=data["id"],
+            name=data["name"],
+            role=data["role"],
+            skills=list(data.get("skills", [])),
+            status=AgentStatus(data["status"]),
+            current_task=data.get("current_task"),
+            version=data["version"]
+        )
@@ -18,5 +18,10 @@ class Consensus:
             "discussion_id": self.discussion_id
         }
     
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Consensus":
+        """从字典恢复"""
+        return cls(content=data["content"], discussion_id=data["discussion_id"])
+    
     def __str__(self) -> str:
         return self.content
@@ -1,10 +1,13 @@
 """
 Discussion聚合根 - 代表一次团队讨论
 """
+import uuid
 from dataclasses import dataclass, field
 from typing import List, Dict, Optional
 from datetime import datetime
 from enum import Enum
+from .versioning import next_version, observe_version
+from .events import EventSource
 
 
 class DiscussionStatus(Enum):
@@ -22,20 +25,41 @@ class Message:
     content: str
     round: int
     timestamp: str = field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    streaming: bool = False  # 是否仍在流式生成中
+    version: int = field(default_factory=next_version)
     
     def to_dict(self) -> Dict:
         return {
+            "id": self.id,
             "agent_id": self.agent_id,
             "agent_name": self.agent_name,
             "content": self.content,
             "round": self.round,
-            "timestamp": self.timestamp
+            "timestamp": self.timestamp,
+            "streaming": self.streaming,
+            "version": self.version
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Message":
+        """从字典恢复（to_dict的逆操作）"""
+        observe_version(data["version"])
+        return cls(
+            agent_id=data["agent_id"],
+            agent_name=data["agent_name"],
+            content=data["content"],
+            round=data["round"],
+            timestamp=data["timestamp"],
+            id=data["id"],
+            streaming=data.get("streaming", False),
+            version=data["version"]
+        )
 
 
 @dataclass
-class Discussion:
-    """讨论聚合根"""
+class Discussion(EventSource):
+    """讨论聚合根（变更以领域事件发布，见EventSource）"""
     id: str
     topic: str
     messages: List[Message] = field(default_factory=list)
@@ -45,31 +69,119 @@ class Discussion:
     consensus: Optional[str] = None
     started_at: str = field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
     ended_at: Optional[str] = None
+    version: int = field(default_factory=next_version)
+    # 已移除消息的ID及移除时的版本号（用于增量同步）
+    removed_message_ids: Dict[str, int] = field(default_factory=dict)
+    # 共识预检结果计数：divergent（跳过了大模型判断）、convergent（改为总结共识）、uncertain
+    consensus_prechecks: Dict[str, int] = field(default_factory=dict)
+    # 讨论消耗的token（意见生成、共识判断等所有调用）
+    tokens_used: int = 0
+    # 每轮结束时轮次策略的决定及其依据的信号（见RoundPolicy）
+    round_decisions: List[Dict] = field(default_factory=list)
+    # 滚动摘要：第1轮至第summary_round轮讨论内容的压缩摘要
+    summary: str = ""
+    summary_round: int = 0
     
-    def add_message(self, agent_id: str, agent_name: str, content: str):
+    def _touch(self, message: Optional[Message] = None) -> int:
+        """推进版本号（消息变化时同时更新消息的版本号）"""
+        self.version = next_version()
+        if message is not None:
+            message.version = self.version
+        return self.version
+    
+    def add_message(self, agent_id: str, agent_name: str, content: str) -> Message:
         """添加消息"""
-        message = Message(
+        return self._append_message(Message(
             agent_id=agent_id,
             agent_name=agent_name,
             content=content,
             round=self.current_round
-        )
+        ))
+    
+    def start_message(self, agent_id: str, agent_name: str) -> Message:
+        """开始一条流式消息（内容随生成逐步追加）"""
+        return self._append_message(Message(
+            agent_id=agent_id,
+            agent_name=agent_name,
+            content="",
+            round=self.current_round,
+            streaming=True
+        ))
+    
+    def _append_message(self, message: Message) -> Message:
         self.messages.append(message)
+        self._touch(message)
+        self._emit("add_message", message=message.to_dict(), version=self.version)
+        return message
+    
+    def append_to_message(self, message: Message, delta: str):
+        """向流式消息追加内容（增量不发布领域事件，完整内容随finish_message发布）"""
+        message.content += delta
+        self._touch(message)
+    
+    def finish_message(self, message: Message, content: str):
+        """完成流式消息"""
+        message.content = content
+        message.streaming = False
+        self._touch(message)
+        self._emit("finish_message", message_id=message.id, content=content, version=self.version)
+    
+    def discard_message(self, message: Message):
+        """丢弃未能完成的流式消息"""
+        if message in self.messages:
+            self.messages.remove(message)
+            self.removed_message_ids[message.id] = self._touch()
+            self._emit("discard_message", message_id=message.id, version=self.version)
     
     def start_new_round(self):
         """开始新一轮讨论"""
         self.current_round += 1
+        self._touch()
+        self._emit("start_new_round", current_round=self.current_round, version=self.version)
     
     def reach_consensus(self, consensus: str):
         """达成共识"""
         self.status = DiscussionStatus.CONSENSUS_REACHED
         self.consensus = consensus
         self.ended_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._touch()
+        self._emit("reach_consensus", status=self.status.value, consensus=consensus, ended_at=self.ended_at,
+                   version=self.version)
     
     def fail(self):
         """讨论失败"""
         self.status = DiscussionStatus.FAILED
         self.ended_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._touch()
+        self._emit("fail", status=self.status.value, ended_at=self.ended_at, version=self.version)
+    
+    def record_consensus_precheck(self, verdict: str):
+        """记录一次共识预检的结果"""
+        self.consensus_prechecks[verdict] = self.consensus_prechecks.get(verdict, 0) + 1
+        self._touch()
+        self._emit("record_consensus_precheck", verdict=verdict, version=self.version)
+    
+    def update_summary(self, summary: str, summary_round: int):
+        """更新滚动摘要（摘要覆盖到第summary_round轮）"""
+        self.summary = summary
+        self.summary_round = summary_round
+        self._touch()
+        self._emit("update_summary", summary=summary, summary_round=summary_round, version=self.version)
+    
+    def record_tokens(self, tokens: int):
+        """累计token消耗（只是统计，不推进版本号）"""
+        self.tokens_used += tokens
+        self._emit("record_tokens", tokens=tokens)
+    
+    def record_round_decision(self, decision: Dict):
+        """记录一次轮次策略的决定"""
+        self.round_decisions.append(decision)
+        self._touch()
+        self._emit("record_round_decision", decision=decision, version=self.version)
+    
+    def get_llm_calls_saved(self) -> int:
+        """共识预检省去的大模型调用次数"""
+        return self.consensus_prechecks.get("divergent", 0)
     
     def is_finished(self) -> bool:
         """是否已结束"""
@@ -83,16 +195,65 @@ class Discussion:
         """获取最近的消息"""
         return self.messages[-count:] if len(self.messages) > count else self.messages
     
-    def to_dict(self) -> Dict:
-        """转换为字典"""
-        return {
+    def get_unsummarized_messages(self, count: Optional[int] = None) -> List[Message]:
+        """获取尚未并入摘要的消息（提供count时只取最近的count条）"""
+        messages = [msg for msg in self.messages if msg.round > self.summary_round]
+        return messages[-count:] if count is not None else messages
+    
+    def to_dict(self, since: Optional[int] = None) -> Dict:
+        """
+        转换为字典
+        
+        Args:
+            since: 提供时只包含该版本之后变化过的消息，以及之后被移除的消息ID（增量）
+        """
+        if since is None:
+            messages = self.messages
+        else:
+            messages = [msg for msg in self.messages if msg.version > since]
+        data = {
             "id": self.id,
             "topic": self.topic,
-            "messages": [msg.to_dict() for msg in self.messages],
+            "messages": [msg.to_dict() for msg in messages],
             "current_round": self.current_round,
             "max_rounds": self.max_rounds,
             "status": self.status.value,
             "consensus": self.consensus,
             "started_at": self.started_at,
-            "ended_at": self.ended_at
+            "ended_at": self.ended_at,
+            "consensus_precheck": dict(self.consensus_prechecks, llm_calls_saved=self.get_llm_calls_saved()),
+            "tokens_used": self.tokens_used,
+            "round_decisions": self.round_decisions,
+            "summary": self.summary,
+            "summary_round": self.summary_round,
+            "version": self.version
         }
+        if since is not None:
+            data["removed_message_ids"] = [
+                message_id for message_id, version in self.removed_message_ids.items() if version > since
+            ]
+        return data
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Discussion":
+        """从字典恢复（to_dict的逆操作，需包含全部消息）"""
+        observe_version(data["version"])
+        prechecks = dict(data.get("consensus_precheck", {}))
+        prechecks.pop("llm_calls_saved", None)
+        return cls(
+            id=data["id"],
+            topic=data["topic"],
+            messages=[Message.from_dict(message) for message in data.get("messages", [])],
+            current_round=data["current_round"],
+            max_rounds=data["max_rounds"],
+            status=DiscussionStatus(data["status"]),
+            consensus=data.get("consensus"),
+            started_at=data["started_at"],
+            ended_at=data.get("ended_at"),
+            version=data["version"],
+            consensus_prechecks=prechecks,
+            tokens_used=data.get("tokens_used", 0),
+            round_decisions=list(data.get("round_decisions", [])),
+            summary=data.get("summary", ""),
+            summary_round=data.get("summary_round", 0)
+        )
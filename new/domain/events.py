@@ -0,0 +1,29 @@
+"""
+领域事件 - 聚合的每次变更以紧凑事件的形式通知监听者（用于事件日志）
+"""
+from typing import Callable, Dict, Optional
+
+
+EventListener = Callable[[str, Dict], None]
+
+
+class EventSource:
+    """
+    可发布领域事件的对象
+
+    变更方法在修改状态后调用_emit(事件类型, **数据)，数据为变更后的字段值（及版本号），
+    足以在to_dict()得到的字典上重放该变更。未设置监听者时不做任何事。
+    """
+
+    _event_listener: Optional[EventListener] = None
+
+    def set_event_listener(self, listener: Optional[EventListener]):
+        """设置监听者 listener(event_type, data)，None表示取消"""
+        self._event_listener = listener
+
+    def has_event_listener(self) -> bool:
+        return self._event_listener is not None
+
+    def _emit(self, event_type: str, **data):
+        if self._event_listener is not None:
+            self._event_listener(event_type, data)
@@ -6,21 +6,45 @@ from typing import List, Dict, Optional
 from datetime import datetime
 from .task import Task
 from .consensus import Consensus
+from .versioning import next_version, observe_version
+from .events import EventSource, EventListener
 
 
 @dataclass
-class Plan:
-    """计划聚合根"""
+class Plan(EventSource):
+    """计划聚合根（计划及其任务的变更以领域事件发布，见EventSource）"""
     id: str
     goal: str
     consensus: Consensus
     tasks: List[Task] = field(default_factory=list)
     created_at: str = field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
     completed_at: Optional[str] = None
+    # 总agent的最终反馈及产生它的输入指纹
+    final_feedback: Optional[str] = None
+    feedback_fingerprint: Optional[str] = None
+    version: int = field(default_factory=next_version)
     
     def add_task(self, task: Task):
         """添加任务"""
         self.tasks.append(task)
+        self.version = next_version()
+        self._watch_task(task)
+        self._emit("add_task", task=dict(task.to_dict(), result=task.result, fingerprint=task.fingerprint),
+                   version=self.version)
+    
+    def update_goal(self, goal: str):
+        """修改目标"""
+        self.goal = goal
+        self.version = next_version()
+        self._emit("update_goal", goal=goal, version=self.version)
+    
+    def set_final_feedback(self, feedback: str, fingerprint: Optional[str] = None):
+        """记录最终反馈"""
+        self.final_feedback = feedback
+        self.feedback_fingerprint = fingerprint
+        self.version = next_version()
+        self._emit("set_final_feedback", final_feedback=feedback, feedback_fingerprint=fingerprint,
+                   version=self.version)
     
     def get_task(self, task_id: str) -> Optional[Task]:
         """获取任务"""
@@ -47,16 +71,60 @@ class Plan:
     def complete(self):
         """完成计划"""
         self.completed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.version = next_version()
+        self._emit("complete", completed_at=self.completed_at, version=self.version)
+    
+    def set_event_listener(self, listener: Optional[EventListener]):
+        """设置监听者，任务的变更以"task."为前缀、附带task_id转发给同一监听者"""
+        super().set_event_listener(listener)
+        for task in self.tasks:
+            self._watch_task(task)
     
-    def to_dict(self) -> Dict:
-        """转换为字典"""
+    def _watch_task(self, task: Task):
+        if self._event_listener is None:
+            task.set_event_listener(None)
+            return
+        listener = self._event_listener
+        task.set_event_listener(
+            lambda event_type, data: listener("task." + event_type, dict(data, task_id=task.id))
+        )
+    
+    def get_version(self) -> int:
+        """获取版本号（包含任务的变化）"""
+        return max([self.version] + [task.version for task in self.tasks])
+    
+    def to_dict(self, since: Optional[int] = None) -> Dict:
+        """
+        转换为字典
+        
+        Args:
+            since: 提供时只包含该版本之后变化过的任务（增量）
+        """
+        tasks = self.tasks if since is None else [task for task in self.tasks if task.version > since]
         return {
             "id": self.id,
             "goal": self.goal,
             "consensus": self.consensus.to_dict(),
-            "tasks": [task.to_dict() for task in self.tasks],
+            "tasks": [task.to_dict() for task in tasks],
             "progress": self.get_progress(),
             "created_at": self.created_at,
             "completed_at": self.completed_at,
-            "is_completed": self.is_completed()
+            "is_completed": self.is_completed(),
+            "version": self.get_version()
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Plan":
+        """从字典恢复（to_dict的逆操作，另外读取可选的final_feedback、feedback_fingerprint）"""
+        observe_version(data["version"])
+        return cls(
+            id=data["id"],
+            goal=data["goal"],
+            consensus=Consensus.from_dict(data["consensus"]),
+            tasks=[Task.from_dict(task) for task in data.get("tasks", [])],
+            created_at=data["created_at"],
+            completed_at=data.get("completed_at"),
+            final_feedback=data.get("final_feedback"),
+            feedback_fingerprint=data.get("feedback_fingerprint"),
+            version=data["version"]
+        )
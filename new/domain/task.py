@@ -2,9 +2,11 @@
 Task实体 - 代表一个具体任务
 """
 from dataclasses import dataclass, field
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from enum import Enum
 from datetime import datetime
+from .versioning import next_version, observe_version
+from .events import EventSource
 
 
 class TaskStatus(Enum):
@@ -15,8 +17,8 @@ class TaskStatus(Enum):
 
 
 @dataclass
-class Task:
-    """任务实体"""
+class Task(EventSource):
+    """任务实体（变更以领域事件发布，由所属计划转发，见Plan.set_event_listener）"""
     id: str
     description: str
     assignee_id: Optional[str] = None
@@ -26,16 +28,38 @@ class Task:
     result: Optional[str] = None
     created_at: str = field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
     completed_at: Optional[str] = None
+    depends_on: List[str] = field(default_factory=list)  # 前置任务的ID
+    fingerprint: Optional[str] = None   # 产生当前结果的输入指纹（提示词与模型配置），结果失败时为None
+    version: int = field(default_factory=next_version)
     
     def assign_to(self, agent_id: str, agent_name: str):
         """分配给Agent"""
         self.assignee_id = agent_id
         self.assignee_name = agent_name
         self.status = TaskStatus.IN_PROGRESS
+        self.version = next_version()
+        self._emit("assign_to", assignee_id=agent_id, assignee_name=agent_name, status=self.status.value,
+                   version=self.version)
+    
+    def update_details(self, description: str, assignee_name: str):
+        """修改任务描述和负责人"""
+        self.description = description
+        self.assignee_name = assignee_name
+        self.version = next_version()
+        self._emit("update_details", description=description, assignee_name=assignee_name, version=self.version)
+    
+    def set_result(self, result: str, fingerprint: Optional[str] = None):
+        """记录执行结果（fingerprint为产生该结果的输入指纹，用于重新执行时复用结果）"""
+        self.result = result
+        self.fingerprint = fingerprint
+        self.version = next_version()
+        self._emit("set_result", result=result, fingerprint=fingerprint, version=self.version)
     
     def update_progress(self, progress: int):
         """更新进度"""
         self.progress = min(100, max(0, progress))
+        self.version = next_version()
+        self._emit("update_progress", progress=self.progress, version=self.version)
         if self.progress >= 100:
             self.complete()
     
@@ -44,6 +68,9 @@ class Task:
         self.status = TaskStatus.COMPLETED
         self.progress = 100
         self.completed_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self.version = next_version()
+        self._emit("complete", status=self.status.value, progress=self.progress, completed_at=self.completed_at,
+                   version=self.version)
     
     def is_completed(self) -> bool:
         """是否已完成"""
@@ -59,5 +86,26 @@ class Task:
             "status": self.status.value,
             "progress": self.progress,
             "created_at": self.created_at,
-            "completed_at": self.completed_at
+            "completed_at": self.completed_at,
+            "depends_on": self.depends_on,
+            "version": self.version
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Task":
+        """从字典恢复（to_dict的逆操作，另外读取可选的result、fingerprint）"""
+        observe_version(data["version"])
+        return cls(
+            id=data["id"],
+            description=data["description"],
+            assignee_id=data.get("assignee_id"),
+            assignee_name=data.get("assignee_name"),
+            status=TaskStatus(data["status"]),
+            progress=data.get("progress", 0),
+            result=data.get("result"),
+            created_at=data["created_at"],
+            completed_at=data.get("completed_at"),
+            depends_on=list(data.get("depends_on", [])),
+            fingerprint=data.get("fingerprint"),
+            version=data["version"]
+        )
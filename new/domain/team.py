@@ -4,6 +4,7 @@ Team聚合根 - 代表一个AI团队
 from dataclasses import dataclass, field
 from typing import List, Dict, Optional
 from .agent import Agent
+from .versioning import next_version, observe_version
 
 
 @dataclass
@@ -12,15 +13,18 @@ class Team:
     id: str
     name: str
     agents: Dict[str, Agent] = field(default_factory=dict)  # 使用字典，O(1)查找
+    version: int = field(default_factory=next_version)
     
     def add_agent(self, agent: Agent):
         """添加成员"""
         self.agents[agent.id] = agent
+        self.version = next_version()
     
     def remove_agent(self, agent_id: str):
         """移除成员"""
         if agent_id in self.agents:
             del self.agents[agent_id]
+            self.version = next_version()
     
     def get_agent(self, agent_id: str) -> Optional[Agent]:
         """获取成员"""
@@ -48,11 +52,28 @@ class Team:
         for agent in self.agents.values():
             agent.finish_work()
     
+    def get_version(self) -> int:
+        """获取版本号（包含成员的变化）"""
+        return max([self.version] + [agent.version for agent in self.agents.values()])
+    
     def to_dict(self) -> Dict:
         """转换为字典"""
         return {
             "id": self.id,
             "name": self.name,
             "agents": [agent.to_dict() for agent in self.agents.values()],
-            "agent_count": self.get_agent_count()
+            "agent_count": self.get_agent_count(),
+            "version": self.get_version()
         }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "Team":
+        """从字典恢复（to_dict的逆操作）"""
+        observe_version(data["version"])
+        agents = [Agent.from_dict(agent) for agent in data.get("agents", [])]
+        return cls(
+            id=data["id"],
+            name=data["name"],
+            agents={agent.id: agent for agent in agents},
+            version=data["version"]
+        )
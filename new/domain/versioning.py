@@ -0,0 +1,27 @@
+"""
+版本计数 - 为聚合提供全局单调递增的版本号
+"""
+import threading
+
+_last_version = 0
+_lock = threading.Lock()
+
+
+def next_version() -> int:
+    """
+    获取下一个版本号
+
+    所有聚合共享同一个计数器，因此不同对象的版本号可以相互比较，
+    客户端用一个版本号即可询问"此后发生了哪些变化"。
+    """
+    global _last_version
+    with _lock:
+        _last_version += 1
+        return _last_version
+
+
+def observe_version(version: int):
+    """确保之后分配的版本号大于version（从持久化存储恢复对象时调用）"""
+    global _last_version
+    with _lock:
+        _last_version = max(_last_version, version)
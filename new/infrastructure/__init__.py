@@ -1,5 +1,14 @@
 """Infrastructure层 - 基础设施"""
-from .ai_service import AIService, AIConfig
+from .ai_service import AIService, AIConfig, AIServiceCore, ModelProfile
+from .async_ai_service import AsyncAIService, AsyncAIServiceAdapter
+from .admission import AdmissionController
+from .concurrency import SharedLimiter
+from .endpoint_pool import EndpointPool
+from .event_bus import EventBus
+from .state_backend import StateBackend, SQLiteStateBackend
+from .event_log import EventLogStateBackend
 from .state_store import StateStore
 
-__all__ = ['AIService', 'AIConfig', 'StateStore']
+__all__ = ['AIService', 'AIConfig', 'AIServiceCore', 'ModelProfile', 'AsyncAIService', 'AsyncAIServiceAdapter',
+           'AdmissionController', 'SharedLimiter', 'EndpointPool', 'EventBus', 'StateBackend',
+           'SQLiteStateBackend', 'EventLogStateBackend', 'StateStore']
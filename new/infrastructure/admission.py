@@ -0,0 +1,294 @@
+"""
+准入控制 - 模型服务的速率限制与并发控制
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Optional, Tuple
+
+
+TRAFFIC_CLASSES = ("discussion", "planning", "execution", "default")
+
+
+class TokenBucket:
+    """令牌桶（调用方负责加锁）"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate            # 每秒补充的令牌数
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def refill(self, now: float):
+        """按经过的时间补充令牌"""
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def can_take(self, amount: float) -> bool:
+        """是否有足够的令牌；超过桶容量的请求在桶满时放行，避免永远无法通过"""
+        return self.tokens >= min(amount, self.capacity)
+
+    def take(self, amount: float):
+        """扣除令牌（允许透支，透支部分由后续补充抵消；负数表示退还）"""
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+    def wait_time(self, amount: float) -> float:
+        """令牌足够前需要等待的时间"""
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate) if self.rate > 0 else float("inf")
+
+
+@dataclass
+class Admission:
+    """一次准入许可"""
+    traffic_class: str
+    estimated_tokens: int
+    granted: bool = False
+    created_at: float = field(default_factory=time.monotonic)
+    admitted_at: Optional[float] = None
+    _event: threading.Event = field(default_factory=threading.Event, repr=False)
+    _loop: Optional[asyncio.AbstractEventLoop] = field(default=None, repr=False)
+    _future: Optional[asyncio.Future] = field(default=None, repr=False)
+
+
+class AdmissionController:
+    """
+    准入控制器
+
+    在请求发往模型服务之前施加三类限制：
+    - 请求令牌桶：每秒请求数（requests_per_second，突发上限request_burst）
+    - token令牌桶：每分钟估算token数（tokens_per_minute），请求结束后按实际用量校正
+    - 在途上限：同时进行的请求数（max_in_flight）
+
+    等待中的请求按流量类别（讨论、计划、执行）轮转调度，某一类的大量请求不会饿死其他类别。
+    policy为"block"时等待准入（最长timeout秒），为"fail_fast"时无法立即准入直接拒绝。
+    模型服务返回429时调用backoff暂停放行。
+    """
+
+    def __init__(self, requests_per_second: Optional[float] = None, request_burst: Optional[int] = None,
+                 tokens_per_minute: Optional[int] = None, max_in_flight: Optional[int] = None,
+                 policy: str = "block", timeout: Optional[float] = None):
+        if policy not in ("block", "fail_fast"):
+            raise ValueError(f"未知的准入策略：{policy}")
+        self.policy = policy
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self._request_bucket = TokenBucket(
+            requests_per_second, request_burst or max(1, int(requests_per_second))
+        ) if requests_per_second else None
+        self._token_bucket = TokenBucket(
+            tokens_per_minute / 60.0, tokens_per_minute
+        ) if tokens_per_minute else None
+        self._lock = threading.Lock()
+        self._queues: Dict[str, Deque[Admission]] = {name: deque() for name in TRAFFIC_CLASSES}
+        self._next_class = 0
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._stats = {
+            "admitted": 0,
+            "rejected": 0,
+            "waited": 0,
+            "total_wait_time": 0.0,
+            "backoffs": 0
+        }
+        self._class_stats = {name: {"admitted": 0, "rejected": 0} for name in TRAFFIC_CLASSES}
+
+    @staticmethod
+    def estimate_tokens(prompt: str, max_tokens: int) -> int:
+        """估算一次请求的token数（提示词按约每2个字符1个token估算，加上最大生成长度）"""
+        return len(prompt) // 2 + max_tokens
+
+    # 同步接口
+    def acquire(self, traffic_class: str, estimated_tokens: int) -> Optional[Admission]:
+        """同步申请准入，被拒绝时返回None"""
+        admission = self._enqueue(traffic_class, estimated_tokens)
+        if admission is None or admission.granted:
+            return admission
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        while True:
+            with self._lock:
+                self._dispatch()
+                if admission.granted:
+                    return admission
+                delay = self._next_delay()
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._reject_waiting(admission)
+                        return None
+                    delay = min(delay, remaining)
+            admission._event.wait(delay)
+
+    # 异步接口
+    async def acquire_async(self, traffic_class: str, estimated_tokens: int) -> Optional[Admission]:
+        """异步申请准入，被拒绝时返回None"""
+        loop = asyncio.get_running_loop()
+        admission = self._enqueue(traffic_class, estimated_tokens, loop)
+        if admission is None or admission.granted:
+            return admission
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        try:
+            while True:
+                with self._lock:
+                    self._dispatch()
+                    if admission.granted:
+                        return admission
+                    delay = self._next_delay()
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._reject_waiting(admission)
+                            return None
+                        delay = min(delay, remaining)
+                try:
+                    await asyncio.wait_for(asyncio.shield(admission._future), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = admission.granted
+                if not granted:
+                    self._remove_waiting(admission)
+            if granted:
+                self.release(admission)
+            raise
+
+    def release(self, admission: Admission, actual_tokens: Optional[int] = None):
+        """请求结束，归还在途名额并按实际token用量校正"""
+        with self._lock:
+            self._in_flight -= 1
+            if self._token_bucket is not None and actual_tokens:
+                # 实际用量少于估算时退还差额，多于估算时补扣
+                self._token_bucket.take(actual_tokens - admission.estimated_tokens)
+            self._dispatch()
+
+    def backoff(self, seconds: float):
+        """模型服务提示限流（429）时暂停放行"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._stats["backoffs"] += 1
+
+    def _enqueue(self, traffic_class: str, estimated_tokens: int,
+                 loop: Optional[asyncio.AbstractEventLoop] = None) -> Optional[Admission]:
+        """登记准入申请；能立即准入时直接放行，fail_fast策略下无法立即准入时拒绝"""
+        if traffic_class not in self._queues:
+            traffic_class = "default"
+        admission = Admission(traffic_class=traffic_class, estimated_tokens=estimated_tokens)
+        if loop is not None:
+            admission._loop = loop
+            admission._future = loop.create_future()
+        with self._lock:
+            self._queues[traffic_class].append(admission)
+            self._dispatch()
+            if admission.granted:
+                return admission
+            if self.policy == "fail_fast":
+                self._reject_waiting(admission)
+                return None
+            self._stats["waited"] += 1
+            return admission
+
+    def _dispatch(self):
+        """按类别轮转放行等待中的申请（调用方持有锁）"""
+        now = time.monotonic()
+        if now < self._paused_until:
+            return
+        for bucket in (self._request_bucket, self._token_bucket):
+            if bucket is not None:
+                bucket.refill(now)
+
+        while True:
+            index, admission = self._next_in_turn()
+            if admission is None or not self._has_capacity(admission):
+                return
+            self._queues[admission.traffic_class].popleft()
+            # 放行后轮转到下一个类别
+            self._next_class = (index + 1) % len(TRAFFIC_CLASSES)
+            self._grant(admission, now)
+
+    def _next_in_turn(self) -> Tuple[int, Optional[Admission]]:
+        """轮到的类别及其队首申请（调用方持有锁）"""
+        for offset in range(len(TRAFFIC_CLASSES)):
+            index = (self._next_class + offset) % len(TRAFFIC_CLASSES)
+            queue = self._queues[TRAFFIC_CLASSES[index]]
+            if queue:
+                return index, queue[0]
+        return -1, None
+
+    def _has_capacity(self, admission: Admission) -> bool:
+        """当前是否能放行该申请（调用方持有锁）"""
+        if self.max_in_flight is not None and self._in_flight >= self.max_in_flight:
+            return False
+        if self._request_bucket is not None and not self._request_bucket.can_take(1):
+            return False
+        if self._token_bucket is not None and not self._token_bucket.can_take(admission.estimated_tokens):
+            return False
+        return True
+
+    def _grant(self, admission: Admission, now: float):
+        """放行申请（调用方持有锁）"""
+        if self._request_bucket is not None:
+            self._request_bucket.take(1)
+        if self._token_bucket is not None:
+            self._token_bucket.take(admission.estimated_tokens)
+        self._in_flight += 1
+        admission.granted = True
+        admission.admitted_at = now
+        self._stats["admitted"] += 1
+        self._stats["total_wait_time"] += now - admission.created_at
+        self._class_stats[admission.traffic_class]["admitted"] += 1
+        admission._event.set()
+        if admission._future is not None and not admission._loop.is_closed():
+            admission._loop.call_soon_threadsafe(self._resolve, admission._future)
+
+    @staticmethod
+    def _resolve(future: asyncio.Future):
+        if not future.done():
+            future.set_result(None)
+
+    def _next_delay(self) -> float:
+        """
+        下一次尝试放行前的等待时间（调用方持有锁）
+
+        在途名额由release直接移交，令牌不足或暂停放行时按预计补足的时间等待，
+        最长0.5秒后重新检查。
+        """
+        delays = []
+        now = time.monotonic()
+        if now < self._paused_until:
+            delays.append(self._paused_until - now)
+        _, head = self._next_in_turn()
+        if head is not None:
+            if self._request_bucket is not None:
+                delays.append(self._request_bucket.wait_time(1))
+            if self._token_bucket is not None:
+                delays.append(self._token_bucket.wait_time(head.estimated_tokens))
+        delay = max(delays) if delays else 0.5
+        return min(max(delay, 0.01), 0.5)
+
+    def _remove_waiting(self, admission: Admission):
+        """移除等待中的申请（调用方持有锁）"""
+        queue = self._queues[admission.traffic_class]
+        if admission in queue:
+            queue.remove(admission)
+
+    def _reject_waiting(self, admission: Admission):
+        """拒绝等待中的申请（调用方持有锁）"""
+        self._remove_waiting(admission)
+        self._stats["rejected"] += 1
+        self._class_stats[admission.traffic_class]["rejected"] += 1
+
+    def get_stats(self) -> Dict:
+        """获取准入统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["policy"] = self.policy
+            stats["in_flight"] = self._in_flight
+            stats["waiting"] = sum(len(queue) for queue in self._queues.values())
+            stats["classes"] = {
+                name: dict(self._class_stats[name], waiting=len(self._queues[name]))
+                for name in TRAFFIC_CLASSES
+            }
+            return stats
@@ -1,9 +1,20 @@
 """
 AI服务 - 统一的AI调用接口
 """
+import json
+import threading
+import time
 import requests
-from typing import Dict, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from typing import Callable, Dict, List, Optional, Tuple
 from dataclasses import dataclass
+from .admission import Admission, AdmissionController
+from .endpoint_pool import Endpoint, EndpointPool
+from .micro_batch import MicroBatcher
+from .resilience import AttemptMetrics, CircuitBreaker, LatencyTracker, backoff_delay
+from .response_cache import ResponseCache
+from .single_flight import SingleFlight
 
 
 @dataclass
@@ -14,19 +25,521 @@ class AIConfig:
     api_key: str
     max_tokens: int = 2000
     temperature: float = 0.7
+    # 连接池配置
+    pool_connections: int = 10      # 缓存的主机连接池数量
+    pool_maxsize: int = 20          # 每个主机保持的最大连接数
+    pool_block: bool = False        # 连接数达到上限时是否阻塞等待空闲连接
+    keep_alive: bool = True         # 是否复用长连接
+    connect_timeout: float = 5.0    # 建立连接超时（秒）
+    read_timeout: float = 60.0      # 读取响应超时（秒）
+    # 响应缓存配置
+    cache_enabled: bool = False
+    cache_max_entries: int = 1000               # 内存层最大条目数
+    cache_max_bytes: int = 50 * 1024 * 1024     # 内存层最大文本字节数
+    cache_ttl: Optional[float] = 3600           # 过期时间（秒），None表示不过期
+    cache_path: Optional[str] = None            # SQLite磁盘层路径，None表示仅使用内存
+    cache_disk_max_entries: int = 10000         # 磁盘层最大条目数
+    cache_nonzero_temperature: bool = False     # 是否允许缓存temperature>0的调用
+    # 单飞合并：相同请求在途时，后到的调用等待同一结果
+    coalesce_requests: bool = True
+    # 微批合并：收集窗口内到达的并发调用（max_tokens、流量类别和亲和键相同）合并为一次多提示词请求
+    batch_window: Optional[float] = None        # 收集窗口（秒，如0.01），None表示不启用
+    max_batch_size: int = 8                     # 单批最多提示词数
+    # 准入控制（限制均为None时不启用）
+    rate_limit_rps: Optional[float] = None      # 每秒请求数上限
+    rate_limit_burst: Optional[int] = None      # 请求突发上限，默认等于每秒请求数
+    rate_limit_tpm: Optional[int] = None        # 每分钟估算token数上限
+    max_in_flight: Optional[int] = None         # 同时进行的请求数上限
+    admission_policy: str = "block"             # block：排队等待；fail_fast：无法立即准入时直接失败
+    admission_timeout: Optional[float] = None   # block策略下的最长等待时间（秒），None表示一直等待
+    # 重试：连接错误、超时、429和5xx按指数退避（带抖动）重试
+    max_retries: int = 2
+    retry_backoff_base: float = 0.5             # 首次重试的最大等待时间（秒）
+    retry_backoff_max: float = 8.0              # 单次重试的最大等待时间（秒）
+    # 对冲请求：调用超过阈值仍未返回时再发一个相同请求，先成功者生效
+    hedge_requests: bool = False
+    hedge_after: Optional[float] = None         # 触发阈值（秒），None表示使用最近调用延迟的p95
+    hedge_min_samples: int = 20                 # 使用p95前需要的最少样本数
+    # 熔断器：连续失败达到阈值后在一段时间内直接失败
+    circuit_breaker_threshold: int = 5          # 0表示不启用
+    circuit_breaker_reset: float = 30.0         # 断开后多久放行试探调用（秒）
+    # 多副本负载均衡：设置base_urls时在多个端点之间路由请求（此时忽略base_url）
+    base_urls: Optional[List[str]] = None
+    routing_strategy: str = "least_outstanding" # least_outstanding：最少进行中请求；ewma：最低加权延迟
+    endpoint_eject_after: int = 3               # 端点连续失败多少次后摘除
+    endpoint_eject_duration: float = 30.0       # 摘除时长（秒），到期后重新加入
 
 
-class AIService:
-    """AI服务"""
+@dataclass
+class ModelProfile:
+    """
+    调用点的模型配置（未设置的字段沿用AIConfig）
+
+    base_urls为该模型所在的端点，设置时必须同时指定model；
+    同一模型的端点以首次使用的配置为准，负载均衡和健康检查沿用AIConfig中的设置。
+    """
+    model: Optional[str] = None
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    base_urls: Optional[List[str]] = None
+
+    def __post_init__(self):
+        if self.base_urls and not self.model:
+            raise ValueError("指定base_urls时必须同时指定model")
+
+
+class AIServiceCore:
+    """
+    AI服务的共享状态：缓存、单飞合并、微批、准入控制、熔断、端点池、延迟与调用统计和token计数
+
+    同步AIService与异步AsyncAIService包装同一个核心时（见create_async_ai_service），
+    速率限制和在途上限对两者的请求合并生效，缓存、熔断状态和端点健康状态也互相可见。
+    """
     
     def __init__(self, config: AIConfig):
         self.config = config
         self.total_tokens = 0
+        self.lock = threading.Lock()
+        self.cache = ResponseCache(
+            max_entries=config.cache_max_entries,
+            max_bytes=config.cache_max_bytes,
+            ttl=config.cache_ttl,
+            disk_path=config.cache_path,
+            disk_max_entries=config.cache_disk_max_entries
+        ) if config.cache_enabled else None
+        self.single_flight = SingleFlight() if config.coalesce_requests else None
+        self.batcher = MicroBatcher(
+            config.batch_window, config.max_batch_size
+        ) if config.batch_window is not None else None
+        self.admission = AdmissionController(
+            requests_per_second=config.rate_limit_rps,
+            request_burst=config.rate_limit_burst,
+            tokens_per_minute=config.rate_limit_tpm,
+            max_in_flight=config.max_in_flight,
+            policy=config.admission_policy,
+            timeout=config.admission_timeout
+        ) if (config.rate_limit_rps or config.rate_limit_tpm or config.max_in_flight) else None
+        self.circuit_breaker = CircuitBreaker(
+            config.circuit_breaker_threshold, config.circuit_breaker_reset
+        ) if config.circuit_breaker_threshold > 0 else None
+        self.latency = LatencyTracker()
+        self.attempt_metrics = AttemptMetrics()
+        self.endpoints = self.create_endpoint_pool(config.base_urls or [config.base_url])
+        # 模型配置指定了独立端点的模型
+        self.model_endpoints: Dict[str, EndpointPool] = {}
+    
+    def create_endpoint_pool(self, urls: List[str]) -> EndpointPool:
+        """按配置创建端点池"""
+        return EndpointPool(
+            urls,
+            strategy=self.config.routing_strategy,
+            eject_after=self.config.endpoint_eject_after,
+            eject_duration=self.config.endpoint_eject_duration
+        )
+
+
+class BaseAIService:
+    """
+    AI服务基类 - 同步与异步实现共享的请求构造、响应解析和统计逻辑
+
+    缓存、准入控制等状态保存在core（AIServiceCore）中，未提供时创建独立的核心。
+    """
+    
+    def __init__(self, config: AIConfig, core: Optional[AIServiceCore] = None):
+        self.config = config
+        self.core = core or AIServiceCore(config)
+        self._lock = self.core.lock
+        self.cache = self.core.cache
+        self.single_flight = self.core.single_flight
+        self.batcher = self.core.batcher
+        self.admission = self.core.admission
+        self.circuit_breaker = self.core.circuit_breaker
+        self.latency = self.core.latency
+        self.attempt_metrics = self.core.attempt_metrics
+        self.endpoints = self.core.endpoints
+        self._model_endpoints = self.core.model_endpoints
+    
+    @property
+    def total_tokens(self) -> int:
+        """总token消耗（与共享核心的其他服务合计）"""
+        return self.core.total_tokens
+    
+    @total_tokens.setter
+    def total_tokens(self, value: int):
+        self.core.total_tokens = value
+    
+    def _create_endpoint_pool(self, urls: List[str]) -> EndpointPool:
+        """按配置创建端点池"""
+        return self.core.create_endpoint_pool(urls)
+    
+    def _endpoint_pool(self, payload: Dict) -> EndpointPool:
+        """请求所用模型的端点池"""
+        return self._model_endpoints.get(payload["model"], self.endpoints)
+    
+    def _build_headers(self) -> Dict:
+        """构造请求头"""
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.config.api_key}",
+            "Connection": "keep-alive" if self.config.keep_alive else "close"
+        }
+    
+    def _build_payload(self, prompt: str, max_tokens: Optional[int] = None,
+                       profile: Optional[ModelProfile] = None) -> Dict:
+        """构造请求体（显式的max_tokens优先于模型配置）"""
+        if profile is None:
+            profile = ModelProfile()
+        elif profile.base_urls and profile.model not in self._model_endpoints:
+            with self._lock:
+                if profile.model not in self._model_endpoints:
+                    self._model_endpoints[profile.model] = self._create_endpoint_pool(profile.base_urls)
+        return {
+            "model": profile.model or self.config.model,
+            "prompt": prompt,
+            "max_tokens": max_tokens or profile.max_tokens or self.config.max_tokens,
+            "temperature": profile.temperature if profile.temperature is not None else self.config.temperature
+        }
+    
+    @staticmethod
+    def _build_batch_payload(payloads: List[Dict]) -> Dict:
+        """将参数相同的多个请求体合并为一个多提示词请求体"""
+        batch_payload = dict(payloads[0])
+        batch_payload["prompt"] = [payload["prompt"] for payload in payloads]
+        return batch_payload
+    
+    @staticmethod
+    def _batch_size(payload: Dict) -> Optional[int]:
+        """多提示词请求的提示词数，单提示词请求返回None"""
+        prompt = payload["prompt"]
+        return len(prompt) if isinstance(prompt, list) else None
+    
+    @staticmethod
+    def _batch_key(payload: Dict, traffic_class: str, affinity_key: Optional[str]) -> Tuple:
+        """可以合并为同一批的调用的键"""
+        return payload["model"], payload["max_tokens"], payload["temperature"], traffic_class, affinity_key
+    
+    def _build_stream_payload(self, payload: Dict) -> Dict:
+        """构造流式请求体"""
+        stream_payload = dict(payload)
+        stream_payload["stream"] = True
+        stream_payload["stream_options"] = {"include_usage": True}
+        return stream_payload
+    
+    @staticmethod
+    def _parse_stream_line(line: str) -> Tuple[str, int, bool]:
+        """
+        解析一行SSE数据
+        
+        Returns:
+            (增量文本, 本行报告的token数, 是否结束)
+        """
+        line = line.strip()
+        if not line.startswith("data:"):
+            return "", 0, False
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return "", 0, True
+        chunk = json.loads(data)
+        choices = chunk.get("choices") or []
+        delta = choices[0].get("text", "") if choices else ""
+        tokens = (chunk.get("usage") or {}).get("total_tokens", 0)
+        return delta or "", tokens, False
+    
+    def _stream_result(self, text: str, tokens: int) -> Dict:
+        """构造流式调用的最终结果并累计token"""
+        with self._lock:
+            self.total_tokens += tokens
+        return {
+            "text": text.strip(),
+            "tokens": tokens,
+            "success": True,
+            "error": None
+        }
+    
+    def _parse_completion(self, result: Dict, batch_size: Optional[int] = None) -> Dict:
+        """
+        解析成功的补全响应并累计token
+        
+        多提示词请求（batch_size不为None）按choices的index排序，各提示词的文本放在texts中。
+        """
+        tokens = result.get("usage", {}).get("total_tokens", 0)
+        if batch_size is None:
+            text = result["choices"][0]["text"].strip()
+        else:
+            choices = sorted(result["choices"], key=lambda choice: choice.get("index", 0))
+            if len(choices) != batch_size:
+                return self._error_result(f"batch size mismatch: {len(choices)}/{batch_size}")
+            text = ""
+        
+        with self._lock:
+            self.total_tokens += tokens
+        
+        parsed = {
+            "text": text,
+            "tokens": tokens,
+            "success": True,
+            "error": None
+        }
+        if batch_size is not None:
+            parsed["texts"] = [choice["text"].strip() for choice in choices]
+        return parsed
+    
+    @staticmethod
+    def _split_batch_result(result: Dict, size: int) -> List[Dict]:
+        """将多提示词请求的结果拆分为各提示词的结果（token用量平均分摊）"""
+        if not result["success"]:
+            return [dict(result) for _ in range(size)]
+        share, remainder = divmod(result["tokens"], size)
+        return [
+            {
+                "text": text,
+                "tokens": share + (remainder if index == 0 else 0),
+                "success": True,
+                "error": None,
+                "batched": True
+            }
+            for index, text in enumerate(result["texts"])
+        ]
+    
+    @staticmethod
+    def _request_key(payload: Dict) -> str:
+        """计算请求的内容键（缓存与单飞合并共用）"""
+        return ResponseCache.make_key(
+            payload["model"], payload["prompt"], payload["max_tokens"], payload["temperature"]
+        )
+    
+    def _cache_key(self, payload: Dict) -> Optional[str]:
+        """计算缓存键；未启用缓存或temperature>0且未显式允许时返回None"""
+        if self.cache is None:
+            return None
+        if payload["temperature"] > 0 and not self.config.cache_nonzero_temperature:
+            self.cache.record_bypass()
+            return None
+        return self._request_key(payload)
+    
+    def _cache_get(self, cache_key: Optional[str]) -> Optional[Dict]:
+        """读取缓存结果（命中时不消耗token）"""
+        if cache_key is None:
+            return None
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            return None
+        return {
+            "text": cached["text"],
+            "tokens": 0,
+            "success": True,
+            "error": None,
+            "cached": True
+        }
+    
+    def _cache_put(self, cache_key: Optional[str], result: Dict):
+        """缓存成功的结果"""
+        if cache_key is not None and result["success"]:
+            self.cache.set(cache_key, {"text": result["text"], "tokens": result["tokens"]})
+    
+    @staticmethod
+    def _coalesced_result(result: Dict) -> Dict:
+        """构造合并调用的结果（token已由执行者计入）"""
+        coalesced = dict(result)
+        coalesced["tokens"] = 0
+        coalesced["coalesced"] = True
+        return coalesced
+    
+    def _estimate_tokens(self, payload: Dict) -> int:
+        """估算请求的token数（用于token速率限制，多提示词请求按各提示词累加）"""
+        prompts = payload["prompt"] if isinstance(payload["prompt"], list) else [payload["prompt"]]
+        return sum(AdmissionController.estimate_tokens(prompt, payload["max_tokens"]) for prompt in prompts)
+    
+    def _release_admission(self, admission: Optional[Admission], result: Optional[Dict]):
+        """归还准入许可并按实际用量校正"""
+        if admission is not None:
+            self.admission.release(admission, result["tokens"] if result else None)
+    
+    def _rejected_result(self, traffic_class: str) -> Dict:
+        """构造被准入控制拒绝的结果（请求未发往模型服务）"""
+        result = self._error_result(f"admission rejected: {traffic_class}")
+        result["rejected"] = True
+        return result
+    
+    def _on_throttled(self, retry_after: Optional[str]):
+        """模型服务返回429时暂停准入"""
+        if self.admission is None:
+            return
+        try:
+            seconds = float(retry_after) if retry_after else 1.0
+        except ValueError:
+            seconds = 1.0
+        self.admission.backoff(seconds)
+    
+    def _circuit_open_result(self) -> Dict:
+        """构造熔断期间的失败结果（请求未发往模型服务）"""
+        self.attempt_metrics.incr("circuit_rejected")
+        result = self._error_result("circuit open")
+        result["circuit_open"] = True
+        return result
+    
+    def _before_attempt(self) -> bool:
+        """每次尝试前检查熔断器"""
+        return self.circuit_breaker is None or self.circuit_breaker.allow()
+    
+    def _after_attempt(self, result: Dict, started_at: float):
+        """记录一次尝试的结果、延迟和熔断状态"""
+        if not result.get("rejected"):
+            self.attempt_metrics.record_attempt(result)
+        if result["success"]:
+            self.latency.record(time.monotonic() - started_at)
+        if self.circuit_breaker is not None:
+            if result["success"]:
+                self.circuit_breaker.record_success()
+            elif result.get("retryable"):
+                self.circuit_breaker.record_failure()
+            else:
+                # 未发出的请求和非瞬时错误（如400）不反映服务可用性
+                self.circuit_breaker.record_ignored()
+    
+    @staticmethod
+    def _release_endpoint(pool: EndpointPool, endpoint: Endpoint, result: Optional[Dict], started_at: float):
+        """请求结束，向端点池报告结果（请求被取消时不计入健康检查）"""
+        if result is None:
+            pool.cancel(endpoint)
+            return
+        pool.release(
+            endpoint, result["success"], time.monotonic() - started_at, result.get("retryable", False)
+        )
+    
+    def _should_retry(self, result: Dict, retry: int) -> bool:
+        """失败结果是否应当重试"""
+        return not result["success"] and result.get("retryable", False) and retry < self.config.max_retries
+    
+    def _retry_delay(self, retry: int) -> float:
+        """第retry次重试前的等待时间"""
+        self.attempt_metrics.incr("retries")
+        return backoff_delay(retry, self.config.retry_backoff_base, self.config.retry_backoff_max)
+    
+    def _hedge_threshold(self) -> Optional[float]:
+        """对冲请求的触发阈值，未启用或样本不足时返回None"""
+        if not self.config.hedge_requests:
+            return None
+        if self.config.hedge_after is not None:
+            return self.config.hedge_after
+        if self.latency.count() < self.config.hedge_min_samples:
+            return None
+        return self.latency.percentile(95)
+    
+    @staticmethod
+    def _error_result(error: str, retryable: bool = False) -> Dict:
+        """构造失败结果（retryable表示可重试的瞬时错误）"""
+        result = {
+            "text": "",
+            "tokens": 0,
+            "success": False,
+            "error": error
+        }
+        if retryable:
+            result["retryable"] = True
+        return result
+    
+    @staticmethod
+    def _http_error_result(status: int) -> Dict:
+        """根据HTTP状态码构造失败结果（429和5xx可重试）"""
+        return BaseAIService._error_result(f"API error: {status}", retryable=status == 429 or status >= 500)
+    
+    def get_total_tokens(self) -> int:
+        """获取总token消耗"""
+        return self.total_tokens
+    
+    def get_cache_stats(self) -> Dict:
+        """获取缓存命中统计"""
+        if self.cache is None:
+            return {"enabled": False}
+        stats = self.cache.get_stats()
+        stats["enabled"] = True
+        return stats
+    
+    def get_coalescing_stats(self) -> Dict:
+        """获取单飞合并统计"""
+        if self.single_flight is None:
+            return {"enabled": False}
+        stats = self.single_flight.get_stats()
+        stats["enabled"] = True
+        return stats
+    
+    def get_batching_stats(self) -> Dict:
+        """获取微批合并统计"""
+        if self.batcher is None:
+            return {"enabled": False}
+        stats = self.batcher.get_stats()
+        stats["enabled"] = True
+        return stats
+    
+    def get_admission_stats(self) -> Dict:
+        """获取准入控制统计"""
+        if self.admission is None:
+            return {"enabled": False}
+        stats = self.admission.get_stats()
+        stats["enabled"] = True
+        return stats
+    
+    def get_resilience_stats(self) -> Dict:
+        """获取重试、对冲和熔断统计"""
+        stats = self.attempt_metrics.get_stats()
+        stats["latency_p50"] = self.latency.percentile(50)
+        stats["latency_p95"] = self.latency.percentile(95)
+        stats["hedge_threshold"] = self._hedge_threshold()
+        stats["circuit_breaker"] = self.circuit_breaker.get_stats() if self.circuit_breaker else {"enabled": False}
+        return stats
     
-    def generate(self, prompt: str, max_tokens: Optional[int] = None) -> Dict:
+    def get_endpoint_stats(self) -> Dict:
+        """获取各模型服务端点的负载和健康状态（模型配置指定的端点列在models中）"""
+        stats = self.endpoints.get_stats()
+        if self._model_endpoints:
+            stats["models"] = {model: pool.get_stats() for model, pool in list(self._model_endpoints.items())}
+        return stats
+    
+    def get_stats(self) -> Dict:
+        """获取AI调用统计"""
+        return {
+            "total_tokens": self.get_total_tokens(),
+            "cache": self.get_cache_stats(),
+            "coalescing": self.get_coalescing_stats(),
+            "batching": self.get_batching_stats(),
+            "admission": self.get_admission_stats(),
+            "resilience": self.get_resilience_stats(),
+            "endpoints": self.get_endpoint_stats()
+        }
+
+
+class AIService(BaseAIService):
+    """AI服务（线程安全，多个线程可共享同一实例及其连接池）"""
+    
+    def __init__(self, config: AIConfig, core: Optional[AIServiceCore] = None):
+        super().__init__(config, core)
+        self._session = self._create_session()
+        self._hedge_executor = None
+    
+    def _create_session(self) -> requests.Session:
+        """创建带连接池的HTTP会话"""
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.config.pool_connections,
+            pool_maxsize=self.config.pool_maxsize,
+            pool_block=self.config.pool_block
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update(self._build_headers())
+        return session
+    
+    def generate(self, prompt: str, max_tokens: Optional[int] = None, traffic_class: str = "default",
+                 affinity_key: Optional[str] = None, profile: Optional[ModelProfile] = None) -> Dict:
         """
         生成AI响应
         
+        Args:
+            traffic_class: 流量类别（discussion、planning、execution、default），用于准入控制的公平调度
+            affinity_key: 路由亲和键（如讨论ID），相同键的请求固定发往同一端点以命中服务端前缀缓存
+            profile: 模型配置（模型、max_tokens、temperature、端点），未提供时使用AIConfig
+        
         Returns:
             {
                 "text": str,
@@ -35,54 +548,235 @@ class AIService:
                 "error": Optional[str]
             }
         """
+        payload = self._build_payload(prompt, max_tokens, profile)
+        cache_key = self._cache_key(payload)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+        
+        if self.single_flight is None:
+            return self._fetch_collected(payload, cache_key, traffic_class, affinity_key)
+        result, coalesced = self.single_flight.do(
+            self._request_key(payload),
+            lambda: self._fetch_collected(payload, cache_key, traffic_class, affinity_key)
+        )
+        return self._coalesced_result(result) if coalesced else result
+    
+    def generate_batch(self, prompts: List[str], max_tokens: Optional[int] = None, traffic_class: str = "default",
+                       affinity_key: Optional[str] = None, profile: Optional[ModelProfile] = None) -> List[Dict]:
+        """
+        批量生成AI响应：未命中缓存的提示词通过一次多提示词请求发送
+        
+        Returns:
+            与prompts顺序一致的结果列表，每项与generate的结果格式相同
+        """
+        results: List[Optional[Dict]] = [None] * len(prompts)
+        pending = []
+        for index, prompt in enumerate(prompts):
+            payload = self._build_payload(prompt, max_tokens, profile)
+            cache_key = self._cache_key(payload)
+            results[index] = self._cache_get(cache_key)
+            if results[index] is None:
+                pending.append((index, (payload, cache_key)))
+        if pending:
+            fetched = self._fetch_many([item for _, item in pending], traffic_class, affinity_key)
+            for (index, _), result in zip(pending, fetched):
+                results[index] = result
+        return results
+    
+    def _fetch_collected(self, payload: Dict, cache_key: Optional[str], traffic_class: str = "default",
+                         affinity_key: Optional[str] = None) -> Dict:
+        """经微批收集器请求（未启用时直接请求）"""
+        if self.batcher is None:
+            return self._fetch(payload, cache_key, traffic_class, affinity_key)
+        return self.batcher.submit(
+            self._batch_key(payload, traffic_class, affinity_key),
+            (payload, cache_key),
+            lambda items: self._fetch_many(items, traffic_class, affinity_key)
+        )
+    
+    def _fetch_many(self, items: List[Tuple[Dict, Optional[str]]], traffic_class: str = "default",
+                    affinity_key: Optional[str] = None) -> List[Dict]:
+        """以一次多提示词请求发送多个(请求体, 缓存键)并写入缓存；只有一个时按单提示词请求发送"""
+        if len(items) == 1:
+            payload, cache_key = items[0]
+            return [self._fetch(payload, cache_key, traffic_class, affinity_key)]
+        batch_payload = self._build_batch_payload([payload for payload, _ in items])
+        result = self._call_with_retry(lambda: self._hedged_attempt(batch_payload, traffic_class, affinity_key))
+        results = self._split_batch_result(result, len(items))
+        for (_, cache_key), item_result in zip(items, results):
+            self._cache_put(cache_key, item_result)
+        return results
+    
+    def _fetch(self, payload: Dict, cache_key: Optional[str], traffic_class: str = "default",
+               affinity_key: Optional[str] = None) -> Dict:
+        """请求（含重试和对冲）并写入缓存"""
+        result = self._call_with_retry(lambda: self._hedged_attempt(payload, traffic_class, affinity_key))
+        self._cache_put(cache_key, result)
+        return result
+    
+    def _call_with_retry(self, attempt: Callable[[], Dict], can_retry: Callable[[], bool] = lambda: True) -> Dict:
+        """执行调用，可重试的失败按指数退避重试；熔断器断开时直接失败"""
+        self.attempt_metrics.incr("calls")
+        retry = 0
+        while True:
+            if not self._before_attempt():
+                return self._circuit_open_result()
+            result = attempt()
+            if not (self._should_retry(result, retry) and can_retry()):
+                return result
+            time.sleep(self._retry_delay(retry))
+            retry += 1
+    
+    def _attempt(self, payload: Dict, traffic_class: str, send: Callable[[str], Dict],
+                 affinity_key: Optional[str] = None) -> Dict:
+        """经准入控制选择端点发送一次请求（send接收端点地址）并记录指标"""
+        admission = None
+        if self.admission is not None:
+            admission = self.admission.acquire(traffic_class, self._estimate_tokens(payload))
+            if admission is None:
+                result = self._rejected_result(traffic_class)
+                self._after_attempt(result, time.monotonic())
+                return result
+        pool = self._endpoint_pool(payload)
+        endpoint = pool.acquire(affinity_key)
+        started_at = time.monotonic()
+        result = None
         try:
-            headers = {
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {self.config.api_key}"
-            }
-            
-            payload = {
-                "model": self.config.model,
-                "prompt": prompt,
-                "max_tokens": max_tokens or self.config.max_tokens,
-                "temperature": self.config.temperature
-            }
-            
-            response = requests.post(
-                f"{self.config.base_url}/completions",
-                headers=headers,
+            result = send(endpoint.url)
+        finally:
+            self._release_endpoint(pool, endpoint, result, started_at)
+            self._release_admission(admission, result)
+        self._after_attempt(result, started_at)
+        return result
+    
+    def _hedged_attempt(self, payload: Dict, traffic_class: str, affinity_key: Optional[str] = None) -> Dict:
+        """
+        发送请求；启用对冲时，超过阈值仍未返回则再发一个相同请求，先成功的结果生效
+        
+        对冲请求不使用亲和键，由端点池选择其他负载较低的端点。
+        先返回的失败结果不会立即采用，仍等待另一个请求。
+        """
+        def attempt(key: Optional[str]):
+            return self._attempt(payload, traffic_class, lambda url: self._request(payload, url), key)
+        
+        threshold = self._hedge_threshold()
+        if threshold is None:
+            return attempt(affinity_key)
+        
+        executor = self._get_hedge_executor()
+        primary = executor.submit(attempt, affinity_key)
+        done, _ = wait([primary], timeout=threshold)
+        if done:
+            return primary.result()
+        
+        self.attempt_metrics.incr("hedges")
+        hedge = executor.submit(attempt, None)
+        pending = {primary, hedge}
+        result = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                attempt_result = future.result()
+                if attempt_result["success"]:
+                    if future is hedge:
+                        self.attempt_metrics.incr("hedge_wins")
+                    return attempt_result
+                result = result or attempt_result
+        return result
+    
+    def _get_hedge_executor(self) -> ThreadPoolExecutor:
+        """对冲请求使用的线程池（惰性创建）"""
+        with self._lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(
+                    max_workers=self.config.pool_maxsize,
+                    thread_name_prefix="ai-hedge"
+                )
+            return self._hedge_executor
+    
+    def generate_stream(self, prompt: str, on_delta: Callable[[str], None],
+                        max_tokens: Optional[int] = None, traffic_class: str = "default",
+                        affinity_key: Optional[str] = None, profile: Optional[ModelProfile] = None) -> Dict:
+        """
+        流式生成AI响应
+        
+        消费补全接口的SSE分块（stream: true），每收到一段增量文本即调用on_delta，
+        结束后返回与generate相同格式的完整结果。已经输出增量文本后失败的调用不会重试。
+        """
+        payload = self._build_payload(prompt, max_tokens, profile)
+        cache_key = self._cache_key(payload)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            on_delta(cached["text"])
+            return cached
+        
+        emitted = [False]
+        
+        def forward(delta: str):
+            emitted[0] = True
+            on_delta(delta)
+        
+        result = self._call_with_retry(
+            lambda: self._attempt(
+                payload, traffic_class, lambda url: self._stream_request(payload, url, forward), affinity_key
+            ),
+            can_retry=lambda: not emitted[0]
+        )
+        self._cache_put(cache_key, result)
+        return result
+    
+    def _stream_request(self, payload: Dict, base_url: str, on_delta: Callable[[str], None]) -> Dict:
+        """向指定端点发送流式补全请求"""
+        try:
+            with self._session.post(
+                f"{base_url}/completions",
+                json=self._build_stream_payload(payload),
+                timeout=(self.config.connect_timeout, self.config.read_timeout),
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    if response.status_code == 429:
+                        self._on_throttled(response.headers.get("Retry-After"))
+                    return self._http_error_result(response.status_code)
+                
+                parts = []
+                tokens = 0
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line:
+                        continue
+                    delta, line_tokens, done = self._parse_stream_line(line)
+                    if done:
+                        break
+                    tokens = line_tokens or tokens
+                    if delta:
+                        parts.append(delta)
+                        on_delta(delta)
+        except Exception as e:
+            return self._error_result(str(e), retryable=True)
+        
+        return self._stream_result("".join(parts), tokens)
+    
+    def _request(self, payload: Dict, base_url: str) -> Dict:
+        """向指定端点发送补全请求"""
+        try:
+            response = self._session.post(
+                f"{base_url}/completions",
                 json=payload,
-                timeout=60
+                timeout=(self.config.connect_timeout, self.config.read_timeout)
             )
             
             if response.status_code == 200:
-                result = response.json()
-                text = result["choices"][0]["text"].strip()
-                tokens = result.get("usage", {}).get("total_tokens", 0)
-                
-                self.total_tokens += tokens
-                
-                return {
-                    "text": text,
-                    "tokens": tokens,
-                    "success": True,
-                    "error": None
-                }
+                return self._parse_completion(response.json(), self._batch_size(payload))
             else:
-                return {
-                    "text": "",
-                    "tokens": 0,
-                    "success": False,
-                    "error": f"API error: {response.status_code}"
-                }
+                if response.status_code == 429:
+                    self._on_throttled(response.headers.get("Retry-After"))
+                return self._http_error_result(response.status_code)
         except Exception as e:
-            return {
-                "text": "",
-                "tokens": 0,
-                "success": False,
-                "error": str(e)
-            }
+            return self._error_result(str(e), retryable=True)
     
-    def get_total_tokens(self) -> int:
-        """获取总token消耗"""
-        return self.total_tokens
+    def close(self):
+        """关闭连接池"""
+        self._session.close()
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
@@ -0,0 +1,459 @@
+"""
+异步AI服务 - 基于asyncio的AI调用接口
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from .ai_service import AIConfig, AIService, AIServiceCore, BaseAIService, ModelProfile
+
+
+_background_loop = None
+_background_loop_lock = threading.Lock()
+
+
+def _get_background_loop() -> asyncio.AbstractEventLoop:
+    """获取进程内共享的后台事件循环（惰性启动）"""
+    global _background_loop
+    with _background_loop_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=_background_loop.run_forever,
+                name="async-workflow-loop",
+                daemon=True
+            )
+            thread.start()
+        return _background_loop
+
+
+def run_sync(coro):
+    """
+    在同步代码中运行协程（供同步API封装异步实现使用）
+
+    所有同步调用共享同一个后台事件循环，因此异步客户端的连接池可以跨调用复用，
+    来自多个请求线程的工作流也在同一个循环中并发推进。
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        future = asyncio.run_coroutine_threadsafe(coro, _get_background_loop())
+        return future.result()
+    coro.close()
+    raise RuntimeError("不能在运行中的事件循环内调用同步接口，请使用对应的异步方法")
+
+
+class AsyncAIService(BaseAIService):
+    """
+    原生异步AI服务（基于aiohttp）
+
+    一个事件循环即可同时驱动大量进行中的请求，无需为每个请求占用一个线程。
+    连接池大小、长连接和超时沿用AIConfig中的配置。
+    """
+
+    def __init__(self, config: AIConfig, core: Optional[AIServiceCore] = None):
+        super().__init__(config, core)
+        # aiohttp会话绑定事件循环：每个事件循环一个会话，close()时全部关闭
+        self._sessions: Dict[asyncio.AbstractEventLoop, object] = {}
+
+    async def _get_session(self):
+        """获取当前事件循环上的HTTP会话（同时关闭所属事件循环已关闭的会话）"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            session = self._sessions.get(loop)
+            stale = [(other, s) for other, s in self._sessions.items() if other.is_closed()]
+            for other, _ in stale:
+                del self._sessions[other]
+        for other, stale_session in stale:
+            await self._close_session(other, stale_session)
+        if session is None or session.closed:
+            try:
+                import aiohttp
+            except ImportError as e:
+                raise ImportError("AsyncAIService需要aiohttp，请执行 pip install aiohttp") from e
+
+            connector = aiohttp.TCPConnector(
+                limit=self.config.pool_connections * self.config.pool_maxsize,
+                limit_per_host=self.config.pool_maxsize,
+                force_close=not self.config.keep_alive
+            )
+            timeout = aiohttp.ClientTimeout(
+                sock_connect=self.config.connect_timeout,
+                sock_read=self.config.read_timeout
+            )
+            session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=timeout,
+                headers=self._build_headers()
+            )
+            with self._lock:
+                self._sessions[loop] = session
+        return session
+
+    @staticmethod
+    async def _close_session(loop: asyncio.AbstractEventLoop, session):
+        """
+        关闭会话
+
+        会话的连接属于创建它的事件循环：该循环仍在其他线程中运行时在该循环上关闭；
+        已关闭的循环上的连接无法再等待，直接释放连接器；已停止但未关闭的循环上的会话无法关闭，跳过。
+        """
+        if session.closed:
+            return
+        if loop is asyncio.get_running_loop() or loop.is_closed():
+            await session.close()
+        elif loop.is_running():
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(session.close(), loop))
+
+    async def generate(self, prompt: str, max_tokens: Optional[int] = None, traffic_class: str = "default",
+                       affinity_key: Optional[str] = None, profile: Optional[ModelProfile] = None) -> Dict:
+        """
+        异步生成AI响应
+
+        Returns:
+            与AIService.generate相同的结果字典
+        """
+        payload = self._build_payload(prompt, max_tokens, profile)
+        cache_key = self._cache_key(payload)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            return cached
+
+        if self.single_flight is None:
+            return await self._fetch_collected(payload, cache_key, traffic_class, affinity_key)
+        result, coalesced = await self.single_flight.do_async(
+            self._request_key(payload),
+            lambda: self._fetch_collected(payload, cache_key, traffic_class, affinity_key)
+        )
+        return self._coalesced_result(result) if coalesced else result
+
+    async def generate_batch(self, prompts: List[str], max_tokens: Optional[int] = None,
+                             traffic_class: str = "default", affinity_key: Optional[str] = None,
+                             profile: Optional[ModelProfile] = None) -> List[Dict]:
+        """
+        异步批量生成AI响应
+
+        Returns:
+            与AIService.generate_batch相同的结果列表
+        """
+        results: List[Optional[Dict]] = [None] * len(prompts)
+        pending = []
+        for index, prompt in enumerate(prompts):
+            payload = self._build_payload(prompt, max_tokens, profile)
+            cache_key = self._cache_key(payload)
+            results[index] = self._cache_get(cache_key)
+            if results[index] is None:
+                pending.append((index, (payload, cache_key)))
+        if pending:
+            fetched = await self._fetch_many([item for _, item in pending], traffic_class, affinity_key)
+            for (index, _), result in zip(pending, fetched):
+                results[index] = result
+        return results
+
+    async def _fetch_collected(self, payload: Dict, cache_key: Optional[str], traffic_class: str = "default",
+                               affinity_key: Optional[str] = None) -> Dict:
+        """经微批收集器请求（未启用时直接请求）"""
+        if self.batcher is None:
+            return await self._fetch(payload, cache_key, traffic_class, affinity_key)
+        return await self.batcher.submit_async(
+            self._batch_key(payload, traffic_class, affinity_key),
+            (payload, cache_key),
+            lambda items: self._fetch_many(items, traffic_class, affinity_key)
+        )
+
+    async def _fetch_many(self, items: List[Tuple[Dict, Optional[str]]], traffic_class: str = "default",
+                          affinity_key: Optional[str] = None) -> List[Dict]:
+        """以一次多提示词请求发送多个(请求体, 缓存键)并写入缓存；只有一个时按单提示词请求发送"""
+        if len(items) == 1:
+            payload, cache_key = items[0]
+            return [await self._fetch(payload, cache_key, traffic_class, affinity_key)]
+        batch_payload = self._build_batch_payload([payload for payload, _ in items])
+        result = await self._call_with_retry(
+            lambda: self._hedged_attempt(batch_payload, traffic_class, affinity_key)
+        )
+        results = self._split_batch_result(result, len(items))
+        for (_, cache_key), item_result in zip(items, results):
+            self._cache_put(cache_key, item_result)
+        return results
+
+    async def _fetch(self, payload: Dict, cache_key: Optional[str], traffic_class: str = "default",
+                     affinity_key: Optional[str] = None) -> Dict:
+        """请求（含重试和对冲）并写入缓存"""
+        result = await self._call_with_retry(lambda: self._hedged_attempt(payload, traffic_class, affinity_key))
+        self._cache_put(cache_key, result)
+        return result
+
+    async def _call_with_retry(self, attempt: Callable[[], Awaitable[Dict]],
+                               can_retry: Callable[[], bool] = lambda: True) -> Dict:
+        """执行调用，可重试的失败按指数退避重试；熔断器断开时直接失败"""
+        self.attempt_metrics.incr("calls")
+        retry = 0
+        while True:
+            if not self._before_attempt():
+                return self._circuit_open_result()
+            result = await attempt()
+            if not (self._should_retry(result, retry) and can_retry()):
+                return result
+            await asyncio.sleep(self._retry_delay(retry))
+            retry += 1
+
+    async def _attempt(self, payload: Dict, traffic_class: str, send: Callable[[str], Awaitable[Dict]],
+                       affinity_key: Optional[str] = None) -> Dict:
+        """经准入控制选择端点发送一次请求（send接收端点地址）并记录指标"""
+        admission = None
+        if self.admission is not None:
+            admission = await self.admission.acquire_async(traffic_class, self._estimate_tokens(payload))
+            if admission is None:
+                result = self._rejected_result(traffic_class)
+                self._after_attempt(result, time.monotonic())
+                return result
+        pool = self._endpoint_pool(payload)
+        endpoint = pool.acquire(affinity_key)
+        started_at = time.monotonic()
+        result = None
+        try:
+            result = await send(endpoint.url)
+        finally:
+            self._release_endpoint(pool, endpoint, result, started_at)
+            self._release_admission(admission, result)
+        self._after_attempt(result, started_at)
+        return result
+
+    async def _hedged_attempt(self, payload: Dict, traffic_class: str, affinity_key: Optional[str] = None) -> Dict:
+        """
+        发送请求；启用对冲时，超过阈值仍未返回则再发一个相同请求，先成功的结果生效，另一个被取消
+
+        对冲请求不使用亲和键，由端点池选择其他负载较低的端点。
+        """
+        def attempt(key: Optional[str]):
+            return self._attempt(payload, traffic_class, lambda url: self._request(payload, url), key)
+
+        threshold = self._hedge_threshold()
+        if threshold is None:
+            return await attempt(affinity_key)
+
+        primary = asyncio.ensure_future(attempt(affinity_key))
+        done, _ = await asyncio.wait({primary}, timeout=threshold)
+        if done:
+            return primary.result()
+
+        self.attempt_metrics.incr("hedges")
+        hedge = asyncio.ensure_future(attempt(None))
+        pending = {primary, hedge}
+        result = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    attempt_result = task.result()
+                    if attempt_result["success"]:
+                        if task is hedge:
+                            self.attempt_metrics.incr("hedge_wins")
+                        return attempt_result
+                    result = result or attempt_result
+            return result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _request(self, payload: Dict, base_url: str) -> Dict:
+        """向指定端点发送补全请求"""
+        try:
+            session = await self._get_session()
+            async with session.post(
+                f"{base_url}/completions",
+                json=payload
+            ) as response:
+                if response.status == 200:
+                    return self._parse_completion(await response.json(content_type=None), self._batch_size(payload))
+                else:
+                    if response.status == 429:
+                        self._on_throttled(response.headers.get("Retry-After"))
+                    return self._http_error_result(response.status)
+        except ImportError:
+            raise
+        except Exception as e:
+            return self._error_result(str(e), retryable=True)
+
+    async def generate_stream(self, prompt: str, on_delta: Callable[[str], None],
+                              max_tokens: Optional[int] = None, traffic_class: str = "default",
+                              affinity_key: Optional[str] = None, profile: Optional[ModelProfile] = None) -> Dict:
+        """
+        异步流式生成AI响应
+
+        每收到一段SSE增量文本即调用on_delta，结束后返回完整结果。已经输出增量文本后失败的调用不会重试。
+        """
+        payload = self._build_payload(prompt, max_tokens, profile)
+        cache_key = self._cache_key(payload)
+        cached = self._cache_get(cache_key)
+        if cached is not None:
+            on_delta(cached["text"])
+            return cached
+
+        emitted = [False]
+
+        def forward(delta: str):
+            emitted[0] = True
+            on_delta(delta)
+
+        result = await self._call_with_retry(
+            lambda: self._attempt(
+                payload, traffic_class, lambda url: self._stream_request(payload, url, forward), affinity_key
+            ),
+            can_retry=lambda: not emitted[0]
+        )
+        self._cache_put(cache_key, result)
+        return result
+
+    async def _stream_request(self, payload: Dict, base_url: str, on_delta: Callable[[str], None]) -> Dict:
+        """向指定端点发送流式补全请求"""
+        try:
+            session = await self._get_session()
+            async with session.post(
+                f"{base_url}/completions",
+                json=self._build_stream_payload(payload)
+            ) as response:
+                if response.status != 200:
+                    if response.status == 429:
+                        self._on_throttled(response.headers.get("Retry-After"))
+                    return self._http_error_result(response.status)
+
+                parts = []
+                tokens = 0
+                async for raw_line in response.content:
+                    line = raw_line.decode("utf-8")
+                    if not line.strip():
+                        continue
+                    delta, line_tokens, done = self._parse_stream_line(line)
+                    if done:
+                        break
+                    tokens = line_tokens or tokens
+                    if delta:
+                        parts.append(delta)
+                        on_delta(delta)
+        except ImportError:
+            raise
+        except Exception as e:
+            return self._error_result(str(e), retryable=True)
+
+        return self._stream_result("".join(parts), tokens)
+
+    async def close(self):
+        """关闭所有事件循环上的连接池"""
+        with self._lock:
+            sessions, self._sessions = self._sessions, {}
+        for loop, session in sessions.items():
+            await self._close_session(loop, session)
+
+
+class AsyncAIServiceAdapter:
+    """
+    同步AI服务的异步适配器
+
+    在有界线程池中执行同步AIService.generate，线程数默认与连接池大小一致，
+    使未安装aiohttp时异步工作流也能并发调用，并与同步接口共享连接池和统计。
+
+    线程中的调用无法中断：调用被取消（如asyncio.wait_for超时）时，已开始的调用会等到
+    线程执行结束后才传播取消，调用方持有的并发名额因此保留到请求真正结束。
+    """
+
+    def __init__(self, ai_service: AIService, max_workers: Optional[int] = None):
+        self.ai_service = ai_service
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or ai_service.config.pool_maxsize,
+            thread_name_prefix="ai-service"
+        )
+
+    @property
+    def config(self) -> AIConfig:
+        """同步服务的配置"""
+        return self.ai_service.config
+
+    async def generate(self, prompt: str, max_tokens: Optional[int] = None, traffic_class: str = "default",
+                       affinity_key: Optional[str] = None, profile: Optional[ModelProfile] = None) -> Dict:
+        """异步生成AI响应"""
+        return await self._run(self.ai_service.generate, prompt, max_tokens, traffic_class, affinity_key, profile)
+
+    async def generate_batch(self, prompts: List[str], max_tokens: Optional[int] = None,
+                             traffic_class: str = "default", affinity_key: Optional[str] = None,
+                             profile: Optional[ModelProfile] = None) -> List[Dict]:
+        """异步批量生成AI响应"""
+        return await self._run(
+            self.ai_service.generate_batch, prompts, max_tokens, traffic_class, affinity_key, profile
+        )
+
+    async def generate_stream(self, prompt: str, on_delta: Callable[[str], None],
+                              max_tokens: Optional[int] = None, traffic_class: str = "default",
+                              affinity_key: Optional[str] = None, profile: Optional[ModelProfile] = None) -> Dict:
+        """异步流式生成AI响应（增量回调切换回事件循环线程执行）"""
+        loop = asyncio.get_running_loop()
+
+        def deliver(delta: str):
+            loop.call_soon_threadsafe(on_delta, delta)
+
+        return await self._run(
+            self.ai_service.generate_stream, prompt, deliver, max_tokens, traffic_class, affinity_key, profile
+        )
+
+    async def _run(self, fn: Callable, *args):
+        """在线程池中执行fn；被取消时未开始的调用直接撤销，已开始的调用等待其结束"""
+        concurrent_future = self._executor.submit(fn, *args)
+        future = asyncio.wrap_future(concurrent_future)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not concurrent_future.cancel():
+                await asyncio.wait({future})
+            raise
+
+    def get_total_tokens(self) -> int:
+        """获取总token消耗"""
+        return self.ai_service.get_total_tokens()
+
+    def get_cache_stats(self) -> Dict:
+        """获取缓存命中统计"""
+        return self.ai_service.get_cache_stats()
+
+    def get_coalescing_stats(self) -> Dict:
+        """获取单飞合并统计"""
+        return self.ai_service.get_coalescing_stats()
+
+    def get_batching_stats(self) -> Dict:
+        """获取微批合并统计"""
+        return self.ai_service.get_batching_stats()
+
+    def get_admission_stats(self) -> Dict:
+        """获取准入控制统计"""
+        return self.ai_service.get_admission_stats()
+
+    def get_resilience_stats(self) -> Dict:
+        """获取重试、对冲和熔断统计"""
+        return self.ai_service.get_resilience_stats()
+
+    def get_endpoint_stats(self) -> Dict:
+        """获取各模型服务端点的负载和健康状态"""
+        return self.ai_service.get_endpoint_stats()
+
+    def get_stats(self) -> Dict:
+        """获取AI调用统计"""
+        return self.ai_service.get_stats()
+
+    async def close(self):
+        """关闭线程池"""
+        self._executor.shutdown(wait=False)
+
+
+def create_async_ai_service(ai_service: AIService):
+    """
+    为同步AI服务创建异步工作流使用的AI服务
+
+    安装了aiohttp时使用原生AsyncAIService，所有请求由事件循环驱动，不为每个请求占用线程；
+    它与同步服务包装同一个AIServiceCore，共享缓存、准入控制、熔断、端点池和统计。
+    未安装aiohttp时退回AsyncAIServiceAdapter，在线程池中执行同步服务。
+    """
+    try:
+        import aiohttp  # noqa: F401
+    except ImportError:
+        return AsyncAIServiceAdapter(ai_service)
+    return AsyncAIService(ai_service.config, core=ai_service.core)
@@ -0,0 +1,121 @@
+"""
+并发控制 - 跨线程、跨事件循环共享的并发上限
+"""
+import asyncio
+import threading
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+
+class SharedLimiter:
+    """
+    共享并发限制器
+
+    与asyncio.Semaphore不同，同一个实例可以被多个事件循环和普通线程同时使用，
+    用于在所有会话、所有计划之间施加全局并发上限。
+    释放名额时直接移交给最早的等待者（先到先得），等待者被取消时名额转交给下一个。
+    """
+
+    def __init__(self, limit: int):
+        if limit < 1:
+            raise ValueError("limit必须大于0")
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._active = 0
+        # 等待队列：(事件循环, asyncio.Future) 或 (None, threading.Event)
+        self._waiters: Deque[Tuple] = deque()
+        self._stats = {
+            "acquired": 0,
+            "waited": 0,
+            "max_waiting": 0
+        }
+
+    async def acquire(self):
+        """异步获取名额"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self._stats["acquired"] += 1
+            if self._active < self.limit and not self._waiters:
+                self._active += 1
+                return
+            future = loop.create_future()
+            self._enqueue((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = future.done() and not future.cancelled()
+                if not granted:
+                    self._remove_waiter(future)
+            if granted:
+                # 名额已移交但等待者被取消，交还名额
+                self.release()
+            raise
+
+    def acquire_sync(self, timeout: float = None) -> bool:
+        """同步获取名额，超时返回False"""
+        with self._lock:
+            self._stats["acquired"] += 1
+            if self._active < self.limit and not self._waiters:
+                self._active += 1
+                return True
+            event = threading.Event()
+            self._enqueue((None, event))
+        if event.wait(timeout):
+            return True
+        with self._lock:
+            if event.is_set():
+                return True
+            self._remove_waiter(event)
+            self._stats["acquired"] -= 1
+            return False
+
+    def release(self):
+        """释放名额（移交给下一个等待者）"""
+        with self._lock:
+            while self._waiters:
+                loop, waiter = self._waiters.popleft()
+                if loop is None:
+                    waiter.set()
+                    return
+                if not waiter.done() and not loop.is_closed():
+                    loop.call_soon_threadsafe(self._grant, waiter)
+                    return
+            self._active -= 1
+
+    def _grant(self, future: asyncio.Future):
+        """在等待者所在的事件循环中完成移交"""
+        if future.done():
+            # 等待者在移交途中被取消
+            self.release()
+        else:
+            future.set_result(None)
+
+    def _enqueue(self, waiter: Tuple):
+        """登记等待者（调用方持有锁）"""
+        self._waiters.append(waiter)
+        self._stats["waited"] += 1
+        self._stats["max_waiting"] = max(self._stats["max_waiting"], len(self._waiters))
+
+    def _remove_waiter(self, waiter):
+        """移除等待者（调用方持有锁）"""
+        for item in self._waiters:
+            if item[1] is waiter:
+                self._waiters.remove(item)
+                return
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+    def get_stats(self) -> Dict:
+        """获取并发统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["limit"] = self.limit
+            stats["active"] = self._active
+            stats["waiting"] = len(self._waiters)
+            return stats
@@ -0,0 +1,139 @@
+"""
+端点池 - 在多个模型服务副本之间路由请求
+"""
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+
+@dataclass
+class Endpoint:
+    """模型服务端点"""
+    url: str
+    outstanding: int = 0                    # 进行中的请求数
+    ewma_latency: Optional[float] = None    # 成功请求延迟的指数加权移动平均（秒）
+    consecutive_failures: int = 0
+    ejected_until: float = 0.0              # 被摘除的截止时间（monotonic）
+    requests: int = 0
+    failures: int = 0
+    ejections: int = 0
+
+    def is_ejected(self, now: float) -> bool:
+        """是否处于摘除期"""
+        return now < self.ejected_until
+
+    def to_dict(self, now: float) -> dict:
+        """转换为字典"""
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "ewma_latency": self.ewma_latency,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected": self.is_ejected(now),
+            "requests": self.requests,
+            "failures": self.failures,
+            "ejections": self.ejections
+        }
+
+
+class EndpointPool:
+    """
+    端点池
+
+    路由策略：
+    - least_outstanding：选择进行中请求最少的端点（相同时选择延迟较低、近期失败较少的）
+    - ewma：按 EWMA延迟 ×（进行中请求数 + 1）选择预计最快的端点
+
+    提供affinity_key时（如讨论ID）使用最高随机权重哈希（rendezvous hashing）固定路由到同一端点，
+    使服务端的前缀缓存保持命中；该端点被摘除时只有映射到它的键迁移到其他端点。
+
+    被动健康检查：端点连续eject_after次可重试失败后摘除eject_duration秒，
+    到期后重新加入，此时再失败一次即再次摘除。所有端点都被摘除时仍选择最早恢复的端点。
+    """
+
+    def __init__(self, urls: List[str], strategy: str = "least_outstanding",
+                 eject_after: int = 3, eject_duration: float = 30.0, ewma_alpha: float = 0.3):
+        if not urls:
+            raise ValueError("至少需要一个端点")
+        if strategy not in ("least_outstanding", "ewma"):
+            raise ValueError(f"未知的路由策略：{strategy}")
+        self.strategy = strategy
+        self.eject_after = eject_after
+        self.eject_duration = eject_duration
+        self.ewma_alpha = ewma_alpha
+        self.endpoints = [Endpoint(url=url.rstrip("/")) for url in urls]
+        self._lock = threading.Lock()
+
+    def acquire(self, affinity_key: Optional[str] = None) -> Endpoint:
+        """选择端点并登记一个进行中的请求"""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [endpoint for endpoint in self.endpoints if not endpoint.is_ejected(now)]
+            if not healthy:
+                endpoint = min(self.endpoints, key=lambda e: e.ejected_until)
+            elif affinity_key is not None:
+                endpoint = max(healthy, key=lambda e: self._rendezvous_weight(affinity_key, e.url))
+            elif self.strategy == "ewma":
+                endpoint = min(healthy, key=self._ewma_score)
+            else:
+                endpoint = min(healthy, key=lambda e: (
+                    e.outstanding, e.consecutive_failures, e.ewma_latency or 0.0
+                ))
+            endpoint.outstanding += 1
+            endpoint.requests += 1
+            return endpoint
+
+    def release(self, endpoint: Endpoint, success: bool, latency: float, retryable: bool = False):
+        """
+        请求结束，更新端点的延迟和健康状态
+
+        只有可重试的失败（连接错误、超时、429、5xx）计入健康检查，
+        请求本身的问题（如400）不影响端点状态。
+        """
+        with self._lock:
+            endpoint.outstanding -= 1
+            if success:
+                endpoint.consecutive_failures = 0
+                if endpoint.ewma_latency is None:
+                    endpoint.ewma_latency = latency
+                else:
+                    endpoint.ewma_latency += self.ewma_alpha * (latency - endpoint.ewma_latency)
+                return
+            endpoint.failures += 1
+            if not retryable:
+                return
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures >= self.eject_after:
+                now = time.monotonic()
+                if not endpoint.is_ejected(now):
+                    endpoint.ejections += 1
+                endpoint.ejected_until = now + self.eject_duration
+                # 恢复后处于观察期：再失败一次即再次摘除
+                endpoint.consecutive_failures = self.eject_after - 1
+
+    def cancel(self, endpoint: Endpoint):
+        """请求被取消（如对冲中落后的请求），只归还进行中计数"""
+        with self._lock:
+            endpoint.outstanding -= 1
+
+    def _ewma_score(self, endpoint: Endpoint) -> float:
+        """EWMA策略下的预计耗时；尚无延迟数据的端点优先尝试"""
+        latency = endpoint.ewma_latency if endpoint.ewma_latency is not None else 0.0
+        return latency * (endpoint.outstanding + 1) + endpoint.outstanding * 1e-6
+
+    @staticmethod
+    def _rendezvous_weight(key: str, url: str) -> int:
+        """最高随机权重哈希的权重"""
+        digest = hashlib.md5(f"{key}|{url}".encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big")
+
+    def get_stats(self) -> Dict:
+        """获取各端点状态"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "strategy": self.strategy,
+                "endpoints": [endpoint.to_dict(now) for endpoint in self.endpoints]
+            }
@@ -0,0 +1,120 @@
+"""
+事件总线 - 领域事件的发布与订阅（用于服务端推送）
+"""
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+
+class Subscription:
+    """
+    事件订阅
+
+    每个订阅者持有独立的有界缓冲区。订阅者消费过慢导致缓冲区溢出时，
+    积压的事件被丢弃并替换为一个resync事件，提示客户端重新拉取完整状态。
+    """
+
+    def __init__(self, bus: "EventBus", max_pending: int):
+        self._bus = bus
+        self._max_pending = max_pending
+        self._events: Deque[Dict] = deque()
+        self._cond = threading.Condition()
+
+    def _push(self, event: Dict):
+        with self._cond:
+            if len(self._events) >= self._max_pending:
+                self._events.clear()
+                self._events.append(self._bus.make_resync_event())
+            else:
+                self._events.append(event)
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """获取下一个事件，超时返回None"""
+        with self._cond:
+            if not self._events:
+                self._cond.wait(timeout)
+            return self._events.popleft() if self._events else None
+
+    def close(self):
+        """取消订阅"""
+        self._bus.unsubscribe(self)
+
+
+class EventBus:
+    """
+    事件总线（线程安全）
+
+    每个事件带有单调递增的序号，总线保留最近的事件历史，
+    断线重连的订阅者可以从上次收到的序号继续接收增量。
+    """
+
+    def __init__(self, history_size: int = 1000, max_pending: int = 1000):
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._history: Deque[Dict] = deque(maxlen=history_size)
+        self._subscribers: List[Subscription] = []
+        self._max_pending = max_pending
+
+    def publish(self, event_type: str, data: Dict) -> Dict:
+        """发布事件"""
+        with self._lock:
+            self._seq += 1
+            event = {
+                "seq": self._seq,
+                "type": event_type,
+                "data": data,
+                "timestamp": time.time()
+            }
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+
+        for subscription in subscribers:
+            subscription._push(event)
+        return event
+
+    def subscribe(self, last_seq: Optional[int] = None) -> Subscription:
+        """
+        订阅事件
+
+        Args:
+            last_seq: 客户端已收到的最后一个事件序号；提供时补发之后的历史事件，
+                历史已被淘汰时改为发送resync事件
+        """
+        subscription = Subscription(self, self._max_pending)
+        with self._lock:
+            if last_seq is not None and last_seq < self._seq:
+                oldest_seq = self._history[0]["seq"] if self._history else self._seq + 1
+                if oldest_seq > last_seq + 1:
+                    subscription._push(self.make_resync_event())
+                else:
+                    for event in self._history:
+                        if event["seq"] > last_seq:
+                            subscription._push(event)
+            self._subscribers.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """取消订阅"""
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def subscriber_count(self) -> int:
+        """获取当前订阅者数"""
+        with self._lock:
+            return len(self._subscribers)
+
+    def make_resync_event(self) -> Dict:
+        """构造要求客户端重新拉取完整状态的事件"""
+        return {
+            "seq": self._seq,
+            "type": "resync",
+            "data": {},
+            "timestamp": time.time()
+        }
+
+    def get_last_seq(self) -> int:
+        """获取最新事件序号"""
+        return self._seq
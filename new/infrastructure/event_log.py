@@ -0,0 +1,357 @@
+"""
+事件日志后端 - 以追加写入的领域事件日志持久化状态，定期快照并压缩日志
+"""
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional
+from domain.team import Team
+from domain.discussion import Discussion
+from domain.plan import Plan
+from .state_backend import StateBackend
+
+
+class EventLogStateBackend(StateBackend):
+    """
+    事件日志状态存储后端
+
+    讨论和计划第一次保存时记录一次完整状态，之后不再序列化整个对象：后端监听它们的领域事件
+    （add_message、start_new_round、reach_consensus、task.update_progress、complete等，见EventSource），
+    每个事件以一行紧凑的JSON追加到directory下的events.log，之后的save_*不需要再写入。
+    团队没有领域事件，每次保存记录完整状态（团队很小且很少保存）。
+
+    后端在内存中维护所有对象重放事件后的状态（字典形式），load_*直接由该状态构造对象。
+    日志累计snapshot_every个事件后，后台线程将该状态写为快照（snapshot.json）并开始新的日志文件，
+    重启时只需读取快照并重放之后的事件，恢复时间不随历史增长。keep_compacted为True时
+    被压缩的日志改名保留（events.<序号>.log）供审计，否则删除。
+
+    写入采用write-behind：事件先进入文件缓冲区，后台线程每flush_interval秒写入一次。
+    read_events可读取快照之后的事件（审计），add_listener注册的回调在每个事件追加后调用（推送）。
+
+    流式消息的增量（append_to_message）不记录，完整内容随finish_message记录；进程在流式生成
+    过程中退出时，恢复出的消息为空且streaming为True。
+    """
+
+    LOG_FILE = "events.log"
+    SNAPSHOT_FILE = "snapshot.json"
+
+    def __init__(self, directory: str, snapshot_every: Optional[int] = 1000, flush_interval: float = 0.5,
+                 keep_compacted: bool = False):
+        self.directory = directory
+        self.snapshot_every = snapshot_every
+        self.flush_interval = flush_interval
+        self.keep_compacted = keep_compacted
+        os.makedirs(directory, exist_ok=True)
+        self._log_path = os.path.join(directory, self.LOG_FILE)
+        self._snapshot_path = os.path.join(directory, self.SNAPSHOT_FILE)
+        self._lock = threading.RLock()
+        self._listeners: List[Callable[[Dict], None]] = []
+        # 重放后的状态：{kind: {对象ID: {"session_id": 会话ID, "data": to_dict()字典, "base": 保存时的版本号}}}
+        self._state: Dict[str, Dict[str, Dict]] = {"team": {}, "discussion": {}, "plan": {}}
+        self._current: Dict[str, Dict[str, Optional[str]]] = {}
+        self._seq = 0
+        self._events_since_snapshot = 0
+        self._compacting = False
+        self._stats = {"events": 0, "bytes_written": 0, "snapshots": 0, "replayed": 0}
+        self._recover()
+        if os.path.exists(self._log_path + ".compacting"):
+            # 上次压缩未完成：先为恢复出的状态写入快照，再删除已包含在快照中的日志
+            self._write_snapshot(self._dump_snapshot())
+            for path in self._log_files():
+                os.remove(path)
+            self._events_since_snapshot = 0
+        self._log = open(self._log_path, "a", encoding="utf-8")
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="event-log-flusher", daemon=True)
+        self._flusher.start()
+
+    # 恢复
+    def _recover(self):
+        """读取快照并重放之后的事件（包括上次压缩时尚未删除的旧日志）"""
+        snapshot_seq = 0
+        if os.path.exists(self._snapshot_path):
+            with open(self._snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            snapshot_seq = self._seq = snapshot["seq"]
+            self._state = snapshot["state"]
+            self._current = snapshot["current"]
+        for path in self._log_files():
+            for event in self._read_log(path):
+                if event["seq"] <= snapshot_seq:
+                    continue
+                self._apply(event)
+                self._seq = max(self._seq, event["seq"])
+                self._events_since_snapshot += 1
+                self._stats["replayed"] += 1
+
+    def _log_files(self) -> List[str]:
+        """待重放的日志：压缩过程中被替换的旧日志（如存在）在前"""
+        compacting_path = self._log_path + ".compacting"
+        return [path for path in (compacting_path, self._log_path) if os.path.exists(path)]
+
+    @staticmethod
+    def _read_log(path: str) -> Iterator[Dict]:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # 进程退出时未写完的最后一行
+                    return
+
+    # 追加事件
+    def _append(self, kind: str, object_id: str, event_type: str, data: Dict):
+        with self._lock:
+            self._seq += 1
+            event = {"seq": self._seq, "ts": time.time(), "kind": kind, "id": object_id,
+                     "type": event_type, "data": data}
+            line = json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n"
+            # 在解析回的副本上应用，重放状态不与对象共享可变的列表、字典（与重启后重放的结果一致）
+            self._apply(json.loads(line))
+            self._log.write(line)
+            self._events_since_snapshot += 1
+            self._stats["events"] += 1
+            self._stats["bytes_written"] += len(line.encode("utf-8"))
+            for listener in self._listeners:
+                listener(event)
+
+    def _listen(self, kind: str, obj):
+        """监听对象的领域事件"""
+        obj.set_event_listener(lambda event_type, data: self._append(kind, obj.id, event_type, data))
+
+    def save_team(self, session_id: str, team: Team):
+        self._append("team", team.id, "save", {"session_id": session_id, "state": team.to_dict()})
+
+    def save_discussion(self, session_id: str, discussion: Discussion):
+        # 只有第一次保存时记录完整状态，之后的变化都已作为领域事件记录
+        with self._lock:
+            if discussion.has_event_listener():
+                return
+            self._listen("discussion", discussion)
+            self._append("discussion", discussion.id, "save",
+                         {"session_id": session_id, "state": discussion.to_dict()})
+
+    def save_plan(self, session_id: str, plan: Plan):
+        with self._lock:
+            if plan.has_event_listener():
+                return
+            self._listen("plan", plan)
+            self._append("plan", plan.id, "save", {"session_id": session_id, "state": self._plan_state(plan)})
+
+    @staticmethod
+    def _plan_state(plan: Plan) -> Dict:
+        """计划的完整状态（包括to_dict中没有的结果和指纹）"""
+        data = plan.to_dict()
+        data.update(final_feedback=plan.final_feedback, feedback_fingerprint=plan.feedback_fingerprint)
+        data["tasks"] = [
+            dict(task.to_dict(), result=task.result, fingerprint=task.fingerprint) for task in plan.tasks
+        ]
+        return data
+
+    def set_current(self, session_id: str, kind: str, object_id: Optional[str]):
+        self._append("session", session_id, "set_current", {"kind": kind, "object_id": object_id})
+
+    # 重放
+    def _apply(self, event: Dict):
+        """在重放状态上应用一个事件"""
+        kind, object_id, event_type, data = event["kind"], event["id"], event["type"], event["data"]
+        if kind == "session":
+            self._current.setdefault(object_id, {})[data["kind"]] = data["object_id"]
+            return
+        if event_type == "save":
+            self._state[kind][object_id] = {"session_id": data["session_id"], "data": data["state"],
+                                            "base": self._base_versions(data["state"])}
+            return
+        entry = self._state[kind].get(object_id)
+        if entry is None:
+            return
+        target = entry["data"]
+        if self._included_in_save(entry["base"], event_type, data):
+            return
+        if kind == "discussion":
+            self._apply_discussion(target, event_type, data)
+        else:
+            self._apply_plan(target, event_type, data)
+
+    @staticmethod
+    def _base_versions(state: Dict) -> Optional[Dict]:
+        """保存时完整状态的版本号：对象的版本号与每条消息、每个任务的版本号"""
+        rows = state.get("messages", state.get("tasks"))
+        if rows is None:
+            return None
+        return {"version": state["version"], "rows": {row["id"]: row["version"] for row in rows}}
+
+    @staticmethod
+    def _included_in_save(base: Dict, event_type: str, data: Dict) -> bool:
+        """
+        变化是否已包含在第一次保存的完整状态中
+
+        只与保存时的版本号比较（而不是重放后的最新版本号）：并发修改不同任务时，
+        版本号较小的事件可能晚于较大的事件追加，不能因此被丢弃。
+        消息和任务的事件与该行保存时的版本号比较，保存之后才出现的行的事件都会应用。
+        """
+        if "version" not in data:
+            return False
+        if event_type in ("add_message", "add_task"):
+            row = data["message" if event_type == "add_message" else "task"]
+            return row["id"] in base["rows"]
+        row_id = data.get("message_id", data.get("task_id"))
+        if row_id is not None:
+            return data["version"] <= base["rows"].get(row_id, 0)
+        return data["version"] <= base["version"]
+
+    @staticmethod
+    def _apply_discussion(discussion: Dict, event_type: str, data: Dict):
+        messages = discussion["messages"]
+        if event_type == "add_message":
+            messages.append(data["message"])
+        elif event_type == "finish_message":
+            for message in messages:
+                if message["id"] == data["message_id"]:
+                    message.update(content=data["content"], streaming=False,
+                                   version=max(message["version"], data["version"]))
+        elif event_type == "discard_message":
+            discussion["messages"] = [message for message in messages if message["id"] != data["message_id"]]
+        elif event_type == "record_consensus_precheck":
+            prechecks = discussion["consensus_precheck"]
+            prechecks[data["verdict"]] = prechecks.get(data["verdict"], 0) + 1
+        elif event_type == "record_tokens":
+            discussion["tokens_used"] += data["tokens"]
+            return
+        elif event_type == "record_round_decision":
+            discussion["round_decisions"].append(data["decision"])
+        else:
+            # 其余事件的数据即变更后的字段值
+            discussion.update(data, version=max(discussion["version"], data["version"]))
+            return
+        discussion["version"] = max(discussion["version"], data["version"])
+
+    @staticmethod
+    def _apply_plan(plan: Dict, event_type: str, data: Dict):
+        if event_type == "add_task":
+            plan["tasks"].append(data.pop("task"))
+        elif event_type.startswith("task."):
+            task_id = data.pop("task_id")
+            for task in plan["tasks"]:
+                if task["id"] == task_id:
+                    task.update(data, version=max(task["version"], data["version"]))
+        else:
+            plan.update(data, version=max(plan["version"], data["version"]))
+        plan["version"] = max(plan["version"], data["version"])
+
+    # 写入、快照与压缩（后台线程）
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            self.flush()
+            if self.snapshot_every and self._events_since_snapshot >= self.snapshot_every:
+                self.compact()
+
+    def flush(self):
+        with self._lock:
+            if not self._log.closed:
+                self._log.flush()
+
+    def compact(self):
+        """
+        写入快照并压缩日志
+
+        持有锁的时间只包括序列化状态和切换日志文件；快照写入完成（原子替换）后才删除旧日志，
+        中途退出时恢复过程会重放旧日志中快照之后的事件。
+        """
+        with self._lock:
+            if self._compacting:
+                return
+            self._compacting = True
+            seq = self._seq
+            snapshot = self._dump_snapshot()
+            self._log.close()
+            compacting_path = self._log_path + ".compacting"
+            os.replace(self._log_path, compacting_path)
+            self._log = open(self._log_path, "a", encoding="utf-8")
+            self._events_since_snapshot = 0
+        try:
+            self._write_snapshot(snapshot)
+            if self.keep_compacted:
+                os.replace(compacting_path, os.path.join(self.directory, f"events.{seq}.log"))
+            else:
+                os.remove(compacting_path)
+            with self._lock:
+                self._stats["snapshots"] += 1
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _dump_snapshot(self) -> str:
+        return json.dumps({"seq": self._seq, "state": self._state, "current": self._current}, ensure_ascii=False)
+
+    def _write_snapshot(self, snapshot: str):
+        """写入快照（先写临时文件再原子替换）"""
+        temp_path = self._snapshot_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(snapshot)
+        os.replace(temp_path, self._snapshot_path)
+
+    # 读取
+    def load_current(self, session_id: str) -> Dict[str, str]:
+        with self._lock:
+            current = self._current.get(session_id, {})
+            return {kind: object_id for kind, object_id in current.items() if object_id is not None}
+
+    def list_ids(self, session_id: str, kind: str) -> List[str]:
+        with self._lock:
+            return [object_id for object_id, entry in self._state[kind].items()
+                    if entry["session_id"] == session_id]
+
+    def _snapshot_of(self, kind: str, object_id: str) -> Optional[Dict]:
+        """重放状态的副本"""
+        with self._lock:
+            entry = self._state[kind].get(object_id)
+            return json.loads(json.dumps(entry["data"])) if entry else None
+
+    def load_team(self, team_id: str) -> Optional[Team]:
+        data = self._snapshot_of("team", team_id)
+        return Team.from_dict(data) if data else None
+
+    def load_discussion(self, discussion_id: str) -> Optional[Discussion]:
+        data = self._snapshot_of("discussion", discussion_id)
+        if data is None:
+            return None
+        discussion = Discussion.from_dict(data)
+        self._listen("discussion", discussion)
+        return discussion
+
+    def load_plan(self, plan_id: str) -> Optional[Plan]:
+        data = self._snapshot_of("plan", plan_id)
+        if data is None:
+            return None
+        plan = Plan.from_dict(data)
+        self._listen("plan", plan)
+        return plan
+
+    # 审计与推送
+    def read_events(self, after_seq: int = 0, object_id: Optional[str] = None) -> List[Dict]:
+        """读取最近一次快照之后、序号大于after_seq的事件（可只取某个对象的事件）"""
+        self.flush()
+        events = []
+        for path in self._log_files():
+            for event in self._read_log(path):
+                if event["seq"] > after_seq and (object_id is None or event["id"] == object_id):
+                    events.append(event)
+        return events
+
+    def add_listener(self, listener: Callable[[Dict], None]):
+        """注册事件回调（在追加事件的线程中、持有锁时调用，应尽快返回）"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def close(self):
+        self._closed.set()
+        self._flusher.join()
+        with self._lock:
+            self._log.close()
+
+    def get_stats(self) -> Dict:
+        """获取统计（events为追加的事件数，bytes_written为写入日志的字节数）"""
+        with self._lock:
+            return dict(self._stats, seq=self._seq, events_since_snapshot=self._events_since_snapshot)
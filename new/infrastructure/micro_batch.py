@@ -0,0 +1,130 @@
+"""
+微批合并 - 将短时间内到达的并发调用合并为一次批量调用
+"""
+import asyncio
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Awaitable, Callable, Dict, Hashable, List, Tuple
+
+
+class _Batch:
+    """收集中的一批调用"""
+
+    def __init__(self):
+        self.items: List = []
+        self.futures: List[Future] = []
+        self.full = Future()    # 达到批量上限时完成，提前结束收集窗口
+
+
+class MicroBatcher:
+    """
+    微批收集器
+
+    同一个键下第一个到达的调用成为执行者，等待window秒（或凑满max_batch_size个）后
+    以整批调用run_batch，其余调用等待各自的结果。与SingleFlight一样，
+    同步线程和异步协程以concurrent.futures.Future作为等待点。
+    """
+
+    def __init__(self, window: float, max_batch_size: int = 8):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size必须大于0")
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._pending: Dict[Hashable, _Batch] = {}
+        self._lock = threading.Lock()
+        self._tasks = set()     # 执行中的异步批次（保持引用，避免任务被回收）
+        self._stats = {
+            "batches": 0,
+            "items": 0,
+            "max_batch_size": 0
+        }
+
+    def _join(self, key: Hashable, item) -> Tuple[_Batch, Future, bool]:
+        """加入收集中的批次，或登记为新批次的执行者"""
+        with self._lock:
+            batch = self._pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._pending[key] = batch
+            future = Future()
+            batch.items.append(item)
+            batch.futures.append(future)
+            if len(batch.items) >= self.max_batch_size:
+                # 批次已满，后到的调用开始新的批次
+                del self._pending[key]
+                batch.full.set_result(None)
+            return batch, future, leader
+
+    def _close(self, key: Hashable, batch: _Batch) -> List:
+        """结束收集，返回本批的调用"""
+        with self._lock:
+            if self._pending.get(key) is batch:
+                del self._pending[key]
+            self._stats["batches"] += 1
+            self._stats["items"] += len(batch.items)
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(batch.items))
+            return list(batch.items)
+
+    @staticmethod
+    def _finish(batch: _Batch, results: List = None, error: BaseException = None):
+        """分发本批结果并唤醒等待者"""
+        for index, future in enumerate(batch.futures):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[index])
+
+    def submit(self, key: Hashable, item, run_batch: Callable[[List], List]):
+        """同步提交一个调用，返回该调用对应的结果（run_batch按顺序返回整批结果）"""
+        batch, future, leader = self._join(key, item)
+        if not leader:
+            return future.result()
+        try:
+            batch.full.result(timeout=self.window)
+        except FutureTimeoutError:
+            pass
+        items = self._close(key, batch)
+        try:
+            results = run_batch(items)
+        except BaseException as e:
+            self._finish(batch, error=e)
+            raise
+        self._finish(batch, results=results)
+        return future.result()
+
+    async def submit_async(self, key: Hashable, item, run_batch: Callable[[List], Awaitable[List]]):
+        """异步提交一个调用"""
+        batch, future, leader = self._join(key, item)
+        if leader:
+            # 在独立的任务中收集并执行，执行者被取消时本批的其他调用不受影响
+            task = asyncio.ensure_future(self._run_async(key, batch, run_batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        # shield避免等待者被取消时连带取消共享的Future
+        return await asyncio.shield(asyncio.wrap_future(future))
+
+    async def _run_async(self, key: Hashable, batch: _Batch, run_batch: Callable[[List], Awaitable[List]]):
+        """等待收集窗口结束后执行本批调用"""
+        try:
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(batch.full)), self.window)
+        except asyncio.TimeoutError:
+            pass
+        items = self._close(key, batch)
+        try:
+            results = await run_batch(items)
+        except BaseException as e:
+            self._finish(batch, error=e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        self._finish(batch, results=results)
+
+    def get_stats(self) -> Dict:
+        """获取合并统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["avg_batch_size"] = stats["items"] / stats["batches"] if stats["batches"] else 0
+            return stats
@@ -0,0 +1,150 @@
+"""
+容错 - 重试退避、熔断器与调用指标
+"""
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+def backoff_delay(retry: int, base: float, cap: float) -> float:
+    """
+    计算第retry次重试前的等待时间（指数退避 + 全抖动）
+
+    在 [0, min(cap, base * 2^retry)] 内均匀取值，避免大量调用同时重试。
+    """
+    return random.uniform(0, min(cap, base * (2 ** retry)))
+
+
+class LatencyTracker:
+    """最近若干次成功调用的延迟（用于计算对冲请求的触发阈值）"""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float):
+        """记录一次延迟（秒）"""
+        with self._lock:
+            self._samples.append(latency)
+
+    def count(self) -> int:
+        """样本数"""
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """计算分位数，无样本时返回None"""
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    连续失败达到failure_threshold次后断开（open），在reset_timeout秒内直接拒绝调用；
+    之后进入半开（half_open）状态放行一次试探调用，成功则恢复（closed），失败则重新断开。
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._times_opened = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """是否允许本次调用"""
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = "half_open"
+                self._trial_in_flight = False
+            if self._state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self):
+        """记录成功调用"""
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        """记录失败调用"""
+        with self._lock:
+            self._failures += 1
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    self._times_opened += 1
+                self._state = "open"
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def record_ignored(self):
+        """记录不影响熔断状态的调用（结束半开状态下的试探，但不改变状态）"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def get_stats(self) -> Dict:
+        """获取熔断器状态"""
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "times_opened": self._times_opened,
+                "rejected": self._rejected
+            }
+
+
+class AttemptMetrics:
+    """按单次尝试统计的调用指标"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "attempts": 0,
+            "attempt_failures": 0,
+            "retries": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "circuit_rejected": 0
+        }
+        self._errors: Dict[str, int] = {}
+
+    def incr(self, name: str, amount: int = 1):
+        """累加计数"""
+        with self._lock:
+            self._stats[name] += amount
+
+    def record_attempt(self, result: Dict):
+        """记录一次尝试的结果"""
+        with self._lock:
+            self._stats["attempts"] += 1
+            if not result["success"]:
+                self._stats["attempt_failures"] += 1
+                # 按错误类型归类（取错误信息的前缀，如 "API error: 503"）
+                reason = (result.get("error") or "unknown")[:40]
+                self._errors[reason] = self._errors.get(reason, 0) + 1
+
+    def get_stats(self) -> Dict:
+        """获取指标"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["errors"] = dict(self._errors)
+            return stats
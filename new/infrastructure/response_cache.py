@@ -0,0 +1,165 @@
+"""
+响应缓存 - 基于内容寻址的LLM响应缓存（内存LRU + 可选SQLite磁盘层）
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class ResponseCache:
+    """
+    LLM响应缓存
+
+    缓存键为 (model, prompt, max_tokens, temperature) 的哈希。
+    内存层为有界LRU（按条目数和文本字节数限制），磁盘层为可选的SQLite文件，
+    内存未命中时回查磁盘并回填内存。
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 50 * 1024 * 1024,
+                 ttl: Optional[float] = 3600, disk_path: Optional[str] = None,
+                 disk_max_entries: int = 10000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, expires_at, size)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "evictions": 0
+        }
+        self._disk = self._open_disk(disk_path) if disk_path else None
+
+    @staticmethod
+    def make_key(model: str, prompt: str, max_tokens: int, temperature: float) -> str:
+        """计算缓存键"""
+        raw = json.dumps([model, prompt, max_tokens, temperature], ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _open_disk(self, path: str) -> sqlite3.Connection:
+        """打开磁盘缓存"""
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "expires_at REAL, last_access REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_access ON response_cache(last_access)")
+        conn.commit()
+        return conn
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.ttl if self.ttl else None
+
+    def get(self, key: str) -> Optional[Dict]:
+        """读取缓存，未命中返回None"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at, _ = entry
+                if expires_at is None or expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return dict(value)
+                self._remove_memory(key)
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if row[1] is None or row[1] > now:
+                        self._disk.execute(
+                            "UPDATE response_cache SET last_access = ? WHERE key = ?", (now, key)
+                        )
+                        self._disk.commit()
+                        value = json.loads(row[0])
+                        self._put_memory(key, value, row[1])
+                        self._stats["disk_hits"] += 1
+                        return dict(value)
+                    self._disk.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+                    self._disk.commit()
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: Dict):
+        """写入缓存"""
+        expires_at = self._expires_at()
+        with self._lock:
+            self._put_memory(key, value, expires_at)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, value, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires_at, time.time())
+                )
+                self._evict_disk()
+                self._disk.commit()
+
+    def record_bypass(self):
+        """记录一次绕过缓存的调用"""
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def _put_memory(self, key: str, value: Dict, expires_at: Optional[float]):
+        """写入内存层并按LRU淘汰（调用方持有锁）"""
+        if key in self._memory:
+            self._remove_memory(key)
+        size = len(value.get("text", "").encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        self._memory[key] = (dict(value), expires_at, size)
+        self._memory_bytes += size
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes:
+            oldest = next(iter(self._memory))
+            self._remove_memory(oldest)
+            self._stats["evictions"] += 1
+
+    def _remove_memory(self, key: str):
+        """从内存层移除（调用方持有锁）"""
+        _, _, size = self._memory.pop(key)
+        self._memory_bytes -= size
+
+    def _evict_disk(self):
+        """淘汰过期及超出容量的磁盘条目（调用方持有锁）"""
+        self._disk.execute(
+            "DELETE FROM response_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+        )
+        count = self._disk.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+        overflow = count - self.disk_max_entries
+        if overflow > 0:
+            self._disk.execute(
+                "DELETE FROM response_cache WHERE key IN "
+                "(SELECT key FROM response_cache ORDER BY last_access LIMIT ?)", (overflow,)
+            )
+            self._stats["evictions"] += overflow
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM response_cache")
+                self._disk.commit()
+
+    def get_stats(self) -> Dict:
+        """获取命中统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["hits"] = stats["memory_hits"] + stats["disk_hits"]
+            lookups = stats["hits"] + stats["misses"]
+            stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+            return stats
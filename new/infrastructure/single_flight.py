@@ -0,0 +1,87 @@
+"""
+单飞合并 - 合并并发的重复请求
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """
+    单飞合并器
+
+    同一个键同时只会有一次调用在执行，期间到达的相同请求等待该调用的结果。
+    同步线程和异步协程共享同一张在途表（以concurrent.futures.Future作为等待点），
+    因此跨线程、跨事件循环的重复请求也会被合并。
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "executed": 0,
+            "coalesced": 0
+        }
+
+    def _join_or_lead(self, key: str) -> Tuple[Future, bool]:
+        """加入在途调用，或登记为新的执行者"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            self._stats["executed"] += 1
+            return future, True
+
+    def _finish(self, key: str, future: Future, result=None, error: BaseException = None):
+        """结束在途调用并唤醒等待者"""
+        with self._lock:
+            self._calls.pop(key, None)
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key: str, fn: Callable) -> Tuple[object, bool]:
+        """
+        同步执行（或等待已在途的相同调用）
+
+        Returns:
+            (结果, 是否为合并得到的结果)
+        """
+        future, leader = self._join_or_lead(key)
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result, False
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        """异步执行（或等待已在途的相同调用）"""
+        future, leader = self._join_or_lead(key)
+        if not leader:
+            # shield避免等待者被取消时连带取消共享的Future
+            return await asyncio.shield(asyncio.wrap_future(future)), True
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result, False
+
+    def get_stats(self) -> Dict:
+        """获取合并统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+            return stats
@@ -0,0 +1,414 @@
+"""
+状态存储后端 - StateStore的持久化层（接口 + SQLite实现）
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from domain.team import Team
+from domain.discussion import Discussion
+from domain.plan import Plan
+
+logger = logging.getLogger(__name__)
+
+
+class StateBackend(ABC):
+    """
+    状态存储后端接口
+
+    save_*在修改聚合的线程中同步调用，实现可以先记录变化再异步写入；
+    load_*在对应对象不在StateStore的内存缓存中时调用，需能读到此前保存的所有变化。
+    """
+
+    @abstractmethod
+    def save_team(self, session_id: str, team: Team):
+        """保存团队"""
+
+    @abstractmethod
+    def save_discussion(self, session_id: str, discussion: Discussion):
+        """保存讨论"""
+
+    @abstractmethod
+    def save_plan(self, session_id: str, plan: Plan):
+        """保存计划"""
+
+    @abstractmethod
+    def set_current(self, session_id: str, kind: str, object_id: Optional[str]):
+        """记录会话当前的团队、讨论或计划（kind为team、discussion、plan）"""
+
+    @abstractmethod
+    def load_current(self, session_id: str) -> Dict[str, str]:
+        """读取会话当前对象的ID：{kind: object_id}"""
+
+    @abstractmethod
+    def list_ids(self, session_id: str, kind: str) -> List[str]:
+        """列出会话保存过的讨论或计划的ID（按最后保存时间排序）"""
+
+    @abstractmethod
+    def load_team(self, team_id: str) -> Optional[Team]:
+        """读取团队，不存在时返回None"""
+
+    @abstractmethod
+    def load_discussion(self, discussion_id: str) -> Optional[Discussion]:
+        """读取讨论，不存在时返回None"""
+
+    @abstractmethod
+    def load_plan(self, plan_id: str) -> Optional[Plan]:
+        """读取计划，不存在时返回None"""
+
+    def flush(self):
+        """将尚未写入的变化立即写入"""
+
+    def close(self):
+        """写入剩余变化并释放资源"""
+
+
+class _PendingAggregate:
+    """合并中的一个聚合的待写入变化"""
+
+    def __init__(self, kind: str, session_id: str):
+        self.kind = kind
+        self.session_id = session_id
+        self.header: Optional[Dict] = None
+        self.rows: Dict[str, Dict] = {}     # 消息或任务：ID → 最新内容
+        self.removed = set()                # 被移除的消息ID
+        self.version: Optional[int] = None  # 已截取到的版本号
+
+    def merge_newer(self, newer: "_PendingAggregate"):
+        """合并之后截取的变化（写入失败的批次放回时使用）"""
+        self.header = newer.header
+        for row_id in newer.removed:
+            self.rows.pop(row_id, None)
+        self.rows.update(newer.rows)
+        self.removed |= newer.removed
+        if newer.version is not None:
+            self.version = max(self.version or 0, newer.version)
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    SQLite状态存储后端
+
+    数据库使用WAL模式，讨论消息和计划任务存放在独立的表中（按行增量更新），
+    团队、讨论、计划的其余字段以JSON保存。
+
+    写入采用write-behind批处理：save_*只在调用线程中截取自上次保存以来变化的部分
+    （讨论的新增、修改、移除的消息，计划中变化的任务），并与同一对象尚未写入的变化合并；
+    后台线程每flush_interval秒（或待写入对象达到max_pending个时）在一个事务中写入。
+    每轮讨论都会触发的保存因此只写入变化的消息，并且同一对象的多次保存合并为一次写入。
+
+    写入失败时整批变化放回待写入队列，在下一次写入时重试；已写入的版本号只在事务提交后推进。
+    已写入版本号最多记录max_tracked_versions个对象，被淘汰的对象下次保存时写入完整状态。
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.5, max_pending: int = 64,
+                 max_tracked_versions: int = 1024):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_tracked_versions = max_tracked_versions
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+        self._lock = threading.Lock()           # 保护待写入变化
+        self._db_lock = threading.Lock()        # 串行化数据库访问
+        self._pending: Dict[tuple, _PendingAggregate] = {}
+        self._current: Dict[tuple, Optional[str]] = {}
+        self._saved_versions: "OrderedDict[tuple, int]" = OrderedDict()   # 已写入数据库的版本号
+        self._stats = {
+            "saves": 0,
+            "flushes": 0,
+            "flush_errors": 0,
+            "aggregates_written": 0,
+            "rows_written": 0
+        }
+        self._closed = threading.Event()
+        self._wake = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="state-flusher", daemon=True)
+        self._flusher.start()
+
+    def _create_tables(self):
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS teams ("
+            "id TEXT PRIMARY KEY, session_id TEXT NOT NULL, data TEXT NOT NULL, updated_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS discussions ("
+            "id TEXT PRIMARY KEY, session_id TEXT NOT NULL, status TEXT NOT NULL, "
+            "data TEXT NOT NULL, updated_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "id TEXT PRIMARY KEY, discussion_id TEXT NOT NULL, agent_id TEXT NOT NULL, agent_name TEXT NOT NULL, "
+            "content TEXT NOT NULL, round INTEGER NOT NULL, timestamp TEXT NOT NULL, "
+            "streaming INTEGER NOT NULL, version INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_messages_discussion ON messages(discussion_id);"
+            "CREATE TABLE IF NOT EXISTS plans ("
+            "id TEXT PRIMARY KEY, session_id TEXT NOT NULL, goal TEXT NOT NULL, final_feedback TEXT, "
+            "feedback_fingerprint TEXT, data TEXT NOT NULL, updated_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS tasks ("
+            "id TEXT PRIMARY KEY, plan_id TEXT NOT NULL, position INTEGER NOT NULL, description TEXT NOT NULL, "
+            "assignee_id TEXT, assignee_name TEXT, status TEXT NOT NULL, progress INTEGER NOT NULL, "
+            "result TEXT, fingerprint TEXT, depends_on TEXT NOT NULL, created_at TEXT NOT NULL, "
+            "completed_at TEXT, version INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_tasks_plan ON tasks(plan_id, position);"
+            "CREATE TABLE IF NOT EXISTS current_objects ("
+            "session_id TEXT NOT NULL, kind TEXT NOT NULL, object_id TEXT, PRIMARY KEY (session_id, kind));"
+        )
+        self._conn.commit()
+
+    # 截取变化（调用线程）
+    def save_team(self, session_id: str, team: Team):
+        self._record("team", session_id, team.id, team.to_dict(), {})
+
+    def save_discussion(self, session_id: str, discussion: Discussion):
+        since = self._captured_version(("discussion", discussion.id))
+        version = discussion.version    # 先取版本号：截取期间的新变化会在下次保存时再次包含
+        data = discussion.to_dict(since=since)
+        rows = {message["id"]: message for message in data.pop("messages")}
+        removed = data.pop("removed_message_ids", [])
+        self._record("discussion", session_id, discussion.id, data, rows, removed, version)
+
+    def save_plan(self, session_id: str, plan: Plan):
+        since = self._captured_version(("plan", plan.id))
+        version = plan.get_version()
+        data = plan.to_dict(since=since)
+        data.update(final_feedback=plan.final_feedback, feedback_fingerprint=plan.feedback_fingerprint)
+        positions = {task.id: (index, task) for index, task in enumerate(plan.tasks)}
+        rows = {}
+        for task_data in data.pop("tasks"):
+            index, task = positions[task_data["id"]]
+            rows[task.id] = dict(task_data, position=index, result=task.result, fingerprint=task.fingerprint)
+        self._record("plan", session_id, plan.id, data, rows, version=version)
+
+    def _record(self, kind: str, session_id: str, object_id: str, header: Dict, rows: Dict[str, Dict],
+                removed=(), version: Optional[int] = None):
+        """与同一对象尚未写入的变化合并"""
+        with self._lock:
+            pending = self._pending.get((kind, object_id))
+            if pending is None:
+                pending = self._pending[(kind, object_id)] = _PendingAggregate(kind, session_id)
+            pending.header = header
+            pending.rows.update(rows)
+            for row_id in removed:
+                pending.rows.pop(row_id, None)
+                pending.removed.add(row_id)
+            if version is not None:
+                pending.version = version
+            self._stats["saves"] += 1
+            if len(self._pending) >= self.max_pending:
+                self._wake.set()
+
+    def _captured_version(self, key: tuple) -> Optional[int]:
+        """对象已截取到的版本号：有待写入变化时为其版本号，否则为已写入的版本号"""
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None and pending.version is not None:
+                return pending.version
+            return self._saved_versions.get(key)
+
+    def _remember_version(self, key: tuple, version: int):
+        """记录已写入的版本号，淘汰最久未保存的对象（调用方持有锁）"""
+        self._saved_versions[key] = max(self._saved_versions.get(key, version), version)
+        self._saved_versions.move_to_end(key)
+        while len(self._saved_versions) > self.max_tracked_versions:
+            self._saved_versions.popitem(last=False)
+
+    def set_current(self, session_id: str, kind: str, object_id: Optional[str]):
+        with self._lock:
+            self._current[(session_id, kind)] = object_id
+
+    # 写入（后台线程）
+    def _flush_loop(self):
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # 变化已放回待写入队列，下一次写入时重试
+                logger.exception("写入状态失败")
+
+    def flush(self):
+        # 持有数据库锁再取出待写入变化，保证先取出的变化先写入
+        with self._db_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                current, self._current = self._current, {}
+            if not pending and not current:
+                return
+            try:
+                rows_written = self._write(pending, current)
+            except Exception:
+                self._requeue(pending, current)
+                raise
+        with self._lock:
+            for key, aggregate in pending.items():
+                if aggregate.version is not None:
+                    self._remember_version(key, aggregate.version)
+            self._stats["flushes"] += 1
+            self._stats["aggregates_written"] += len(pending)
+            self._stats["rows_written"] += rows_written
+
+    def _requeue(self, pending: Dict[tuple, _PendingAggregate], current: Dict[tuple, Optional[str]]):
+        """写入失败时将整批变化放回待写入队列（写入期间截取的新变化覆盖旧变化）"""
+        with self._lock:
+            for key, aggregate in pending.items():
+                newer = self._pending.get(key)
+                if newer is not None:
+                    aggregate.merge_newer(newer)
+                self._pending[key] = aggregate
+            for key, object_id in current.items():
+                self._current.setdefault(key, object_id)
+            self._stats["flush_errors"] += 1
+
+    def _write(self, pending: Dict[tuple, _PendingAggregate], current: Dict[tuple, Optional[str]]) -> int:
+        """在一个事务中写入"""
+        now = time.time()
+        rows_written = 0
+        with self._conn:
+            for (kind, object_id), aggregate in pending.items():
+                rows_written += getattr(self, f"_write_{kind}")(object_id, aggregate, now)
+            for (session_id, kind), object_id in current.items():
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO current_objects (session_id, kind, object_id) VALUES (?, ?, ?)",
+                    (session_id, kind, object_id)
+                )
+        return rows_written
+
+    def _write_team(self, team_id: str, aggregate: _PendingAggregate, now: float) -> int:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO teams (id, session_id, data, updated_at) VALUES (?, ?, ?, ?)",
+            (team_id, aggregate.session_id, json.dumps(aggregate.header, ensure_ascii=False), now)
+        )
+        return 0
+
+    def _write_discussion(self, discussion_id: str, aggregate: _PendingAggregate, now: float) -> int:
+        self._conn.execute(
+            "INSERT OR REPLACE INTO discussions (id, session_id, status, data, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (discussion_id, aggregate.session_id, aggregate.header["status"],
+             json.dumps(aggregate.header, ensure_ascii=False), now)
+        )
+        # 按ID更新已有消息，新消息追加（rowid保持消息顺序）
+        self._conn.executemany(
+            "INSERT INTO messages (id, discussion_id, agent_id, agent_name, content, round, timestamp, "
+            "streaming, version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET content = excluded.content, streaming = excluded.streaming, "
+            "version = excluded.version",
+            [
+                (row["id"], discussion_id, row["agent_id"], row["agent_name"], row["content"], row["round"],
+                 row["timestamp"], int(row["streaming"]), row["version"])
+                for row in aggregate.rows.values()
+            ]
+        )
+        self._conn.executemany("DELETE FROM messages WHERE id = ?", [(row_id,) for row_id in aggregate.removed])
+        return len(aggregate.rows) + len(aggregate.removed)
+
+    def _write_plan(self, plan_id: str, aggregate: _PendingAggregate, now: float) -> int:
+        header = aggregate.header
+        self._conn.execute(
+            "INSERT OR REPLACE INTO plans (id, session_id, goal, final_feedback, feedback_fingerprint, data, "
+            "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (plan_id, aggregate.session_id, header["goal"], header["final_feedback"],
+             header["feedback_fingerprint"], json.dumps(header, ensure_ascii=False), now)
+        )
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO tasks (id, plan_id, position, description, assignee_id, assignee_name, "
+            "status, progress, result, fingerprint, depends_on, created_at, completed_at, version) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (row["id"], plan_id, row["position"], row["description"], row["assignee_id"], row["assignee_name"],
+                 row["status"], row["progress"], row["result"], row["fingerprint"],
+                 json.dumps(row["depends_on"]), row["created_at"], row["completed_at"], row["version"])
+                for row in aggregate.rows.values()
+            ]
+        )
+        return len(aggregate.rows)
+
+    # 读取
+    def load_current(self, session_id: str) -> Dict[str, str]:
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute(
+                "SELECT kind, object_id FROM current_objects WHERE session_id = ? AND object_id IS NOT NULL",
+                (session_id,)
+            ).fetchall()
+        return dict(rows)
+
+    def list_ids(self, session_id: str, kind: str) -> List[str]:
+        table = {"discussion": "discussions", "plan": "plans"}[kind]
+        self.flush()
+        with self._db_lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM {table} WHERE session_id = ? ORDER BY updated_at", (session_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def load_team(self, team_id: str) -> Optional[Team]:
+        """读取团队，不存在时返回None"""
+        self.flush()
+        with self._db_lock:
+            row = self._conn.execute("SELECT data FROM teams WHERE id = ?", (team_id,)).fetchone()
+        return Team.from_dict(json.loads(row[0])) if row else None
+
+    def load_discussion(self, discussion_id: str) -> Optional[Discussion]:
+        self.flush()
+        with self._db_lock:
+            row = self._conn.execute("SELECT data FROM discussions WHERE id = ?", (discussion_id,)).fetchone()
+            if row is None:
+                return None
+            messages = self._conn.execute(
+                "SELECT id, agent_id, agent_name, content, round, timestamp, streaming, version "
+                "FROM messages WHERE discussion_id = ? ORDER BY rowid", (discussion_id,)
+            ).fetchall()
+        data = json.loads(row[0])
+        data["messages"] = [
+            {"id": m[0], "agent_id": m[1], "agent_name": m[2], "content": m[3], "round": m[4],
+             "timestamp": m[5], "streaming": bool(m[6]), "version": m[7]}
+            for m in messages
+        ]
+        discussion = Discussion.from_dict(data)
+        with self._lock:
+            if ("discussion", discussion_id) not in self._saved_versions:
+                self._remember_version(("discussion", discussion_id), discussion.version)
+        return discussion
+
+    def load_plan(self, plan_id: str) -> Optional[Plan]:
+        self.flush()
+        with self._db_lock:
+            row = self._conn.execute("SELECT data FROM plans WHERE id = ?", (plan_id,)).fetchone()
+            if row is None:
+                return None
+            tasks = self._conn.execute(
+                "SELECT id, description, assignee_id, assignee_name, status, progress, result, fingerprint, "
+                "depends_on, created_at, completed_at, version FROM tasks WHERE plan_id = ? ORDER BY position",
+                (plan_id,)
+            ).fetchall()
+        data = json.loads(row[0])
+        data["tasks"] = [
+            {"id": t[0], "description": t[1], "assignee_id": t[2], "assignee_name": t[3], "status": t[4],
+             "progress": t[5], "result": t[6], "fingerprint": t[7], "depends_on": json.loads(t[8]),
+             "created_at": t[9], "completed_at": t[10], "version": t[11]}
+            for t in tasks
+        ]
+        plan = Plan.from_dict(data)
+        with self._lock:
+            if ("plan", plan_id) not in self._saved_versions:
+                self._remember_version(("plan", plan_id), plan.get_version())
+        return plan
+
+    def close(self):
+        self._closed.set()
+        self._wake.set()
+        self._flusher.join()
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
+
+    def get_stats(self) -> Dict:
+        """获取写入统计（saves为保存调用次数，aggregates_written为实际写入的对象次数）"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+            return stats
@@ -1,107 +1,165 @@
 """
 状态存储 - 统一的状态管理
 """
+from collections import OrderedDict
 from typing import Dict, Optional, List
 from domain.team import Team
 from domain.discussion import Discussion
 from domain.plan import Plan
+from .state_backend import StateBackend
 
 
 class StateStore:
-    """状态存储（单例模式）"""
-    
-    _instance = None
-    
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance._initialized = False
-        return cls._instance
-    
-    def __init__(self):
-        if self._initialized:
-            return
-        
-        self._teams: Dict[str, Team] = {}
-        self._discussions: Dict[str, Discussion] = {}
-        self._plans: Dict[str, Plan] = {}
+    """
+    状态存储
+
+    每个会话持有独立的实例（由SessionManager创建），不同会话的团队、讨论和计划互不可见。
+
+    未提供backend时状态只保存在内存中。提供backend（见StateBackend）时，每次保存同时交给后端持久化，
+    创建时从后端恢复会话当前的团队、讨论和计划；内存中每类对象只保留最近使用的max_cached个
+    （当前对象始终保留），其余对象在访问时从后端加载。
+    """
+
+    def __init__(self, backend: Optional[StateBackend] = None, session_id: str = "default",
+                 max_cached: int = 32):
+        self.backend = backend
+        self.session_id = session_id
+        self.max_cached = max_cached
+        self._teams: "OrderedDict[str, Team]" = OrderedDict()
+        self._discussions: "OrderedDict[str, Discussion]" = OrderedDict()
+        self._plans: "OrderedDict[str, Plan]" = OrderedDict()
         self._current_team_id: Optional[str] = None
         self._current_discussion_id: Optional[str] = None
         self._current_plan_id: Optional[str] = None
-        self._initialized = True
-    
+        if backend is not None:
+            current = backend.load_current(session_id)
+            self._current_team_id = current.get("team")
+            self._current_discussion_id = current.get("discussion")
+            self._current_plan_id = current.get("plan")
+
+    def _cache(self, cache: OrderedDict, obj, current_id: Optional[str]):
+        """放入内存缓存，有后端时淘汰最久未使用的非当前对象"""
+        cache[obj.id] = obj
+        cache.move_to_end(obj.id)
+        if self.backend is None:
+            return
+        for object_id in list(cache):
+            if len(cache) <= self.max_cached:
+                break
+            if object_id != current_id:
+                del cache[object_id]
+
+    def _lookup(self, cache: OrderedDict, kind: str, object_id: Optional[str], current_id: Optional[str]):
+        """从内存缓存获取，未命中时从后端加载"""
+        if object_id is None:
+            return None
+        obj = cache.get(object_id)
+        if obj is not None:
+            cache.move_to_end(object_id)
+            return obj
+        if self.backend is None:
+            return None
+        obj = getattr(self.backend, f"load_{kind}")(object_id)
+        if obj is not None:
+            self._cache(cache, obj, current_id)
+        return obj
+
+    def _set_current(self, kind: str, object_id: Optional[str]):
+        if self.backend is not None:
+            self.backend.set_current(self.session_id, kind, object_id)
+
     # Team相关
     def save_team(self, team: Team):
         """保存团队"""
-        self._teams[team.id] = team
         if self._current_team_id is None:
             self._current_team_id = team.id
-    
+            self._set_current("team", team.id)
+        self._cache(self._teams, team, self._current_team_id)
+        if self.backend is not None:
+            self.backend.save_team(self.session_id, team)
+
     def get_team(self, team_id: str) -> Optional[Team]:
         """获取团队"""
-        return self._teams.get(team_id)
-    
+        return self._lookup(self._teams, "team", team_id, self._current_team_id)
+
     def get_current_team(self) -> Optional[Team]:
         """获取当前团队"""
-        if self._current_team_id:
-            return self._teams.get(self._current_team_id)
-        return None
-    
+        return self.get_team(self._current_team_id)
+
     def set_current_team(self, team_id: str):
         """设置当前团队"""
-        if team_id in self._teams:
+        if self.get_team(team_id) is not None:
             self._current_team_id = team_id
-    
+            self._set_current("team", team_id)
+
     # Discussion相关
     def save_discussion(self, discussion: Discussion):
         """保存讨论"""
-        self._discussions[discussion.id] = discussion
-        self._current_discussion_id = discussion.id
-    
+        if self._current_discussion_id != discussion.id:
+            self._current_discussion_id = discussion.id
+            self._set_current("discussion", discussion.id)
+        self._cache(self._discussions, discussion, discussion.id)
+        if self.backend is not None:
+            self.backend.save_discussion(self.session_id, discussion)
+
     def get_discussion(self, discussion_id: str) -> Optional[Discussion]:
         """获取讨论"""
-        return self._discussions.get(discussion_id)
-    
+        return self._lookup(self._discussions, "discussion", discussion_id, self._current_discussion_id)
+
     def get_current_discussion(self) -> Optional[Discussion]:
         """获取当前讨论"""
-        if self._current_discussion_id:
-            return self._discussions.get(self._current_discussion_id)
-        return None
-    
+        return self.get_discussion(self._current_discussion_id)
+
     def get_all_discussions(self) -> List[Discussion]:
         """获取所有讨论"""
-        return list(self._discussions.values())
-    
+        if self.backend is None:
+            return list(self._discussions.values())
+        discussions = [self.get_discussion(i) for i in self.backend.list_ids(self.session_id, "discussion")]
+        return [discussion for discussion in discussions if discussion is not None]
+
     def clear_current_discussion(self):
         """清除当前讨论"""
         self._current_discussion_id = None
-    
+        self._set_current("discussion", None)
+
     # Plan相关
     def save_plan(self, plan: Plan):
         """保存计划"""
-        self._plans[plan.id] = plan
-        self._current_plan_id = plan.id
-    
+        if self._current_plan_id != plan.id:
+            self._current_plan_id = plan.id
+            self._set_current("plan", plan.id)
+        self._cache(self._plans, plan, plan.id)
+        if self.backend is not None:
+            self.backend.save_plan(self.session_id, plan)
+
     def get_plan(self, plan_id: str) -> Optional[Plan]:
         """获取计划"""
-        return self._plans.get(plan_id)
-    
+        return self._lookup(self._plans, "plan", plan_id, self._current_plan_id)
+
     def get_current_plan(self) -> Optional[Plan]:
         """获取当前计划"""
-        if self._current_plan_id:
-            return self._plans.get(self._current_plan_id)
-        return None
-    
+        return self.get_plan(self._current_plan_id)
+
     def get_all_plans(self) -> List[Plan]:
         """获取所有计划"""
-        return list(self._plans.values())
-    
+        if self.backend is None:
+            return list(self._plans.values())
+        plans = [self.get_plan(i) for i in self.backend.list_ids(self.session_id, "plan")]
+        return [plan for plan in plans if plan is not None]
+
     # 清理方法
     def clear_all(self):
-        """清空所有数据"""
+        """清空所有数据（有后端时只清空内存缓存和当前对象，已持久化的数据保留）"""
         self._teams.clear()
         self._discussions.clear()
         self._plans.clear()
         self._current_team_id = None
         self._current_discussion_id = None
         self._current_plan_id = None
+        for kind in ("team", "discussion", "plan"):
+            self._set_current(kind, None)
+
+    def flush(self):
+        """将后端尚未写入的变化立即写入"""
+        if self.backend is not None:
+            self.backend.flush()
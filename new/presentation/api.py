@@ -3,12 +3,13 @@ Flask API - 提供RESTful接口
 """
 import sys
 import os
+import json
+import queue
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
-from application.team_orchestrator import TeamOrchestrator
-from infrastructure.ai_service import AIConfig
-import os
+from application.session_manager import DEFAULT_SESSION_ID, InvalidSessionError, SessionLimitError, SessionManager
+from application.job_queue import JobQueue
 
 app = Flask(__name__)
 CORS(app)
@@ -22,11 +23,85 @@ def index():
 def static_file(path):
     return send_from_directory(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), path)
 
-# 创建编排器
-orchestrator = TeamOrchestrator()
+# 需求处理作业队列：请求线程只负责入队，流水线在工作线程中运行。
+# 不同会话的需求并发处理，同一会话的作业在派发前按会话ID串行
+job_queue = JobQueue(max_workers=4, max_queue_depth=20)
+
+# 会话管理器：每个会话拥有独立的编排器和状态，所有会话共享AI服务；有未结束作业的会话不会被回收
+session_manager = SessionManager(job_queue=job_queue)
+
+
+def _current_session():
+    """
+    获取当前请求所属的会话
+    
+    会话ID依次取自请求头 X-Session-Id、查询参数 session_id、请求体 session_id，均未提供时使用 default。
+    会话ID必须由 POST /api/session 签发，否则抛出InvalidSessionError（见invalid_session）
+    """
+    session_id = (
+        request.headers.get('X-Session-Id')
+        or request.args.get('session_id')
+        or (request.get_json(silent=True) or {}).get('session_id')
+        or DEFAULT_SESSION_ID
+    )
+    return session_manager.get_or_create(session_id[:128])
+
+
+@app.errorhandler(InvalidSessionError)
+def invalid_session(e):
+    """会话ID不是由本服务签发的（error字段供客户端与其他404区分，重新申请会话ID）"""
+    return jsonify({
+        "success": False,
+        "error": "invalid_session",
+        "message": "无效的会话ID，请通过 POST /api/session 获取"
+    }), 404
+
+
+@app.errorhandler(SessionLimitError)
+def session_limit_reached(e):
+    """会话数已达上限且没有可回收的空闲会话"""
+    return jsonify({
+        "success": False,
+        "message": "会话数已达上限，请稍后再试"
+    }), 429
+
+
+def _session_busy_response():
+    """会话正在执行其他修改操作时的响应"""
+    return jsonify({
+        "success": False,
+        "message": "当前会话正在处理其他操作，请稍后再试"
+    }), 409
+
 
-# 用于跟踪是否正在处理需求的标志
-is_processing_requirement = False
+def _get_session_job(session, job_id):
+    """获取属于当前会话的作业"""
+    job = job_queue.get_job(job_id)
+    if job and job.payload.get("session_id") == session.id:
+        return job
+    return None
+
+
+def _parse_requirement_request():
+    """解析需求请求，返回 (requirement, agent_count, 错误响应)"""
+    data = request.json or {}
+    requirement = data.get('requirement')
+    agent_count = data.get('agent_count', 3)
+    
+    if not requirement:
+        return None, None, (jsonify({
+            "success": False,
+            "message": "需求不能为空"
+        }), 400)
+    return requirement, agent_count, None
+
+
+def _queue_full_response():
+    """队列已满时的响应"""
+    return jsonify({
+        "success": False,
+        "message": "待处理的需求过多，请稍后再试"
+    }), 429
 
 
 @app.route('/api/health', methods=['GET'])
@@ -38,7 +113,7 @@ def health():
 @app.route('/api/requirement', methods=['POST'])
 def handle_requirement():
     """
-    处理用户需求
+    提交用户需求（异步作业）
     
     Request:
         {
@@ -46,55 +121,179 @@ def handle_requirement():
             "agent_count": 3
         }
     
-    Response:
+    Response（202）：
         {
-            "success": bool,
+            "success": true,
             "message": str,
-            "team": {...},
-            "discussion": {...},
-            "plan": {...}
+            "job": {"id": str, "status": "queued", ...}
         }
+    
+    通过 /api/jobs/<job_id> 查询作业状态，结束后通过 /api/jobs/<job_id>/result 获取处理结果。
+    队列已满时返回429。
     """
-    global is_processing_requirement
+    requirement, agent_count, error = _parse_requirement_request()
+    if error:
+        return error
+    session = _current_session()
     
-    # 检查是否正在处理需求
-    if is_processing_requirement:
-        return jsonify({
-            "success": False,
-            "message": "正在处理其他需求，请稍后再试"
-        }), 429
+    def run(job):
+        # 会话锁仅用于与编辑/执行接口互斥；同一会话同时只有一个作业被派发
+        with session.lock:
+            result = session.orchestrator.handle_user_requirement(
+                requirement, agent_count, should_cancel=job.is_cancelled
+            )
+        return _requirement_result_to_dict(result)
     
-    data = request.json
-    requirement = data.get('requirement')
-    agent_count = data.get('agent_count', 3)
+    # 同一会话的作业在派发前按会话串行，排队中的作业不占用工作线程
+    job = job_queue.submit(run, {"session_id": session.id, "requirement": requirement, "agent_count": agent_count},
+                           serial_key=session.id)
+    if job is None:
+        return _queue_full_response()
     
-    if not requirement:
-        return jsonify({
-            "success": False,
-            "message": "需求不能为空"
-        }), 400
+    return jsonify({
+        "success": True,
+        "message": "需求已提交",
+        "job": job.to_dict()
+    }), 202
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """获取作业状态"""
+    job = _get_session_job(_current_session(), job_id)
+    if not job:
+        return jsonify({"success": False, "message": "作业不存在"}), 404
+    return jsonify({"success": True, "job": job.to_dict()})
+
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """
+    获取作业结果
     
-    try:
-        # 设置处理标志
-        is_processing_requirement = True
-        
-        result = orchestrator.handle_user_requirement(requirement, agent_count)
-        
-        return jsonify({
-            "success": result["success"],
-            "message": result["message"],
-            "team": result["team"].to_dict() if result["team"] else None,
-            "discussion": result["discussion"].to_dict() if result["discussion"] else None,
-            "plan": result["plan"].to_dict() if result["plan"] else None
+    作业成功时返回需求处理结果（与流式接口的result事件相同），
+    未结束时返回409，失败或取消时返回对应的错误信息。
+    """
+    job = _get_session_job(_current_session(), job_id)
+    if not job:
+        return jsonify({"success": False, "message": "作业不存在"}), 404
+    if not job.is_finished():
+        return jsonify({"success": False, "message": "作业尚未完成", "job": job.to_dict()}), 409
+    if job.status == "cancelled":
+        return jsonify({"success": False, "message": "作业已取消", "job": job.to_dict()})
+    if job.status == "failed":
+        return jsonify({"success": False, "message": f"处理失败：{job.error}", "job": job.to_dict()})
+    return jsonify(job.result)
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """
+    取消作业
+    
+    排队中的作业立即取消；执行中的作业在下一个检查点（讨论轮次之间、制定计划前）停止。
+    """
+    job = _get_session_job(_current_session(), job_id)
+    if not job:
+        return jsonify({"success": False, "message": "作业不存在"}), 404
+    job = job_queue.cancel(job_id)
+    if not job:
+        return jsonify({"success": False, "message": "作业不存在"}), 404
+    return jsonify({"success": True, "message": "已请求取消", "job": job.to_dict()})
+
+
+@app.route('/api/jobs', methods=['GET'])
+def get_job_stats():
+    """获取作业队列统计"""
+    return jsonify(job_queue.get_stats())
+
+
+@app.route('/api/requirement/stream', methods=['POST'])
+def handle_requirement_stream():
+    """
+    处理用户需求（流式）
+    
+    Request:
+        与 /api/requirement 相同
+    
+    Response（text/event-stream，每个事件为一行 data: JSON）：
+        {"type": "job", "job": {...}}
+        {"type": "delta", "message_id": str, "agent_id": str, "agent_name": str, "round": int, "delta": str}
+        {"type": "result", "success": bool, "message": str, "team": {...}, "discussion": {...}, "plan": {...}}
+        {"type": "error", "message": str}
+    
+    需求同样作为作业进入队列，客户端断开不会中断处理。
+    """
+    requirement, agent_count, error = _parse_requirement_request()
+    if error:
+        return error
+    session = _current_session()
+    
+    events = queue.Queue()
+    
+    def on_delta(discussion, message, delta):
+        events.put({
+            "type": "delta",
+            "message_id": message.id,
+            "agent_id": message.agent_id,
+            "agent_name": message.agent_name,
+            "round": message.round,
+            "delta": delta
         })
-    except Exception as e:
-        return jsonify({
-            "success": False,
-            "message": f"处理失败：{str(e)}"
-        }), 500
-    finally:
-        # 清除处理标志
-        is_processing_requirement = False
+    
+    def run(job):
+        try:
+            with session.lock:
+                result = session.orchestrator.handle_user_requirement(
+                    requirement, agent_count, stream_callback=on_delta, should_cancel=job.is_cancelled
+                )
+            event = _requirement_result_to_dict(result)
+            events.put(dict(event, type="result"))
+            return event
+        except Exception as e:
+            events.put({"type": "error", "message": "作业已取消" if job.is_cancelled() else f"处理失败：{str(e)}"})
+            raise
+        finally:
+            events.put(None)
+    
+    # 同一会话的作业在派发前按会话串行，排队中的作业不占用工作线程
+    job = job_queue.submit(run, {"session_id": session.id, "requirement": requirement, "agent_count": agent_count},
+                           serial_key=session.id)
+    if job is None:
+        return _queue_full_response()
+    
+    def generate():
+        yield f"data: {json.dumps({'type': 'job', 'job': job.to_dict()}, ensure_ascii=False)}\n\n"
+        while True:
+            try:
+                event = events.get(timeout=15)
+            except queue.Empty:
+                if job.is_finished() and events.empty():
+                    # 作业在排队期间被取消，执行函数不会运行
+                    yield f"data: {json.dumps({'type': 'error', 'message': '作业已取消'}, ensure_ascii=False)}\n\n"
+                    break
+                # 保活注释，防止代理断开空闲连接
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:
+                break
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
+def _requirement_result_to_dict(result):
+    """将需求处理结果转换为响应字典"""
+    return {
+        "success": result["success"],
+        "message": result["message"],
+        "team": result["team"].to_dict() if result["team"] else None,
+        "discussion": result["discussion"].to_dict() if result["discussion"] else None,
+        "plan": result["plan"].to_dict() if result["plan"] else None
+    }
 
 
 @app.route('/api/task/progress', methods=['POST'])
@@ -118,7 +317,9 @@ def update_task_progress():
             "message": "任务ID不能为空"
         }), 400
     
+    orchestrator = _current_session().orchestrator
     try:
+        # 进度上报只修改单个任务，不需要获取会话锁（执行任务期间也允许上报）
         result = orchestrator.update_task_progress(task_id, progress)
         return jsonify(result)
     except Exception as e:
@@ -130,10 +331,27 @@ def update_task_progress():
 
 @app.route('/api/status', methods=['GET'])
 def get_status():
-    """获取当前状态"""
+    """
+    获取当前状态
+    
+    Query:
+        since: 可选，版本号；提供时只返回该版本之后变化的团队、讨论消息和任务，
+            未变化的部分不出现在响应中。下次请求使用响应中的 version
+    
+    响应带有ETag，请求头 If-None-Match 匹配时返回304
+    """
+    orchestrator = _current_session().orchestrator
     try:
-        status = orchestrator.get_current_status()
-        return jsonify(status)
+        since = request.args.get('since', type=int)
+        etag = orchestrator.get_status_etag(since)
+        if request.if_none_match.contains_weak(etag):
+            response = app.response_class(status=304)
+        else:
+            response = jsonify(orchestrator.get_current_status(since=since))
+        response.set_etag(etag, weak=True)
+        # 强制客户端每次重新验证，由ETag决定是否需要重新传输
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         return jsonify({
             "success": False,
@@ -141,6 +359,58 @@ def get_status():
         }), 500
 
 
+@app.route('/api/ai-stats', methods=['GET'])
+def get_ai_stats():
+    """
+    获取AI调用统计（缓存、请求合并、准入控制、容错、端点等）
+    
+    统计为所有会话共享的全局数据且随时变化，不包含在带ETag的 /api/status 中
+    """
+    return jsonify(_current_session().orchestrator.get_ai_stats())
+
+
+@app.route('/api/events', methods=['GET'])
+def events():
+    """
+    事件流（SSE），推送流程中的增量事件，替代对 /api/status 的轮询
+    
+    Query / Header:
+        last_event_id 或 Last-Event-ID: 已收到的最后一个事件序号，断线重连时补发之后的事件
+    
+    Response（text/event-stream）：
+        id: <seq>
+        data: {"seq": int, "type": str, "data": {...}, "timestamp": float}
+    
+    事件类型：stage_changed、team_created、discussion_started、round_started、
+    message_added、message_delta、message_completed、message_removed、round_decision、consensus_reached、
+    discussion_failed、plan_created、plan_updated、task_updated、task_progress、task_result、
+    execution_started、execution_progress、execution_completed、resync（需重新拉取完整状态）
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    last_seq = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    session = _current_session()
+    subscription = session.orchestrator.event_bus.subscribe(last_seq)
+    
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                event = subscription.get(timeout=15)
+                if event is None:
+                    # 保活注释，防止代理断开空闲连接；订阅期间会话保持活跃
+                    session.touch()
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event['seq']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            subscription.close()
+    
+    return Response(generate(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+
 @app.route('/api/update-goal', methods=['POST'])
 def update_goal():
     """
@@ -160,14 +430,19 @@ def update_goal():
             "message": "需求不能为空"
         }), 400
     
+    session = _current_session()
+    if not session.lock.acquire(blocking=False):
+        return _session_busy_response()
     try:
-        result = orchestrator.update_goal(goal)
+        result = session.orchestrator.update_goal(goal)
         return jsonify(result)
     except Exception as e:
         return jsonify({
             "success": False,
             "message": f"更新需求失败：{str(e)}"
         }), 500
+    finally:
+        session.lock.release()
 
 
 @app.route('/api/update-task', methods=['POST'])
@@ -193,14 +468,19 @@ def update_task():
             "message": "任务ID、描述和负责人不能为空"
         }), 400
     
+    session = _current_session()
+    if not session.lock.acquire(blocking=False):
+        return _session_busy_response()
     try:
-        result = orchestrator.update_task(task_id, description, assignee_name)
+        result = session.orchestrator.update_task(task_id, description, assignee_name)
         return jsonify(result)
     except Exception as e:
         return jsonify({
             "success": False,
             "message": f"更新任务失败：{str(e)}"
         }), 500
+    finally:
+        session.lock.release()
 
 
 @app.route('/api/execute-tasks', methods=['POST'])
@@ -222,29 +502,41 @@ def execute_tasks():
             "message": "至少选择一个任务"
         }), 400
     
+    session = _current_session()
+    if not session.lock.acquire(blocking=False):
+        return _session_busy_response()
     try:
-        result = orchestrator.execute_tasks(task_ids)
+        result = session.orchestrator.execute_tasks(task_ids)
         return jsonify(result)
     except Exception as e:
         return jsonify({
             "success": False,
             "message": f"执行任务失败：{str(e)}"
         }), 500
+    finally:
+        session.lock.release()
 
 
 @app.route('/api/reexecute-plan', methods=['POST'])
 def reexecute_plan():
     """
     重新执行计划
+    
+    输入未变化的任务和最终反馈复用上次的结果，只重新执行修改过的任务及受其影响的后续任务。
     """
+    session = _current_session()
+    if not session.lock.acquire(blocking=False):
+        return _session_busy_response()
     try:
-        result = orchestrator.reexecute_plan()
+        result = session.orchestrator.reexecute_plan()
         return jsonify(result)
     except Exception as e:
         return jsonify({
             "success": False,
             "message": f"重新执行失败：{str(e)}"
         }), 500
+    finally:
+        session.lock.release()
 
 
 @app.route('/api/execution-status', methods=['GET'])
@@ -252,6 +544,7 @@ def get_execution_status():
     """
     获取执行状态
     """
+    orchestrator = _current_session().orchestrator
     try:
         status = orchestrator.get_execution_status()
         return jsonify(status)
@@ -262,6 +555,34 @@ def get_execution_status():
         }), 500
 
 
+@app.route('/api/session', methods=['POST'])
+def create_session():
+    """
+    申请新的会话ID，之后的请求通过请求头 X-Session-Id 携带
+    
+    Response:
+        {"success": true, "session_id": str}
+
+    同一客户端申请过于频繁时返回429
+    """
+    session_id = session_manager.issue_session_id(client=request.remote_addr)
+    if session_id is None:
+        return jsonify({
+            "success": False,
+            "message": "申请会话过于频繁，请稍后再试"
+        }), 429
+    return jsonify({"success": True, "session_id": session_id})
+
+
+@app.route('/api/session', methods=['DELETE'])
+def delete_session():
+    """删除当前会话（会话正在处理时不能删除）"""
+    session = _current_session()
+    if not session_manager.remove(session.id):
+        return _session_busy_response()
+    return jsonify({"success": True, "message": "会话已删除"})
+
+
 def run_server(host='0.0.0.0', port=5003, debug=False):
     """启动服务器"""
     app.run(host=host, port=port, debug=debug)
@@ -0,0 +1,118 @@
+"""
+准入控制测试
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from infrastructure.admission import AdmissionController, TokenBucket
+from infrastructure.ai_service import AIConfig, AIService
+
+
+def test_token_bucket_refill_and_oversized_requests():
+    bucket = TokenBucket(rate=10, capacity=5)
+    bucket.take(5)
+    assert not bucket.can_take(1)
+    assert bucket.wait_time(1) == pytest.approx(0.1)
+    bucket.refill(bucket._updated + 0.2)
+    assert bucket.tokens == pytest.approx(2)
+    bucket.refill(bucket._updated + 10)
+    # 超过容量的请求在桶满时放行
+    assert bucket.tokens == 5 and bucket.can_take(50)
+
+
+def test_unknown_policy_is_rejected():
+    with pytest.raises(ValueError):
+        AdmissionController(max_in_flight=1, policy="drop")
+
+
+def test_fail_fast_rejects_when_no_capacity():
+    controller = AdmissionController(max_in_flight=1, policy="fail_fast")
+    admission = controller.acquire("discussion", 10)
+    assert admission is not None and admission.granted
+    assert controller.acquire("execution", 10) is None
+    stats = controller.get_stats()
+    assert (stats["admitted"], stats["rejected"], stats["in_flight"]) == (1, 1, 1)
+    assert stats["classes"]["execution"]["rejected"] == 1
+    controller.release(admission)
+    assert controller.acquire("execution", 10) is not None
+
+
+def test_block_waits_for_release_and_times_out():
+    controller = AdmissionController(max_in_flight=1, timeout=0.05)
+    first = controller.acquire("discussion", 10)
+    assert controller.acquire("discussion", 10) is None  # 超时被拒绝
+    assert controller.get_stats()["waiting"] == 0
+
+    timer = threading.Timer(0.02, controller.release, (first,))
+    timer.start()
+    controller.timeout = 2
+    assert controller.acquire("discussion", 10).granted
+
+
+def test_waiting_classes_are_served_round_robin():
+    controller = AdmissionController(max_in_flight=1)
+    holder = controller.acquire("default", 1)
+    order = []
+
+    def request(traffic_class):
+        admission = controller.acquire(traffic_class, 1)
+        order.append(traffic_class)
+        controller.release(admission)
+
+    threads = []
+    for traffic_class in ("execution", "execution", "execution", "discussion", "planning"):
+        threads.append(threading.Thread(target=request, args=(traffic_class,)))
+        threads[-1].start()
+        while controller.get_stats()["waiting"] < len(threads):
+            time.sleep(0.005)
+    controller.release(holder)
+    for thread in threads:
+        thread.join()
+    # 大量执行请求不会让讨论、计划请求排到最后
+    assert order == ["discussion", "planning", "execution", "execution", "execution"]
+
+
+def test_token_estimate_is_corrected_on_release():
+    controller = AdmissionController(tokens_per_minute=600, policy="fail_fast")
+    admission = controller.acquire("default", 500)
+    assert controller.acquire("default", 200) is None
+    controller.release(admission, actual_tokens=100)  # 退还400
+    assert controller.acquire("default", 200) is not None
+
+
+def test_backoff_pauses_admission():
+    controller = AdmissionController(max_in_flight=5, timeout=2)
+    controller.backoff(0.1)
+    started = time.monotonic()
+    assert controller.acquire("default", 1) is not None
+    assert time.monotonic() - started >= 0.09
+    assert controller.get_stats()["backoffs"] == 1
+
+
+def test_cancelled_async_waiter_does_not_leak_capacity():
+    controller = AdmissionController(max_in_flight=1)
+
+    async def run():
+        holder = await controller.acquire_async("default", 1)
+        waiter = asyncio.ensure_future(controller.acquire_async("default", 1))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        controller.release(holder)
+        return await asyncio.wait_for(controller.acquire_async("default", 1), 1)
+
+    assert asyncio.run(run()).granted
+    assert controller.get_stats()["waiting"] == 0
+
+
+def test_ai_service_reports_rejected_requests():
+    service = AIService(AIConfig(base_url="http://127.0.0.1:9/v1", model="m", api_key="k",
+                                 max_in_flight=1, admission_policy="fail_fast"))
+    holder = service.admission.acquire("execution", 1)
+    result = service.generate("问题", traffic_class="execution")
+    assert result["success"] is False and result["rejected"] is True
+    service.admission.release(holder)
+    assert service.get_admission_stats()["rejected"] == 1
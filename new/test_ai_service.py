@@ -0,0 +1,65 @@
+"""
+同步AI服务HTTP会话测试（连接池、长连接与超时）
+"""
+import time
+
+from infrastructure.ai_service import AIConfig, AIService
+
+
+def _service(url, **kwargs):
+    return AIService(AIConfig(base_url=url, model="test-model", api_key="empty", max_retries=0, **kwargs))
+
+
+def test_session_uses_configured_pool(completion_server):
+    service = _service(completion_server.url, pool_connections=3, pool_maxsize=7, pool_block=True)
+    adapter = service._session.get_adapter(completion_server.url)
+    assert (adapter._pool_connections, adapter._pool_maxsize, adapter._pool_block) == (3, 7, True)
+    assert service._session.get_adapter("https://example.com") is adapter
+    service.close()
+
+
+def test_connection_is_reused_across_calls(completion_server):
+    service = _service(completion_server.url)
+    for n in range(3):
+        assert service.generate(f"请求{n}")["success"]
+    assert len(completion_server.clients) == 3 and len(set(completion_server.clients)) == 1
+    service.close()
+
+
+def test_keep_alive_can_be_disabled(completion_server):
+    service = _service(completion_server.url, keep_alive=False)
+    assert service._session.headers["Connection"] == "close"
+    for n in range(3):
+        assert service.generate(f"请求{n}")["success"]
+    assert len(set(completion_server.clients)) == 3
+    service.close()
+
+
+def test_read_timeout_is_honored(completion_server):
+    def slow_completion(payload):
+        time.sleep(1)
+        return 200, {"choices": [{"index": 0, "text": "过慢的回复"}], "usage": {"total_tokens": 5}}
+
+    completion_server.responder = slow_completion
+    service = _service(completion_server.url, read_timeout=0.1)
+    started_at = time.monotonic()
+    result = service.generate("请求")
+    assert not result["success"] and time.monotonic() - started_at < 1
+    service.close()
+
+
+def test_timeouts_are_passed_to_every_request(completion_server):
+    service = _service(completion_server.url, connect_timeout=1.5, read_timeout=7)
+    adapter = service._session.get_adapter(completion_server.url)
+    timeouts = []
+    send = adapter.send
+
+    def recording_send(request, **kwargs):
+        timeouts.append(kwargs["timeout"])
+        return send(request, **kwargs)
+
+    adapter.send = recording_send
+    assert service.generate("请求")["success"]
+    assert service.generate_stream("流式请求", lambda delta: None)["success"]
+    assert timeouts == [(1.5, 7), (1.5, 7)]
+    service.close()
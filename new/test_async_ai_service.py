@@ -0,0 +1,114 @@
+"""
+异步AI服务测试
+"""
+import asyncio
+
+from application.team_orchestrator import TeamOrchestrator
+from application.workflow_engine import WorkflowEngine
+from domain.agent import Agent
+from domain.discussion import Discussion, DiscussionStatus
+from infrastructure.ai_service import AIConfig, AIService
+from infrastructure.async_ai_service import AsyncAIService, create_async_ai_service, run_sync
+
+
+def _config(url):
+    return AIConfig(base_url=url, model="test-model", api_key="empty", max_retries=0)
+
+
+def test_generate(completion_server):
+    service = AsyncAIService(_config(completion_server.url))
+
+    async def run():
+        try:
+            return await service.generate("你好")
+        finally:
+            await service.close()
+
+    result = asyncio.run(run())
+    assert result["success"] and result["text"] == "echo:你好"
+    assert service.get_total_tokens() == 5
+
+
+def test_session_of_closed_loop_is_closed(completion_server):
+    service = AsyncAIService(_config(completion_server.url))
+    asyncio.run(service.generate("第一个循环"))
+    first_session = next(iter(service._sessions.values()))
+
+    async def second_loop():
+        await service.generate("第二个循环")
+        assert first_session.closed
+        assert len(service._sessions) == 1
+        await service.close()
+
+    asyncio.run(second_loop())
+    assert not service._sessions
+
+
+def test_close_closes_sessions_of_all_loops(completion_server):
+    service = AsyncAIService(_config(completion_server.url))
+    # 后台事件循环上的会话（仍在运行的其他循环）
+    run_sync(service.generate("后台循环"))
+    background_session = next(iter(service._sessions.values()))
+
+    async def run():
+        await service.generate("当前循环")
+        assert len(service._sessions) == 2
+        await service.close()
+
+    asyncio.run(run())
+    assert background_session.closed
+    assert not service._sessions
+
+
+def test_default_async_service_is_native():
+    ai_service = AIService(_config("http://127.0.0.1:9/v1"))
+    assert isinstance(create_async_ai_service(ai_service), AsyncAIService)
+    orchestrator = TeamOrchestrator(ai_service=ai_service)
+    assert isinstance(orchestrator.async_ai_service, AsyncAIService)
+    assert isinstance(orchestrator.workflow_engine.async_ai_service, AsyncAIService)
+
+
+def test_async_service_shares_core_with_sync_service(completion_server):
+    config = _config(completion_server.url)
+    config.cache_enabled = True
+    config.temperature = 0
+    ai_service = AIService(config)
+    service = create_async_ai_service(ai_service)
+    assert service.core is ai_service.core
+    assert service.cache is ai_service.cache and service.admission is ai_service.admission
+
+    async def run():
+        try:
+            return await service.generate("共享")
+        finally:
+            await service.close()
+
+    assert asyncio.run(run())["success"]
+    # 异步调用的用量和缓存对同步服务可见
+    assert ai_service.get_total_tokens() == 5
+    assert ai_service.generate("共享")["cached"]
+    assert len(completion_server.requests) == 1
+
+
+def test_async_workflow(stub_ai):
+    """单事件循环驱动讨论"""
+    def reply(prompt):
+        if "共识" in prompt and "发表你对以下主题的专业意见" not in prompt:
+            return "采用前后端分离架构，先实现查询接口"
+        return "我建议采用前后端分离架构，先实现天气查询接口"
+
+    stub_ai.sync.reply = reply
+    engine = WorkflowEngine(None, stub_ai)
+    agents = [
+        Agent(id="a1", name="Alice", role="前端开发工程师", skills=["React"]),
+        Agent(id="a2", name="Bob", role="后端架构师", skills=["Python"])
+    ]
+    discussion = Discussion(id="async-demo", topic="如何实现：开发一个天气查询应用", max_rounds=2)
+
+    asyncio.run(engine.arun_discussion_with_callback(discussion, agents))
+
+    assert discussion.status == DiscussionStatus.CONSENSUS_REACHED
+    assert discussion.consensus == "采用前后端分离架构，先实现查询接口"
+    assert discussion.current_round == 2
+    assert [msg.agent_name for msg in discussion.messages] == ["Alice", "Bob", "Alice", "Bob"]
+    assert discussion.tokens_used == stub_ai.get_total_tokens()
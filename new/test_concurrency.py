@@ -0,0 +1,131 @@
+"""
+共享并发限制器与任务超时测试
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from conftest import StubAIService
+from infrastructure.async_ai_service import AsyncAIServiceAdapter
+from infrastructure.concurrency import SharedLimiter
+
+
+def test_limit_must_be_positive():
+    with pytest.raises(ValueError):
+        SharedLimiter(0)
+
+
+def test_waiters_are_granted_in_arrival_order():
+    limiter = SharedLimiter(1)
+    order = []
+
+    async def worker(name):
+        async with limiter:
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(*(worker(n) for n in range(4)))
+
+    asyncio.run(run())
+    assert order == [0, 1, 2, 3]
+    stats = limiter.get_stats()
+    assert (stats["active"], stats["waiting"], stats["waited"], stats["max_waiting"]) == (0, 0, 3, 3)
+
+
+def test_cancelled_waiter_passes_slot_on():
+    limiter = SharedLimiter(1)
+
+    async def run():
+        await limiter.acquire()
+        cancelled = asyncio.ensure_future(limiter.acquire())
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        limiter.release()
+        await asyncio.wait_for(waiter, 1)
+        limiter.release()
+
+    asyncio.run(run())
+    assert limiter.get_stats()["active"] == 0
+
+
+def test_limit_is_shared_between_threads_and_event_loops():
+    limiter = SharedLimiter(2)
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def hold():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        time.sleep(0.02)
+        with lock:
+            active[0] -= 1
+
+    async def async_worker():
+        async with limiter:
+            await asyncio.get_running_loop().run_in_executor(None, hold)
+
+    def sync_worker():
+        assert limiter.acquire_sync(timeout=5)
+        try:
+            hold()
+        finally:
+            limiter.release()
+
+    threads = [threading.Thread(target=lambda: asyncio.run(async_worker())) for _ in range(3)]
+    threads += [threading.Thread(target=sync_worker) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] == 2 and limiter.get_stats()["active"] == 0
+
+
+def test_acquire_sync_times_out():
+    limiter = SharedLimiter(1)
+    assert limiter.acquire_sync()
+    assert not limiter.acquire_sync(timeout=0.01)
+    assert limiter.get_stats()["waiting"] == 0
+    limiter.release()
+
+
+def test_timed_out_adapter_call_keeps_slot_until_request_finishes():
+    finished = threading.Event()
+
+    def slow_reply(prompt):
+        time.sleep(0.2)
+        finished.set()
+        return "迟到的回复"
+
+    adapter = AsyncAIServiceAdapter(StubAIService(slow_reply), max_workers=1)
+    limiter = SharedLimiter(1)
+
+    async def run():
+        async with limiter:
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(adapter.generate("问题"), 0.02)
+            # 超时后返回时线程中的请求已经结束，名额此前一直被占用
+            assert finished.is_set()
+
+    asyncio.run(run())
+
+
+def test_cancelled_adapter_call_that_has_not_started_is_dropped():
+    release = threading.Event()
+    sync = StubAIService(lambda prompt: release.wait(5) and "回复")
+    adapter = AsyncAIServiceAdapter(sync, max_workers=1)
+
+    async def run():
+        busy = asyncio.ensure_future(adapter.generate("占用线程"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(adapter.generate("排队"), 0.02)
+        release.set()
+        await busy
+
+    asyncio.run(run())
+    assert sync.prompts() == ["占用线程"]
@@ -0,0 +1,72 @@
+"""
+共识预检测试
+"""
+import asyncio
+
+import pytest
+
+from application import consensus_precheck
+from application.consensus_precheck import CONVERGENT, DIVERGENT, UNCERTAIN, ConsensusPrecheck
+from application.workflow_engine import WorkflowEngine
+from domain.discussion import Discussion
+
+SAME = ["我们应该先完成用户登录模块的开发", "我们应该先完成用户登录模块的开发工作"]
+DIFFERENT = ["优先开发移动端应用", "数据库选型需要考虑成本"]
+
+
+def test_similarity_bounds():
+    precheck = ConsensusPrecheck()
+    assert precheck.similarity(["同样的意见", "同样的意见"]) == pytest.approx(1.0)
+    assert precheck.similarity(["甲乙丙", "丁戊己"]) == pytest.approx(0.0)
+    # 不足两条有效意见时无法判断
+    assert precheck.similarity(["只有一条"]) is None
+    assert precheck.similarity(["有内容", "，。！"]) is None
+
+
+def test_classify_by_thresholds():
+    precheck = ConsensusPrecheck(divergent_below=0.1, convergent_above=0.7)
+    assert precheck.classify(SAME) == CONVERGENT
+    assert precheck.classify(DIFFERENT) == DIVERGENT
+    assert precheck.verdict(0.5) == UNCERTAIN
+    assert precheck.verdict(None) == UNCERTAIN
+
+
+def test_python_and_numpy_implementations_agree():
+    pytest.importorskip("numpy")
+    documents = [consensus_precheck._ngrams(text, 2) for text in SAME + DIFFERENT]
+    assert ConsensusPrecheck._similarity_numpy(documents) == pytest.approx(
+        ConsensusPrecheck._similarity_python(documents)
+    )
+
+
+def _discussion(opinions):
+    discussion = Discussion(id="d", topic="主题")
+    discussion.start_new_round()
+    for index, opinion in enumerate(opinions):
+        discussion.add_message(f"a{index}", f"成员{index}", opinion)
+    return discussion
+
+
+def test_divergent_round_skips_model_call(stub_ai):
+    engine = WorkflowEngine(None, stub_ai)
+    discussion = _discussion(DIFFERENT)
+    assert asyncio.run(engine._check_consensus(discussion, [])) is None
+    assert stub_ai.sync.calls == []
+    assert discussion.consensus_prechecks == {DIVERGENT: 1}
+
+
+def test_convergent_round_only_summarizes(stub_ai):
+    stub_ai.sync.reply = lambda prompt: "共识：先做登录"
+    engine = WorkflowEngine(None, stub_ai)
+    discussion = _discussion(SAME)
+    assert asyncio.run(engine._check_consensus(discussion, [])) == "共识：先做登录"
+    assert len(stub_ai.sync.calls) == 1 and "总结他们的共识" in stub_ai.sync.calls[0][1]
+
+
+def test_disabled_precheck_always_asks_model(stub_ai):
+    stub_ai.sync.reply = lambda prompt: "未达成共识"
+    engine = WorkflowEngine(None, stub_ai, precheck_consensus=False)
+    discussion = _discussion(DIFFERENT)
+    assert asyncio.run(engine._check_consensus(discussion, [])) is None
+    assert len(stub_ai.sync.calls) == 1 and "判断是否达成共识" in stub_ai.sync.calls[0][1]
+    assert discussion.consensus_prechecks == {}
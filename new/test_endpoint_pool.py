@@ -0,0 +1,91 @@
+"""
+端点池测试
+"""
+import pytest
+
+from infrastructure.ai_service import AIConfig, AIService
+from infrastructure.endpoint_pool import EndpointPool
+
+URLS = ["http://a/v1", "http://b/v1", "http://c/v1"]
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        EndpointPool([])
+    with pytest.raises(ValueError):
+        EndpointPool(URLS, strategy="random")
+
+
+def test_least_outstanding_spreads_requests():
+    pool = EndpointPool(URLS)
+    chosen = [pool.acquire().url for _ in range(3)]
+    assert sorted(chosen) == URLS
+    pool.release(pool.endpoints[1], True, 0.1)
+    assert pool.acquire().url == "http://b/v1"
+
+
+def test_ewma_prefers_faster_endpoint():
+    pool = EndpointPool(URLS[:2], strategy="ewma")
+    for endpoint, latency in zip(pool.endpoints, (1.0, 0.1)):
+        pool.acquire()
+        pool.release(endpoint, True, latency)
+    assert pool.acquire().url == "http://b/v1"
+    # 快的端点积压后，预计耗时 0.1 × 2 仍小于 1.0 × 1
+    assert pool.acquire().url == "http://b/v1"
+    assert [e.outstanding for e in pool.endpoints] == [0, 2]
+
+
+def test_affinity_is_stable_and_only_moves_keys_of_ejected_endpoint():
+    pool = EndpointPool(URLS, eject_after=1)
+    keys = [f"discussion-{n}" for n in range(30)]
+    before = {}
+    for key in keys:
+        endpoint = pool.acquire(key)
+        pool.cancel(endpoint)
+        before[key] = endpoint.url
+    assert len(set(before.values())) > 1
+
+    ejected = pool.endpoints[0]
+    pool.acquire()
+    pool.release(ejected, False, 0.1, retryable=True)
+    for key in keys:
+        endpoint = pool.acquire(key)
+        pool.cancel(endpoint)
+        if before[key] != ejected.url:
+            assert endpoint.url == before[key]
+        else:
+            assert endpoint.url != ejected.url
+
+
+def test_retryable_failures_eject_endpoint_until_recovery():
+    pool = EndpointPool(URLS[:2], eject_after=2, eject_duration=60)
+    endpoint = pool.endpoints[0]
+    pool.release(endpoint, False, 0.1, retryable=False)   # 400之类的错误不计入健康检查
+    pool.release(endpoint, False, 0.1, retryable=True)
+    assert not endpoint.is_ejected(0) and endpoint.consecutive_failures == 1
+    pool.release(endpoint, False, 0.1, retryable=True)
+    stats = pool.get_stats()["endpoints"][0]
+    assert (stats["ejected"], stats["ejections"], stats["failures"]) == (True, 1, 3)
+    assert all(pool.acquire().url == "http://b/v1" for _ in range(3))
+
+    # 摘除到期后恢复，观察期内再失败一次即再次摘除
+    endpoint.ejected_until = 0.0
+    pool.release(endpoint, False, 0.1, retryable=True)
+    assert pool.get_stats()["endpoints"][0]["ejections"] == 2
+
+
+def test_all_ejected_falls_back_to_earliest_recovery():
+    pool = EndpointPool(URLS[:2], eject_after=1)
+    for endpoint, until in zip(pool.endpoints, (2e9, 1e9)):
+        endpoint.ejected_until = until
+    assert pool.acquire().url == "http://b/v1"
+
+
+def test_ai_service_fails_over_to_healthy_replica(completion_server):
+    dead = "http://127.0.0.1:9/v1"
+    service = AIService(AIConfig(base_url="", model="m", api_key="k", base_urls=[dead, completion_server.url],
+                                 retry_backoff_base=0.01, endpoint_eject_after=1, circuit_breaker_threshold=0))
+    results = [service.generate(f"问题{n}") for n in range(4)]
+    assert all(result["success"] for result in results)
+    endpoints = {e["url"]: e for e in service.get_endpoint_stats()["endpoints"]}
+    assert endpoints[dead]["ejected"] and endpoints[dead]["requests"] == 1
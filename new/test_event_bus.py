@@ -0,0 +1,55 @@
+"""
+事件总线测试
+"""
+import threading
+
+from infrastructure.event_bus import EventBus
+
+
+def test_subscribers_receive_events_in_order():
+    bus = EventBus()
+    subscription = bus.subscribe()
+    bus.publish("a", {"n": 1})
+    bus.publish("b", {"n": 2})
+    first, second = subscription.get(timeout=1), subscription.get(timeout=1)
+    assert (first["seq"], first["type"], second["seq"], second["type"]) == (1, "a", 2, "b")
+    assert subscription.get(timeout=0.01) is None
+    assert bus.get_last_seq() == 2
+
+
+def test_reconnect_replays_events_after_last_seq():
+    bus = EventBus()
+    for n in range(5):
+        bus.publish("e", {"n": n})
+    subscription = bus.subscribe(last_seq=3)
+    assert [subscription.get(timeout=1)["seq"] for _ in range(2)] == [4, 5]
+    assert subscription.get(timeout=0.01) is None
+
+
+def test_reconnect_beyond_history_requires_resync():
+    bus = EventBus(history_size=2)
+    for n in range(5):
+        bus.publish("e", {"n": n})
+    subscription = bus.subscribe(last_seq=1)
+    assert subscription.get(timeout=1)["type"] == "resync"
+    assert subscription.get(timeout=0.01) is None
+
+
+def test_slow_subscriber_overflow_is_replaced_by_resync():
+    bus = EventBus(max_pending=3)
+    subscription = bus.subscribe()
+    for n in range(4):
+        bus.publish("e", {"n": n})
+    assert subscription.get(timeout=1)["type"] == "resync"
+    assert subscription.get(timeout=0.01) is None
+
+
+def test_get_wakes_on_publish_and_closed_subscription_stops_receiving():
+    bus = EventBus()
+    subscription = bus.subscribe()
+    timer = threading.Timer(0.05, bus.publish, ("late", {}))
+    timer.start()
+    assert subscription.get(timeout=2)["type"] == "late"
+    subscription.close()
+    bus.publish("after_close", {})
+    assert subscription.get(timeout=0.01) is None
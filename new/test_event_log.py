@@ -0,0 +1,138 @@
+"""
+事件日志状态存储后端测试
+"""
+import pytest
+
+from domain.consensus import Consensus
+from domain.discussion import Discussion
+from domain.plan import Plan
+from domain.task import Task
+from domain.team import Team
+from infrastructure.event_log import EventLogStateBackend
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    return str(tmp_path / "events")
+
+
+def _backend(directory, **kwargs):
+    kwargs.setdefault("flush_interval", 60)
+    kwargs.setdefault("snapshot_every", None)
+    return EventLogStateBackend(directory, **kwargs)
+
+
+def _plan():
+    plan = Plan(id="p", goal="目标", consensus=Consensus(content="共识", discussion_id="d"))
+    for task_id in ("a", "b"):
+        task = Task(id=task_id, description=f"任务{task_id}")
+        task.assign_to("alice", "Alice")
+        plan.add_task(task)
+    return plan
+
+
+def _plan_state(plan):
+    return EventLogStateBackend._plan_state(plan)
+
+
+def _reopen(backend, directory):
+    backend.close()
+    return _backend(directory)
+
+
+def test_out_of_order_task_events_are_replayed(log_dir):
+    backend = _backend(log_dir)
+    plan = _plan()
+    backend.save_plan("s", plan)
+
+    # 两个线程并发修改不同任务：版本号较小的a的事件晚于b的事件追加
+    events = []
+    plan.set_event_listener(lambda event_type, data: events.append((event_type, data)))
+    plan.get_task("a").set_result("结果a")
+    plan.get_task("b").set_result("结果b")
+    plan.set_event_listener(None)
+    for event_type, data in reversed(events):
+        backend._append("plan", plan.id, event_type, data)
+
+    loaded = backend.load_plan("p")
+    assert [task.result for task in loaded.tasks] == ["结果a", "结果b"]
+    assert _plan_state(loaded) == _plan_state(plan)
+
+    reopened = _reopen(backend, log_dir)
+    assert _plan_state(reopened.load_plan("p")) == _plan_state(plan)
+    reopened.close()
+
+
+def test_changes_included_in_first_save_are_not_applied_twice(log_dir):
+    backend = _backend(log_dir)
+    plan = _plan()
+    task = plan.get_task("a")
+    task.update_progress(50)
+    backend.save_plan("s", plan)
+    # 保存之前的变化事件（已包含在完整状态中）
+    backend._append("plan", plan.id, "task.update_progress", {"task_id": "a", "progress": 10, "version": 1})
+    assert backend.load_plan("p").get_task("a").progress == 50
+    backend.close()
+
+
+def test_replayed_state_matches_live_objects(log_dir):
+    backend = _backend(log_dir)
+    backend.save_team("s", Team(id="t", name="团队"))
+    discussion = Discussion(id="d", topic="主题", max_rounds=3)
+    discussion.add_message("a1", "Alice", "保存前的消息")
+    backend.save_discussion("s", discussion)
+    plan = _plan()
+    backend.save_plan("s", plan)
+    backend.set_current("s", "plan", "p")
+
+    discussion.add_message("a1", "Alice", "第一轮")
+    streaming = discussion.start_message("a2", "Bob")
+    discussion.append_to_message(streaming, "片段")
+    discussion.finish_message(streaming, "完整的回复")
+    discarded = discussion.start_message("a1", "Alice")
+    discussion.discard_message(discarded)
+    discussion.start_new_round()
+    discussion.record_tokens(30)
+    discussion.reach_consensus("共识")
+    plan.add_task(Task(id="c", description="任务c", depends_on=["a"]))
+    plan.get_task("c").update_progress(40)
+    plan.get_task("a").complete()
+    plan.update_goal("新的目标")
+
+    reopened = _reopen(backend, log_dir)
+    loaded = reopened.load_discussion("d")
+    assert loaded.to_dict() == discussion.to_dict()
+    assert loaded.tokens_used == discussion.tokens_used
+    assert _plan_state(reopened.load_plan("p")) == _plan_state(plan)
+    assert reopened.load_team("t").name == "团队"
+    assert reopened.load_current("s") == {"plan": "p"}
+    assert reopened.list_ids("s", "discussion") == ["d"]
+    reopened.close()
+
+
+def test_snapshot_and_later_events_are_recovered(log_dir):
+    backend = _backend(log_dir)
+    plan = _plan()
+    backend.save_plan("s", plan)
+    plan.get_task("a").set_result("快照前的结果")
+    backend.compact()
+    plan.get_task("b").set_result("快照后的结果")
+    plan.get_task("a").update_progress(80)
+
+    assert [event["type"] for event in backend.read_events()] == ["task.set_result", "task.update_progress"]
+    reopened = _reopen(backend, log_dir)
+    assert reopened.get_stats()["replayed"] == 2
+    assert _plan_state(reopened.load_plan("p")) == _plan_state(plan)
+    reopened.close()
+
+
+def test_loaded_objects_keep_logging_changes(log_dir):
+    backend = _backend(log_dir)
+    backend.save_discussion("s", Discussion(id="d", topic="主题", max_rounds=3))
+    reopened = _reopen(backend, log_dir)
+    loaded = reopened.load_discussion("d")
+    loaded.add_message("a1", "Alice", "重启后的消息")
+
+    again = _reopen(reopened, log_dir)
+    assert [message.content for message in again.load_discussion("d").messages] == ["重启后的消息"]
+    again.close()
@@ -0,0 +1,86 @@
+"""
+作业队列测试
+"""
+import threading
+
+from application.job_queue import JobQueue
+
+
+def _blocking_job(started, release, log=None, name=None):
+    def run(job):
+        started.set()
+        release.wait(5)
+        if log is not None:
+            log.append(name)
+        return name
+    return run
+
+
+def test_job_result_and_failure():
+    job_queue = JobQueue(max_workers=1)
+    ok = job_queue.submit(lambda job: 42)
+    failed = job_queue.submit(lambda job: 1 / 0)
+    assert ok.wait(5) and failed.wait(5)
+    assert (ok.status, ok.result) == ("succeeded", 42)
+    assert failed.status == "failed" and "division" in failed.error
+
+
+def test_full_queue_rejects_new_jobs():
+    job_queue = JobQueue(max_workers=1, max_queue_depth=1)
+    started, release = threading.Event(), threading.Event()
+    running = job_queue.submit(_blocking_job(started, release))
+    assert started.wait(5)
+    assert job_queue.submit(lambda job: None) is not None
+    assert job_queue.submit(lambda job: None) is None
+    release.set()
+    assert running.wait(5)
+
+
+def test_cancel_queued_job_skips_it():
+    job_queue = JobQueue(max_workers=1)
+    started, release = threading.Event(), threading.Event()
+    running = job_queue.submit(_blocking_job(started, release))
+    assert started.wait(5)
+    calls = []
+    queued = job_queue.submit(lambda job: calls.append(1))
+    assert job_queue.cancel(queued.id).status == "cancelled"
+    release.set()
+    assert running.wait(5) and queued.wait(5)
+    job_queue._queue.join()
+    assert calls == []
+
+
+def test_same_key_jobs_run_one_at_a_time_without_blocking_other_keys():
+    job_queue = JobQueue(max_workers=2)
+    log = []
+    first_started, release_first = threading.Event(), threading.Event()
+    first = job_queue.submit(_blocking_job(first_started, release_first, log, "a1"), serial_key="a")
+    assert first_started.wait(5)
+    second = job_queue.submit(lambda job: log.append("a2"), serial_key="a")
+
+    # 等待中的a2不占用工作线程，其他会话的作业照常执行
+    other = job_queue.submit(lambda job: log.append("b1"), serial_key="b")
+    assert other.wait(5)
+    assert second.status == "queued" and job_queue.get_stats()["held"] == 1
+
+    release_first.set()
+    assert first.wait(5) and second.wait(5)
+    assert log == ["b1", "a1", "a2"]
+    assert job_queue.get_stats()["held"] == 0
+
+
+def test_held_jobs_count_toward_queue_depth_and_can_be_cancelled():
+    job_queue = JobQueue(max_workers=1, max_queue_depth=1)
+    started, release = threading.Event(), threading.Event()
+    running = job_queue.submit(_blocking_job(started, release), serial_key="a")
+    assert started.wait(5)
+    held = job_queue.submit(lambda job: "不应执行", serial_key="a")
+    assert job_queue.submit(lambda job: None, serial_key="b") is None
+
+    job_queue.cancel(held.id)
+    release.set()
+    assert running.wait(5)
+    # 取消的等待作业被丢弃，该键释放后新作业可直接派发
+    after = job_queue.submit(lambda job: "ok", serial_key="a")
+    assert after.wait(5) and after.result == "ok"
+    assert held.status == "cancelled" and held.result is None
@@ -0,0 +1,181 @@
+"""
+微批合并测试
+"""
+import asyncio
+import threading
+
+import pytest
+
+from infrastructure.ai_service import AIConfig, AIService
+from infrastructure.micro_batch import MicroBatcher
+
+
+def _submit_concurrently(batcher, items, run_batch, key="key"):
+    results = {}
+    threads = [
+        threading.Thread(target=lambda item=item: results.__setitem__(item, batcher.submit(key, item, run_batch)))
+        for item in items
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_max_batch_size_must_be_positive():
+    with pytest.raises(ValueError):
+        MicroBatcher(0.01, max_batch_size=0)
+
+
+def test_calls_within_window_share_one_batch():
+    batcher = MicroBatcher(window=0.2, max_batch_size=4)
+    batches = []
+
+    def run_batch(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    results = _submit_concurrently(batcher, [1, 2, 3, 4], run_batch)
+    assert results == {1: 10, 2: 20, 3: 30, 4: 40}
+    assert len(batches) == 1 and sorted(batches[0]) == [1, 2, 3, 4]
+    stats = batcher.get_stats()
+    assert (stats["batches"], stats["items"], stats["max_batch_size"], stats["avg_batch_size"]) == (1, 4, 4, 4)
+
+
+def test_full_batch_closes_early_and_overflow_starts_new_batch():
+    batcher = MicroBatcher(window=0.2, max_batch_size=2)
+    batches = []
+
+    def run_batch(items):
+        batches.append(len(items))
+        return list(items)
+
+    results = _submit_concurrently(batcher, [1, 2, 3], run_batch)
+    assert results == {1: 1, 2: 2, 3: 3}
+    assert sorted(batches) == [1, 2]
+
+
+def test_different_keys_are_not_merged():
+    batcher = MicroBatcher(window=0.01)
+    assert batcher.submit("a", 1, lambda items: ["a"] * len(items)) == "a"
+    assert batcher.submit("b", 1, lambda items: ["b"] * len(items)) == "b"
+    assert batcher.get_stats()["batches"] == 2
+
+
+def test_batch_error_is_delivered_to_every_caller():
+    batcher = MicroBatcher(window=0.01)
+
+    def fail(items):
+        raise RuntimeError("批量调用失败")
+
+    with pytest.raises(RuntimeError):
+        batcher.submit("key", 1, fail)
+
+
+def test_async_calls_are_batched_and_cancelled_caller_does_not_break_batch():
+    batcher = MicroBatcher(window=0.05)
+    batches = []
+
+    async def run_batch(items):
+        batches.append(list(items))
+        return [item + 1 for item in items]
+
+    async def run():
+        leader = asyncio.ensure_future(batcher.submit_async("key", 1, run_batch))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(batcher.submit_async("key", 2, run_batch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == 3
+    assert batches == [[1, 2]]
+
+
+def test_batching_is_off_by_default():
+    assert AIService(AIConfig(base_url="http://stub/v1", model="m", api_key="k")).batcher is None
+
+
+def test_ai_service_merges_concurrent_prompts(completion_server):
+    service = AIService(AIConfig(base_url=completion_server.url, model="m", api_key="k", batch_window=0.2))
+    results = {}
+    threads = [
+        threading.Thread(target=lambda n=n: results.__setitem__(n, service.generate(f"任务{n}")))
+        for n in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(completion_server.requests) == 1
+    assert sorted(completion_server.requests[0]["prompt"]) == ["任务0", "任务1", "任务2"]
+    assert {n: result["text"] for n, result in results.items()} == {n: f"echo:任务{n}" for n in range(3)}
+    assert service.get_batching_stats()["batches"] == 1
+
+
+class _NoBatchEndpoint:
+    """拒绝多提示词请求的桩端点，记录意见生成调用的并发数"""
+
+    def __init__(self, stub_ai):
+        self.stub_ai = stub_ai
+        self.batches = 0
+        self.active = 0
+        self.peak = 0
+
+    async def generate(self, prompt, **kwargs):
+        if "发表你对以下主题的专业意见" not in prompt:
+            return await self.stub_ai.generate(prompt, **kwargs)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return await self.stub_ai.generate(prompt, **kwargs)
+
+    async def generate_batch(self, prompts, **kwargs):
+        self.batches += 1
+        raise RuntimeError("端点不接受多提示词请求")
+
+    def __getattr__(self, name):
+        return getattr(self.stub_ai, name)
+
+
+def _run_parallel_discussion(service, speculative=False):
+    from application.round_policy import FixedRoundPolicy
+    from application.workflow_engine import WorkflowEngine
+    from domain.agent import Agent
+    from domain.discussion import Discussion
+
+    engine = WorkflowEngine(None, service, parallel_rounds=True, max_round_concurrency=2,
+                            speculative_rounds=speculative, precheck_consensus=False,
+                            round_policy=FixedRoundPolicy(check_from_round=1))
+    agents = [Agent(id=f"a{n}", name=f"成员{n}", role="工程师") for n in range(4)]
+    discussion = Discussion(id="d", topic="主题", max_rounds=2)
+    asyncio.run(engine.arun_discussion_with_callback(discussion, agents))
+    return discussion
+
+
+@pytest.mark.parametrize("speculative", [False, True])
+def test_parallel_rounds_call_per_prompt_when_batching_is_off(stub_ai, speculative):
+    stub_ai.sync.reply = lambda prompt: "未达成共识" if "判断是否达成共识" in prompt else "意见"
+    endpoint = _NoBatchEndpoint(stub_ai)
+    discussion = _run_parallel_discussion(endpoint, speculative)
+    assert endpoint.batches == 0 and endpoint.peak == 2
+    assert [(msg.agent_name, msg.round) for msg in discussion.messages] == [
+        (f"成员{n}", round_number) for round_number in (1, 2) for n in range(4)
+    ]
+
+
+def test_parallel_rounds_batch_when_batching_is_on(stub_ai):
+    stub_ai.sync.reply = lambda prompt: "未达成共识" if "判断是否达成共识" in prompt else "意见"
+    stub_ai.config.batch_window = 0.01
+    batches = []
+    generate_batch = stub_ai.generate_batch
+
+    async def record_batch(prompts, **kwargs):
+        batches.append(len(prompts))
+        return await generate_batch(prompts, **kwargs)
+
+    stub_ai.generate_batch = record_batch
+    discussion = _run_parallel_discussion(stub_ai)
+    assert batches == [4, 4] and len(discussion.messages) == 8
@@ -0,0 +1,64 @@
+"""
+调用点模型配置测试
+"""
+import pytest
+
+from application.team_orchestrator import TeamOrchestrator
+from application.workflow_engine import WorkflowEngine
+from infrastructure.ai_service import AIConfig, AIService, ModelProfile
+
+
+def _config(base_url, **kwargs):
+    return AIConfig(base_url=base_url, model="default-model", api_key="k", max_tokens=2000, temperature=0.7, **kwargs)
+
+
+def test_base_urls_require_model():
+    with pytest.raises(ValueError):
+        ModelProfile(base_urls=["http://a/v1"])
+
+
+def test_profile_fields_override_config():
+    service = AIService(_config("http://stub/v1"))
+    payload = service._build_payload("问题", None, ModelProfile(model="small", max_tokens=300, temperature=0.0))
+    assert (payload["model"], payload["max_tokens"], payload["temperature"]) == ("small", 300, 0.0)
+
+    payload = service._build_payload("问题", 50, ModelProfile(max_tokens=300))
+    assert (payload["model"], payload["max_tokens"], payload["temperature"]) == ("default-model", 50, 0.7)
+    assert service._build_payload("问题", None, None)["max_tokens"] == 2000
+
+
+def test_profile_with_base_urls_uses_its_own_endpoints(completion_server):
+    service = AIService(_config("http://127.0.0.1:9/v1", max_retries=0))
+    result = service.generate("问题", profile=ModelProfile(model="small", base_urls=[completion_server.url]))
+    assert result["success"]
+    assert completion_server.requests[0]["model"] == "small"
+    models = service.get_endpoint_stats()["models"]
+    assert models["small"]["endpoints"][0]["url"] == completion_server.url
+
+
+def test_cached_results_are_separated_by_profile(completion_server):
+    service = AIService(_config(completion_server.url, cache_enabled=True, cache_nonzero_temperature=True))
+    service.generate("问题")
+    service.generate("问题", profile=ModelProfile(max_tokens=100))
+    service.generate("问题")
+    assert [request["max_tokens"] for request in completion_server.requests] == [2000, 100]
+
+
+def test_user_profiles_are_merged_with_defaults(stub_ai):
+    engine = WorkflowEngine(None, stub_ai, model_profiles={"opinion": ModelProfile(model="big")})
+    assert engine.model_profiles["opinion"].model == "big"
+    assert engine.model_profiles["consensus_check"].max_tokens == 500
+
+    orchestrator = TeamOrchestrator(ai_service=stub_ai.sync, async_ai_service=stub_ai,
+                                    model_profiles={"result_digest": ModelProfile(max_tokens=100)})
+    assert orchestrator.model_profiles["result_digest"].max_tokens == 100
+    assert orchestrator.model_profiles["recommend_roles"].max_tokens == 300
+
+
+def test_task_fingerprint_follows_task_execution_profile(stub_ai):
+    orchestrator = TeamOrchestrator(ai_service=stub_ai.sync, async_ai_service=stub_ai)
+    fingerprint = orchestrator._fingerprint("提示词", "task_execution")
+    assert orchestrator._fingerprint("提示词", "task_execution") == fingerprint
+
+    orchestrator.model_profiles["task_execution"] = ModelProfile(model="other")
+    assert orchestrator._fingerprint("提示词", "task_execution") != fingerprint
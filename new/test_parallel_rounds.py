@@ -0,0 +1,94 @@
+"""
+并行轮次模式测试
+"""
+import asyncio
+import re
+
+import pytest
+
+from application.round_policy import FixedRoundPolicy
+from application.workflow_engine import WorkflowEngine
+from domain.agent import Agent
+from domain.discussion import Discussion
+
+OPINION_MARKER = "发表你对以下主题的专业意见"
+
+
+def _agents(count=4):
+    return [Agent(id=f"a{n}", name=f"成员{n}", role="工程师") for n in range(count)]
+
+
+def _speaker(prompt):
+    return re.search(r"作为 (\S+?)（", prompt).group(1)
+
+
+def _round(prompt):
+    return int(re.search(r"当前轮次：第 (\d+) 轮", prompt).group(1))
+
+
+def _reply(prompt):
+    if OPINION_MARKER in prompt:
+        return f"{_speaker(prompt)}第{_round(prompt)}轮意见"
+    return "未达成共识"
+
+
+def _run(stub_ai, parallel=True, max_round_concurrency=4, stream_callback=None, max_rounds=2):
+    engine = WorkflowEngine(None, stub_ai, parallel_rounds=parallel, max_round_concurrency=max_round_concurrency,
+                            precheck_consensus=False, summary_memory=False,
+                            round_policy=FixedRoundPolicy(check_from_round=1))
+    discussion = Discussion(id="d", topic="主题", max_rounds=max_rounds)
+    asyncio.run(engine.arun_discussion_with_callback(discussion, _agents(), stream_callback=stream_callback))
+    return discussion
+
+
+def _opinion_prompts(stub_ai, round_number):
+    return [prompt for prompt in stub_ai.sync.prompts() if OPINION_MARKER in prompt and _round(prompt) == round_number]
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_message_order_follows_agent_order(stub_ai, stream):
+    stub_ai.sync.reply = _reply
+    # 排在前面的Agent生成得最慢，完成顺序与Agent顺序相反
+    stub_ai.delay = lambda prompt: (4 - int(_speaker(prompt)[-1])) * 0.02 if OPINION_MARKER in prompt else 0
+    discussion = _run(stub_ai, stream_callback=(lambda d, message, delta: None) if stream else None)
+    assert [(msg.agent_name, msg.content) for msg in discussion.messages] == [
+        (f"成员{n}", f"成员{n}第{round_number}轮意见") for round_number in (1, 2) for n in range(4)
+    ]
+
+
+def test_stream_concurrency_is_limited(stub_ai):
+    stub_ai.sync.reply = _reply
+    active = []
+    peak = []
+    generate_stream = stub_ai.generate_stream
+
+    async def counting_stream(prompt, on_delta, **kwargs):
+        active.append(prompt)
+        peak.append(len(active))
+        await asyncio.sleep(0.02)
+        active.remove(prompt)
+        return await generate_stream(prompt, on_delta, **kwargs)
+
+    stub_ai.generate_stream = counting_stream
+    deltas = []
+    discussion = _run(stub_ai, max_round_concurrency=2,
+                      stream_callback=lambda d, message, delta: deltas.append(message.agent_name))
+    assert max(peak) == 2 and len(peak) == 8
+    assert len(discussion.messages) == 8 and set(deltas) == {f"成员{n}" for n in range(4)}
+
+
+def test_agents_share_pre_round_context(stub_ai):
+    stub_ai.sync.reply = _reply
+    _run(stub_ai)
+    prompts = _opinion_prompts(stub_ai, 2)
+    assert sorted(_speaker(prompt) for prompt in prompts) == [f"成员{n}" for n in range(4)]
+    # 除Agent身份外提示词完全相同，且不包含同一轮其他Agent的意见
+    assert len({prompt.replace(f"作为 {_speaker(prompt)}", "") for prompt in prompts}) == 1
+    assert all("第1轮意见" in prompt and "第2轮意见" not in prompt for prompt in prompts)
+
+
+def test_sequential_rounds_see_earlier_opinions_of_same_round(stub_ai):
+    stub_ai.sync.reply = _reply
+    _run(stub_ai, parallel=False)
+    prompts = _opinion_prompts(stub_ai, 2)
+    assert "第2轮意见" not in prompts[0] and "成员0第2轮意见" in prompts[1]
@@ -0,0 +1,106 @@
+"""
+重试退避、对冲请求与熔断器测试
+"""
+import threading
+import time
+
+from infrastructure.ai_service import AIConfig, AIService
+from infrastructure.resilience import CircuitBreaker, LatencyTracker, backoff_delay
+
+
+def _service(completion_server, **kwargs):
+    kwargs.setdefault("retry_backoff_base", 0.01)
+    return AIService(AIConfig(base_url=completion_server.url, model="m", api_key="k", **kwargs))
+
+
+def test_backoff_delay_is_capped_full_jitter():
+    delays = [backoff_delay(retry, 0.5, 2.0) for retry in range(6) for _ in range(20)]
+    assert all(0 <= delay <= 2.0 for delay in delays)
+    assert all(0 <= backoff_delay(0, 0.5, 8.0) <= 0.5 for _ in range(20))
+
+
+def test_latency_percentile():
+    tracker = LatencyTracker(window=3)
+    assert tracker.percentile(95) is None
+    for latency in (5.0, 1.0, 2.0, 3.0):
+        tracker.record(latency)
+    assert tracker.count() == 3
+    assert (tracker.percentile(0), tracker.percentile(50), tracker.percentile(100)) == (1.0, 2.0, 3.0)
+
+
+def test_circuit_breaker_state_transitions():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow() and breaker.get_stats()["state"] == "closed"
+    breaker.record_failure()
+    assert breaker.get_stats()["state"] == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()          # 半开：放行一次试探
+    assert not breaker.allow()
+    breaker.record_failure()        # 试探失败，重新断开
+    assert breaker.get_stats()["state"] == "open"
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_ignored()        # 不影响状态的结果结束试探，下一次可再试探
+    assert breaker.allow()
+    breaker.record_success()
+    stats = breaker.get_stats()
+    assert (stats["state"], stats["consecutive_failures"], stats["times_opened"]) == ("closed", 0, 2)
+    assert stats["rejected"] == 2
+
+
+def test_transient_errors_are_retried(completion_server):
+    statuses = [503, 429]
+    completion_server.responder = lambda payload: (
+        (statuses.pop(0), {}) if statuses else (200, {"choices": [{"text": "好"}], "usage": {"total_tokens": 1}})
+    )
+    service = _service(completion_server)
+    result = service.generate("问题")
+    assert result["success"] and result["text"] == "好"
+    assert len(completion_server.requests) == 3
+    stats = service.get_resilience_stats()
+    assert (stats["retries"], stats["attempts"], stats["attempt_failures"]) == (2, 3, 2)
+
+
+def test_client_errors_and_exhausted_retries_fail(completion_server):
+    completion_server.responder = lambda payload: (400, {})
+    service = _service(completion_server)
+    assert not service.generate("问题")["success"]
+    assert len(completion_server.requests) == 1
+
+    completion_server.responder = lambda payload: (500, {})
+    assert not service.generate("另一个问题")["success"]
+    assert len(completion_server.requests) == 1 + 3  # 首次加2次重试
+
+
+def test_circuit_opens_after_consecutive_failures(completion_server):
+    completion_server.responder = lambda payload: (503, {})
+    service = _service(completion_server, max_retries=0, circuit_breaker_threshold=2, circuit_breaker_reset=60)
+    for prompt in ("一", "二"):
+        assert not service.generate(prompt)["success"]
+    result = service.generate("三")
+    assert result["circuit_open"] is True
+    assert len(completion_server.requests) == 2
+    assert service.get_resilience_stats()["circuit_rejected"] == 1
+
+
+def test_slow_request_is_hedged(completion_server):
+    first = threading.Event()
+
+    def slow_first(payload):
+        if not first.is_set():
+            first.set()
+            time.sleep(0.5)
+            return 200, {"choices": [{"text": "慢"}], "usage": {"total_tokens": 1}}
+        return 200, {"choices": [{"text": "快"}], "usage": {"total_tokens": 1}}
+
+    completion_server.responder = slow_first
+    service = _service(completion_server, hedge_requests=True, hedge_after=0.05)
+    started = time.monotonic()
+    result = service.generate("问题")
+    assert result["text"] == "快" and time.monotonic() - started < 0.4
+    stats = service.get_resilience_stats()
+    assert (stats["hedges"], stats["hedge_wins"]) == (1, 1)
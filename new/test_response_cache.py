@@ -0,0 +1,88 @@
+"""
+响应缓存测试
+"""
+import time
+
+from infrastructure.ai_service import AIConfig, AIService
+from infrastructure.response_cache import ResponseCache
+
+
+def test_hit_and_miss():
+    cache = ResponseCache()
+    key = ResponseCache.make_key("m", "提示词", 100, 0)
+    assert cache.get(key) is None
+    cache.set(key, {"text": "回复", "tokens": 3})
+    assert cache.get(key) == {"text": "回复", "tokens": 3}
+    stats = cache.get_stats()
+    assert (stats["memory_hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+
+
+def test_key_covers_all_parameters():
+    base = ResponseCache.make_key("m", "p", 100, 0)
+    assert base == ResponseCache.make_key("m", "p", 100, 0)
+    assert len({base, ResponseCache.make_key("m2", "p", 100, 0), ResponseCache.make_key("m", "p2", 100, 0),
+                ResponseCache.make_key("m", "p", 200, 0), ResponseCache.make_key("m", "p", 100, 0.5)}) == 5
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", {"text": "1"})
+    cache.set("b", {"text": "2"})
+    cache.get("a")
+    cache.set("c", {"text": "3"})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+
+    cache = ResponseCache(max_bytes=10)
+    cache.set("a", {"text": "x" * 6})
+    cache.set("b", {"text": "y" * 6})
+    assert cache.get("a") is None and cache.get("b") is not None
+    cache.set("huge", {"text": "z" * 11})
+    assert cache.get("huge") is None
+    assert cache.get_stats()["memory_bytes"] == 6
+
+
+def test_ttl_expiry():
+    cache = ResponseCache(ttl=0.05)
+    cache.set("a", {"text": "1"})
+    assert cache.get("a") is not None
+    time.sleep(0.1)
+    assert cache.get("a") is None
+
+
+def test_disk_layer_survives_new_instance(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ResponseCache(disk_path=path).set("a", {"text": "持久化"})
+    cache = ResponseCache(disk_path=path)
+    assert cache.get("a") == {"text": "持久化"}
+    assert cache.get("a") == {"text": "持久化"}
+    stats = cache.get_stats()
+    assert (stats["disk_hits"], stats["memory_hits"]) == (1, 1)
+
+
+def test_disk_layer_eviction(tmp_path):
+    cache = ResponseCache(max_entries=1, disk_path=str(tmp_path / "cache.db"), disk_max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.set(key, {"text": key})
+    assert cache.get("a") is None
+    assert cache.get("b") is not None and cache.get("c") is not None
+
+
+def test_ai_service_serves_repeated_call_from_cache(completion_server):
+    service = AIService(AIConfig(base_url=completion_server.url, model="m", api_key="k", temperature=0,
+                                 cache_enabled=True))
+    first = service.generate("同一个问题")
+    second = service.generate("同一个问题")
+    assert first["text"] == second["text"] == "echo:同一个问题"
+    assert second["cached"] and second["tokens"] == 0
+    assert len(completion_server.requests) == 1
+    assert service.get_total_tokens() == 5
+
+
+def test_nonzero_temperature_bypasses_cache(completion_server):
+    service = AIService(AIConfig(base_url=completion_server.url, model="m", api_key="k", temperature=0.7,
+                                 cache_enabled=True))
+    service.generate("问题")
+    service.generate("问题")
+    assert len(completion_server.requests) == 2
+    assert service.get_cache_stats()["bypassed"] == 2
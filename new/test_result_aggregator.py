@@ -0,0 +1,94 @@
+"""
+分层结果汇总测试
+"""
+import asyncio
+
+import pytest
+
+from application.result_aggregator import ResultAggregator
+
+
+class _Model:
+    """记录压缩、合并调用的桩"""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.digests = []
+        self.merges = []
+
+    async def digest(self, text):
+        self.digests.append(text)
+        await asyncio.sleep(0)
+        return None if self.fail else f"d({text[:3]})"
+
+    async def merge(self, texts):
+        self.merges.append(list(texts))
+        await asyncio.sleep(0)
+        return None if self.fail else "m[" + ",".join(texts) + "]"
+
+
+def _aggregate(texts, model, **kwargs):
+    async def run():
+        aggregator = ResultAggregator(model.digest, model.merge, **kwargs)
+        for text in texts:
+            aggregator.add(text)
+        return await aggregator.reduce(), aggregator.calls
+    return asyncio.run(run())
+
+
+def test_fan_in_must_be_at_least_two():
+    with pytest.raises(ValueError):
+        ResultAggregator(_Model().digest, _Model().merge, fan_in=1)
+
+
+def test_short_results_are_used_verbatim():
+    model = _Model()
+    digests, calls = _aggregate(["短1", "短2", "短3"], model, fan_in=4)
+    assert digests == ["短1", "短2", "短3"]
+    assert calls == 0 and model.digests == [] and model.merges == []
+
+
+def test_long_results_are_digested():
+    model = _Model()
+    digests, calls = _aggregate(["长" * 50, "短"], model, fan_in=4, digest_threshold=10)
+    assert sorted(digests) == ["d(长长长)", "短"]
+    assert calls == 1
+
+
+def test_full_levels_are_merged_until_fan_in_remains():
+    model = _Model()
+    texts = [f"t{n}" for n in range(9)]
+    digests, calls = _aggregate(texts, model, fan_in=2)
+    assert len(digests) <= 2
+    # 每条原始结果恰好出现在最终摘要中一次
+    joined = "".join(digests)
+    assert all(joined.count(text) == 1 for text in texts)
+    assert calls == len(model.merges) and all(len(group) <= 2 for group in model.merges)
+
+
+def test_failed_calls_fall_back_to_input():
+    model = _Model(fail=True)
+    digests, _ = _aggregate(["长" * 50, "a", "b"], model, fan_in=2, digest_threshold=10)
+    joined = "\n".join(digests)
+    # 压缩失败退回截断的原文，合并失败退回拼接的输入
+    assert "长" * 10 in joined and "长" * 11 not in joined
+    assert "a" in joined and "b" in joined and len(digests) <= 2
+
+
+def test_cancel_stops_pending_work():
+    started = []
+
+    async def slow_digest(text):
+        started.append(text)
+        await asyncio.sleep(5)
+        return "不会返回"
+
+    async def run():
+        aggregator = ResultAggregator(slow_digest, _Model().merge, digest_threshold=1)
+        aggregator.add("需要压缩")
+        await asyncio.sleep(0)
+        aggregator.cancel()
+        await asyncio.sleep(0)
+        return aggregator._pending
+
+    assert asyncio.run(run()) == set() and started == ["需要压缩"]
@@ -0,0 +1,100 @@
+"""
+重新执行计划时的结果复用测试
+"""
+import asyncio
+import re
+
+from application.team_orchestrator import TeamOrchestrator
+from domain.consensus import Consensus
+from domain.plan import Plan
+from domain.task import Task
+from infrastructure.ai_service import ModelProfile
+
+TASK_PROMPT = re.compile(r"请完成以下任务：(.*?)。")
+
+
+def _reply(prompt):
+    match = TASK_PROMPT.search(prompt)
+    if match:
+        return f"{match.group(1)}的结果"
+    return "摘要或反馈"
+
+
+def _orchestrator(stub_ai):
+    stub_ai.sync.reply = _reply
+    orchestrator = TeamOrchestrator(ai_service=stub_ai.sync, async_ai_service=stub_ai)
+    plan = Plan(id="p", goal="目标", consensus=Consensus(content="共识", discussion_id="d"))
+    for task_id, depends_on in (("a", []), ("b", ["a"]), ("c", [])):
+        task = Task(id=task_id, description=f"任务{task_id}", depends_on=depends_on)
+        task.assign_to("alice", "Alice")
+        plan.add_task(task)
+    orchestrator.state_store.save_plan(plan)
+    assert orchestrator.execute_tasks(["a", "b", "c"])["success"]
+    stub_ai.sync.calls.clear()
+    return orchestrator, plan
+
+
+def _executed(stub_ai):
+    return sorted(TASK_PROMPT.search(prompt).group(1) for prompt in stub_ai.sync.prompts()
+                  if TASK_PROMPT.search(prompt))
+
+
+def _final_feedback_calls(stub_ai):
+    return [prompt for prompt in stub_ai.sync.prompts() if prompt.startswith("你是总agent")]
+
+
+def test_unchanged_plan_reuses_every_result(stub_ai):
+    orchestrator, plan = _orchestrator(stub_ai)
+    feedback = plan.final_feedback
+    result = orchestrator.reexecute_plan()
+    assert result["success"] and result["final_feedback"] == feedback
+    assert stub_ai.sync.calls == []
+    assert orchestrator.get_execution_status()["reused_tasks"] == 3
+
+
+def test_edited_task_and_changed_downstream_are_recomputed(stub_ai):
+    orchestrator, plan = _orchestrator(stub_ai)
+    orchestrator.update_task("a", "新的任务a", "Alice")
+    orchestrator.reexecute_plan()
+    # a的结果变化使依赖它的b重新执行，独立的c复用结果
+    assert _executed(stub_ai) == ["任务b", "新的任务a"]
+    assert plan.get_task("a").result == "新的任务a的结果"
+    assert len(_final_feedback_calls(stub_ai)) == 1
+
+
+def test_failed_task_is_retried_and_unchanged_result_stops_cascade(stub_ai):
+    orchestrator, plan = _orchestrator(stub_ai)
+    plan.get_task("a").set_result("任务执行失败")    # 失败的结果没有指纹
+    orchestrator.reexecute_plan()
+    # a重新执行后结果与之前相同，b的输入未变化，不再重新执行
+    assert _executed(stub_ai) == ["任务a"]
+    assert plan.get_task("a").result == "任务a的结果"
+
+
+def test_model_profile_change_invalidates_results(stub_ai):
+    orchestrator, plan = _orchestrator(stub_ai)
+    orchestrator.model_profiles["task_execution"] = ModelProfile(model="other-model")
+    orchestrator.reexecute_plan()
+    assert _executed(stub_ai) == ["任务a", "任务b", "任务c"]
+
+
+def test_changed_goal_only_recomputes_final_feedback(stub_ai):
+    orchestrator, plan = _orchestrator(stub_ai)
+    orchestrator.update_goal("新的目标")
+    orchestrator.reexecute_plan()
+    assert _executed(stub_ai) == []
+    assert [traffic for traffic, _ in stub_ai.sync.calls] == ["execution"]
+    assert len(_final_feedback_calls(stub_ai)) == 1
+
+
+def test_digest_memo_reuses_identical_inputs(stub_ai):
+    orchestrator, _ = _orchestrator(stub_ai)
+    orchestrator.DIGEST_MEMO_SIZE = 2
+    for text in ("结果一", "结果一", "结果二", "结果三", "结果一"):
+        assert asyncio.run(orchestrator._digest_result(text)) == "摘要或反馈"
+    # 结果一在容量为2的记忆中被淘汰后需要重新压缩
+    assert len(stub_ai.sync.calls) == 4
+
+    stub_ai.sync.reply = lambda prompt: None
+    assert asyncio.run(orchestrator._digest_result("失败的结果")) is None
+    assert len(orchestrator._digest_memo) == 2      # 失败的结果不记忆
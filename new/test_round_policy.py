@@ -0,0 +1,90 @@
+"""
+轮次策略测试
+"""
+import asyncio
+
+import pytest
+
+from application.round_policy import (
+    CHECK, CONTINUE, FORCE, AdaptiveRoundPolicy, FixedRoundPolicy, RoundDecision, RoundPolicy, RoundSignals
+)
+from application.workflow_engine import WorkflowEngine
+from domain.agent import Agent
+from domain.discussion import Discussion
+
+
+def _signals(round=1, max_rounds=3, novelty=None, similarity=None, elapsed=0.0, tokens_used=0):
+    return RoundSignals(round=round, max_rounds=max_rounds, novelty=novelty, similarity=similarity,
+                        elapsed=elapsed, tokens_used=tokens_used)
+
+
+def test_round_policy_is_abstract():
+    with pytest.raises(TypeError):
+        RoundPolicy()
+
+    class Incomplete(RoundPolicy):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_fixed_policy_checks_from_configured_round():
+    policy = FixedRoundPolicy(check_from_round=2)
+    assert policy.decide(_signals(round=1)).action == CONTINUE
+    assert policy.decide(_signals(round=2)).action == CHECK
+    assert policy.decide(_signals(round=3)).action == CHECK
+
+
+def test_adaptive_policy_decisions():
+    policy = AdaptiveRoundPolicy(check_from_round=3, early_check_similarity=0.5, novelty_floor=0.2)
+    assert policy.decide(_signals(round=1)).action == CONTINUE
+    assert policy.decide(_signals(round=1, similarity=0.6)).action == CHECK
+    assert policy.decide(_signals(round=2, novelty=0.1)).action == FORCE
+    assert policy.decide(_signals(round=3, novelty=0.5)).action == CHECK
+
+
+def test_adaptive_policy_forces_before_exceeding_budgets():
+    # 每轮平均消耗400 token，再进行一轮将超出1000的预算
+    tokens = AdaptiveRoundPolicy(token_budget=1000)
+    assert tokens.decide(_signals(round=2, tokens_used=800)).action == FORCE
+    assert tokens.decide(_signals(round=2, tokens_used=600)).action == CHECK
+    # 最后一轮不再因预算强制
+    assert tokens.decide(_signals(round=3, max_rounds=3, tokens_used=900)).action == CHECK
+
+    time_budget = AdaptiveRoundPolicy(time_budget=10)
+    decision = time_budget.decide(_signals(round=1, elapsed=6))
+    assert decision.action == FORCE and "时间" in decision.reason
+
+
+def test_decision_telemetry_includes_signals():
+    telemetry = RoundDecision(CHECK, "原因").to_dict(_signals(round=2, similarity=0.3))
+    assert telemetry["action"] == CHECK and telemetry["round"] == 2 and telemetry["similarity"] == 0.3
+
+
+class _ScriptedPolicy(RoundPolicy):
+    """按轮次返回预设的决定"""
+
+    def __init__(self, actions):
+        self.actions = actions
+        self.signals = []
+
+    def decide(self, signals):
+        self.signals.append(signals)
+        return RoundDecision(self.actions[signals.round - 1], "测试")
+
+
+def test_engine_follows_policy_and_records_decisions(stub_ai):
+    stub_ai.sync.reply = lambda prompt: "强制共识" if "团队已经讨论了" in prompt else "一些意见"
+    policy = _ScriptedPolicy([CONTINUE, FORCE, CHECK])
+    engine = WorkflowEngine(None, stub_ai, round_policy=policy, precheck_consensus=False, summary_memory=False)
+    discussion = Discussion(id="d", topic="主题", max_rounds=3)
+    agents = [Agent(id="a1", name="Alice", role="产品经理"), Agent(id="a2", name="Bob", role="工程师")]
+    asyncio.run(engine.arun_discussion_with_callback(discussion, agents))
+
+    # 第2轮策略决定强制达成共识，不再进行第3轮，也不调用共识判断
+    assert [signals.round for signals in policy.signals] == [1, 2]
+    assert policy.signals[1].novelty is not None and policy.signals[1].tokens_used > 0
+    assert not any("判断是否达成共识" in prompt for prompt in stub_ai.sync.prompts())
+    assert [decision["action"] for decision in discussion.round_decisions] == [CONTINUE, FORCE]
+    assert discussion.consensus == "强制共识"
@@ -0,0 +1,135 @@
+"""
+会话管理测试
+"""
+import threading
+import time
+
+import pytest
+
+from application.job_queue import JobQueue
+from application.session_manager import DEFAULT_SESSION_ID, InvalidSessionError, SessionLimitError, SessionManager
+from domain.team import Team
+from infrastructure.state_backend import SQLiteStateBackend
+
+
+def _manager(stub_ai, **kwargs):
+    return SessionManager(async_ai_service=stub_ai, **kwargs)
+
+
+def test_only_issued_session_ids_are_accepted(stub_ai):
+    manager = _manager(stub_ai, session_secret="secret")
+    session_id = manager.issue_session_id()
+    assert manager.get_or_create(session_id).id == session_id
+    assert manager.get_or_create(DEFAULT_SESSION_ID).id == DEFAULT_SESSION_ID
+
+    token = session_id.split(".")[0]
+    for forged in ("anything", token, f"{token}.{'0' * 32}", f".{session_id.split('.')[1]}"):
+        with pytest.raises(InvalidSessionError):
+            manager.get_or_create(forged)
+    # 相同密钥签发的ID在重启后仍然有效，不同密钥则无效
+    assert _manager(stub_ai, session_secret="secret").is_valid_session_id(session_id)
+    assert not _manager(stub_ai, session_secret="other").is_valid_session_id(session_id)
+
+
+def test_least_recently_used_idle_session_is_evicted(stub_ai):
+    manager = _manager(stub_ai, max_sessions=2)
+    first, second, third = (manager.issue_session_id() for _ in range(3))
+    manager.get_or_create(first)
+    manager.get_or_create(second)
+    manager.get_or_create(first)  # second成为最久未访问的会话
+    manager.get_or_create(third)
+    assert {session.id for session in manager.list_sessions()} == {first, third}
+
+
+def test_busy_sessions_are_not_evicted(stub_ai):
+    manager = _manager(stub_ai, max_sessions=1)
+    busy = manager.get_or_create(manager.issue_session_id())
+    with busy.lock:
+        with pytest.raises(SessionLimitError):
+            manager.get_or_create(manager.issue_session_id())
+    assert manager.get_or_create(manager.issue_session_id()).id != busy.id
+    assert [session.id for session in manager.list_sessions()] != [busy.id]
+
+
+def test_sessions_with_state_are_kept_without_backend(stub_ai, tmp_path):
+    manager = _manager(stub_ai, max_sessions=1)
+    manager.get_or_create(manager.issue_session_id()).orchestrator.state_store.save_team(Team(id="t", name="团队"))
+    with pytest.raises(SessionLimitError):
+        manager.get_or_create(manager.issue_session_id())
+
+    # 状态已持久化时可以回收，之后按会话ID从后端恢复
+    backend = SQLiteStateBackend(str(tmp_path / "state.db"))
+    manager = _manager(stub_ai, max_sessions=1, state_backend=backend)
+    first = manager.issue_session_id()
+    manager.get_or_create(first).orchestrator.state_store.save_team(Team(id="t", name="团队"))
+    manager.get_or_create(manager.issue_session_id())
+    assert manager.get_or_create(first).orchestrator.state_store.get_current_team().id == "t"
+    backend.close()
+
+
+def test_sessions_with_pending_jobs_or_subscribers_are_busy(stub_ai):
+    job_queue = JobQueue(max_workers=1)
+    manager = _manager(stub_ai, max_sessions=1, job_queue=job_queue)
+    session = manager.get_or_create(manager.issue_session_id())
+    release = threading.Event()
+    running = job_queue.submit(lambda job: release.wait(5), serial_key=session.id)
+    held = job_queue.submit(lambda job: None, serial_key=session.id)
+    assert session.is_busy() and not session.lock.locked()
+    with pytest.raises(SessionLimitError):
+        manager.get_or_create(manager.issue_session_id())
+    assert not manager.remove(session.id)
+
+    release.set()
+    assert running.wait(5) and held.wait(5)
+    deadline = time.time() + 5
+    while job_queue.has_pending(session.id) and time.time() < deadline:
+        time.sleep(0.01)   # 作业结束后工作线程才释放串行键
+    subscription = session.orchestrator.event_bus.subscribe()
+    assert session.is_busy()
+    subscription.close()
+    assert not session.is_busy()
+    assert manager.get_or_create(manager.issue_session_id()).id != session.id
+
+
+def test_session_issuance_is_rate_limited_per_client(stub_ai):
+    manager = _manager(stub_ai, session_issue_rate=0.001, session_issue_burst=2)
+    assert all(manager.issue_session_id(client="a") for _ in range(2))
+    assert manager.issue_session_id(client="a") is None
+    assert manager.issue_session_id(client="b") is not None
+    assert all(_manager(stub_ai, session_issue_rate=None).issue_session_id(client="a") for _ in range(10))
+
+
+def test_api_issues_and_validates_session_ids():
+    from presentation.api import app
+
+    client = app.test_client()
+    session_id = client.post("/api/session").get_json()["session_id"]
+    assert client.get("/api/status", headers={"X-Session-Id": session_id}).status_code == 200
+    assert client.get("/api/status", query_string={"session_id": session_id}).status_code == 200
+    assert client.get("/api/status", headers={"X-Session-Id": "made-up"}).status_code == 404
+    assert client.get("/api/status").status_code == 200
+    # 不提供列出会话（及其ID）的接口，持有会话ID即可访问该会话
+    assert client.get("/api/sessions").status_code == 404
+
+
+def test_ui_session_flow():
+    from presentation.api import app
+
+    client = app.test_client()
+    page = client.get("/").get_data(as_text=True)
+    assert "crypto.randomUUID" not in page and "/session`, { method: 'POST' }" in page
+
+    # 页面自行生成的ID被所有接口拒绝，并带有页面用来重新申请会话的错误码
+    made_up = "0f8fad5b-d9cb-469f-a165-70867728950e"
+    for response in (client.get("/api/status", headers={"X-Session-Id": made_up}),
+                     client.get("/api/events", query_string={"session_id": made_up}),
+                     client.post("/api/update-goal", json={"goal": "目标"}, headers={"X-Session-Id": made_up})):
+        assert response.status_code == 404 and response.get_json()["error"] == "invalid_session"
+
+    # 申请会话ID后，状态查询与事件流都使用它
+    session_id = client.post("/api/session").get_json()["session_id"]
+    status = client.get("/api/status", headers={"X-Session-Id": session_id}).get_json()
+    assert status["session_id"] == session_id
+    events = client.get("/api/events", query_string={"session_id": session_id}, buffered=False)
+    assert events.status_code == 200 and next(events.response) == b"retry: 3000\n\n"
+    events.close()
@@ -0,0 +1,112 @@
+"""
+单飞合并测试
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from infrastructure.ai_service import AIConfig, AIService
+from infrastructure.single_flight import SingleFlight
+
+
+def test_concurrent_calls_are_coalesced():
+    single_flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+        return "结果"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(single_flight.do("key", fn)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    while single_flight.get_stats()["coalesced"] < 4:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(coalesced for _, coalesced in results) == [False, True, True, True, True]
+    assert all(result == "结果" for result, _ in results)
+    assert single_flight.get_stats() == {"executed": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_sequential_calls_are_not_coalesced():
+    single_flight = SingleFlight()
+    assert single_flight.do("key", lambda: 1) == (1, False)
+    assert single_flight.do("key", lambda: 2) == (2, False)
+
+
+def test_error_is_shared_and_key_released():
+    single_flight = SingleFlight()
+
+    def fail():
+        raise ValueError("失败")
+
+    with pytest.raises(ValueError):
+        single_flight.do("key", fail)
+    assert single_flight.do("key", lambda: "恢复") == ("恢复", False)
+
+
+def test_async_calls_are_coalesced():
+    single_flight = SingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "结果"
+
+    async def run():
+        return await asyncio.gather(*(single_flight.do_async("key", fn) for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert [coalesced for _, coalesced in results] == [False, True, True]
+
+
+def test_cancelled_waiter_does_not_cancel_leader():
+    single_flight = SingleFlight()
+
+    async def fn():
+        await asyncio.sleep(0.05)
+        return "结果"
+
+    async def run():
+        leader = asyncio.ensure_future(single_flight.do_async("key", fn))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(single_flight.do_async("key", fn))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        return await leader
+
+    assert asyncio.run(run()) == ("结果", False)
+
+
+def test_ai_service_coalesces_identical_in_flight_requests(completion_server):
+    def slow_echo(payload):
+        time.sleep(0.2)
+        return 200, {"choices": [{"text": "慢回复"}], "usage": {"total_tokens": 5}}
+
+    completion_server.responder = slow_echo
+    service = AIService(AIConfig(base_url=completion_server.url, model="m", api_key="k"))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.generate("相同的问题"))) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(completion_server.requests) == 1
+    assert sorted(bool(result.get("coalesced")) for result in results) == [False, True, True]
+    # token只由执行者计入一次
+    assert service.get_total_tokens() == 5
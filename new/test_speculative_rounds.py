@@ -0,0 +1,77 @@
+"""
+推测执行下一轮意见测试
+"""
+import asyncio
+
+from application.round_policy import FixedRoundPolicy
+from application.workflow_engine import WorkflowEngine
+from domain.agent import Agent
+from domain.discussion import Discussion
+
+
+def _agents():
+    return [Agent(id="a1", name="Alice", role="产品经理"), Agent(id="a2", name="Bob", role="工程师")]
+
+
+def _reply(consensus):
+    def reply(prompt):
+        if "判断是否达成共识" in prompt:
+            return consensus
+        if "强制" in prompt or "总结" in prompt:
+            return "最终共识"
+        return f"意见{len(prompt)}"
+    return reply
+
+
+def _run(stub_ai, speculative, parallel, max_rounds=2, stream_callback=None):
+    engine = WorkflowEngine(None, stub_ai, parallel_rounds=parallel, speculative_rounds=speculative,
+                            precheck_consensus=False, summary_memory=False,
+                            round_policy=FixedRoundPolicy(check_from_round=1))
+    discussion = Discussion(id="d", topic="主题", max_rounds=max_rounds)
+    asyncio.run(engine.arun_discussion_with_callback(discussion, _agents(), stream_callback=stream_callback))
+    return discussion
+
+
+def _opinion_prompts(stub_ai, round_number):
+    return [prompt for prompt in stub_ai.sync.prompts("discussion") if f"当前轮次：第 {round_number} 轮" in prompt]
+
+
+def _record(discussion):
+    return [(msg.agent_name, msg.round, msg.content) for msg in discussion.messages]
+
+
+def test_parallel_speculation_is_adopted_without_duplicate_calls(stub_ai):
+    stub_ai.sync.reply = _reply("未达成共识")
+    discussion = _run(stub_ai, speculative=True, parallel=True)
+    # 第2轮的意见在第1轮判断共识时已提前生成并被直接采用
+    assert len(_opinion_prompts(stub_ai, 2)) == 2
+    assert [msg.round for msg in discussion.messages] == [1, 1, 2, 2]
+
+    stub_ai.sync.calls.clear()
+    baseline = _run(stub_ai, speculative=False, parallel=True)
+    assert _record(discussion) == _record(baseline)
+
+
+def test_speculation_is_cancelled_when_consensus_is_reached(stub_ai):
+    stub_ai.sync.reply = _reply("共识内容")
+    stub_ai.delay = lambda prompt: 0.3 if "当前轮次：第 2 轮" in prompt else 0
+    discussion = _run(stub_ai, speculative=True, parallel=True, max_rounds=3)
+    assert discussion.consensus == "共识内容"
+    assert _opinion_prompts(stub_ai, 2) == []
+    assert [msg.round for msg in discussion.messages] == [1, 1]
+
+
+def test_sequential_speculation_streams_first_agent(stub_ai):
+    stub_ai.sync.reply = _reply("未达成共识")
+    deltas = []
+    discussion = _run(stub_ai, speculative=True, parallel=False,
+                      stream_callback=lambda d, message, delta: deltas.append((message.round, message.agent_name)))
+    # 顺序模式只提前生成第一个Agent的意见，第二个Agent的提示词依赖同一轮前面的意见
+    assert len(_opinion_prompts(stub_ai, 2)) == 2
+    # 提前生成期间缓存的增量在采用时补发给流式回调
+    assert deltas.count((2, "Alice")) == 2 and deltas.count((2, "Bob")) == 2
+    assert not any(msg.streaming for msg in discussion.messages)
+
+    stub_ai.sync.calls.clear()
+    assert _record(discussion) == _record(_run(stub_ai, speculative=False, parallel=False,
+                                               stream_callback=lambda d, message, delta: None))
@@ -0,0 +1,171 @@
+"""
+SQLite状态存储后端测试
+"""
+import time
+
+import pytest
+
+from domain.agent import Agent
+from domain.consensus import Consensus
+from domain.discussion import Discussion
+from domain.plan import Plan
+from domain.task import Task
+from domain.team import Team
+from infrastructure.state_backend import SQLiteStateBackend, StateBackend
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "state.db")
+
+
+def _backend(path, **kwargs):
+    # 较长的写入间隔，由测试显式调用flush
+    kwargs.setdefault("flush_interval", 60)
+    return SQLiteStateBackend(path, **kwargs)
+
+
+def _plan():
+    plan = Plan(id="p", goal="目标", consensus=Consensus(content="共识", discussion_id="d"))
+    for task_id in ("a", "b"):
+        task = Task(id=task_id, description=f"任务{task_id}")
+        task.assign_to("alice", "Alice")
+        plan.add_task(task)
+    return plan
+
+
+def test_state_backend_is_abstract():
+    with pytest.raises(TypeError):
+        StateBackend()
+
+
+def test_round_trip_with_incremental_saves(db_path):
+    backend = _backend(db_path)
+    team = Team(id="t", name="团队")
+    team.add_agent(Agent(id="a1", name="Alice", role="产品经理"))
+    backend.save_team("s", team)
+
+    discussion = Discussion(id="d", topic="主题", max_rounds=3)
+    first = discussion.add_message("a1", "Alice", "第一条")
+    backend.save_discussion("s", discussion)
+    backend.flush()
+    discarded = discussion.add_message("a1", "Alice", "将被丢弃")
+    discussion.add_message("a1", "Alice", "第二条")
+    backend.save_discussion("s", discussion)
+    discussion.discard_message(discarded)
+    backend.save_discussion("s", discussion)
+
+    plan = _plan()
+    backend.save_plan("s", plan)
+    backend.flush()
+    plan.get_task("b").set_result("结果b")
+    backend.save_plan("s", plan)
+    backend.set_current("s", "discussion", "d")
+    backend.set_current("s", "plan", "p")
+    backend.close()
+
+    reopened = _backend(db_path)
+    assert reopened.load_team("t").get_agent("a1").name == "Alice"
+    loaded = reopened.load_discussion("d")
+    assert [message.content for message in loaded.messages] == ["第一条", "第二条"]
+    assert loaded.messages[0].id == first.id and loaded.version == discussion.version
+    loaded_plan = reopened.load_plan("p")
+    assert [task.id for task in loaded_plan.tasks] == ["a", "b"]
+    assert loaded_plan.get_task("b").result == "结果b"
+    assert loaded_plan.get_version() == plan.get_version()
+    assert reopened.load_current("s") == {"discussion": "d", "plan": "p"}
+    assert reopened.list_ids("s", "plan") == ["p"]
+    assert reopened.load_plan("missing") is None
+    reopened.close()
+
+
+def test_saves_of_same_object_are_merged(db_path):
+    backend = _backend(db_path)
+    discussion = Discussion(id="d", topic="主题", max_rounds=3)
+    for n in range(5):
+        discussion.add_message("a1", "Alice", f"消息{n}")
+        backend.save_discussion("s", discussion)
+    backend.flush()
+    stats = backend.get_stats()
+    assert stats["saves"] == 5 and stats["aggregates_written"] == 1 and stats["rows_written"] == 5
+
+    # 已写入的消息不再重复写入
+    discussion.add_message("a1", "Alice", "新消息")
+    backend.save_discussion("s", discussion)
+    backend.flush()
+    assert backend.get_stats()["rows_written"] == 6
+    backend.close()
+
+
+def test_failed_write_keeps_changes_for_retry(db_path, monkeypatch):
+    backend = _backend(db_path)
+    plan = _plan()
+    backend.save_plan("s", plan)
+    backend.set_current("s", "plan", "p")
+
+    def failing_write(*args):
+        raise OSError("磁盘已满")
+
+    write = backend._write
+    monkeypatch.setattr(backend, "_write", failing_write)
+    with pytest.raises(OSError):
+        backend.flush()
+    assert backend.get_stats()["flush_errors"] == 1 and backend.get_stats()["pending"] == 1
+
+    # 失败期间的新变化与放回的变化合并，之后的增量保存不会遗漏失败批次中的任务
+    plan.get_task("a").set_result("结果a")
+    backend.save_plan("s", plan)
+    monkeypatch.setattr(backend, "_write", write)
+    backend.flush()
+    backend.close()
+
+    reopened = _backend(db_path)
+    loaded = reopened.load_plan("p")
+    assert [task.id for task in loaded.tasks] == ["a", "b"]
+    assert loaded.get_task("a").result == "结果a"
+    assert reopened.load_current("s") == {"plan": "p"}
+    reopened.close()
+
+
+def test_flusher_survives_write_errors(db_path, monkeypatch):
+    backend = _backend(db_path, flush_interval=0.01)
+    write = backend._write
+    failures = []
+
+    def flaky_write(*args):
+        if not failures:
+            failures.append(True)
+            raise OSError("数据库被锁定")
+        return write(*args)
+
+    monkeypatch.setattr(backend, "_write", flaky_write)
+    backend.save_team("s", Team(id="t", name="团队"))
+    deadline = time.time() + 5
+    while backend.get_stats()["flushes"] == 0 and time.time() < deadline:
+        time.sleep(0.01)
+    assert failures and backend.get_stats()["flush_errors"] == 1
+    assert backend._flusher.is_alive() and backend.get_stats()["flushes"] == 1
+    backend.close()
+
+
+def test_tracked_versions_are_bounded(db_path):
+    backend = _backend(db_path, max_tracked_versions=2)
+    discussions = []
+    for n in range(4):
+        discussion = Discussion(id=f"d{n}", topic="主题", max_rounds=3)
+        discussion.add_message("a1", "Alice", "消息")
+        backend.save_discussion("s", discussion)
+        backend.flush()
+        discussions.append(discussion)
+    assert list(backend._saved_versions) == [("discussion", "d2"), ("discussion", "d3")]
+
+    # 仍记录版本号的对象只写入变化，被淘汰的对象下次保存时写入完整状态
+    rows_before = backend.get_stats()["rows_written"]
+    backend.save_discussion("s", discussions[3])
+    backend.flush()
+    assert backend.get_stats()["rows_written"] == rows_before
+    backend.save_discussion("s", discussions[0])
+    backend.flush()
+    assert backend.get_stats()["rows_written"] == rows_before + 1
+    assert list(backend._saved_versions) == [("discussion", "d3"), ("discussion", "d0")]
+    backend.close()
@@ -0,0 +1,101 @@
+"""
+状态版本、ETag与增量查询测试
+"""
+from application.team_orchestrator import TeamOrchestrator
+from domain.consensus import Consensus
+from domain.discussion import Discussion
+from domain.plan import Plan
+from domain.task import Task
+
+
+def _orchestrator(stub_ai):
+    orchestrator = TeamOrchestrator(ai_service=stub_ai.sync, async_ai_service=stub_ai)
+    discussion = Discussion(id="d", topic="主题")
+    discussion.add_message("a1", "Alice", "第一条")
+    plan = Plan(id="p", goal="目标", consensus=Consensus(content="共识", discussion_id="d"))
+    for task_id in ("t1", "t2"):
+        plan.add_task(Task(id=task_id, description=f"任务{task_id}"))
+    orchestrator.state_store.save_discussion(discussion)
+    orchestrator.state_store.save_plan(plan)
+    return orchestrator, discussion, plan
+
+
+def test_etag_is_stable_until_state_changes(stub_ai):
+    orchestrator, discussion, plan = _orchestrator(stub_ai)
+    etag = orchestrator.get_status_etag()
+    assert orchestrator.get_status_etag() == etag
+    assert orchestrator.get_status_etag(since=1) != etag
+
+    discussion.add_message("a2", "Bob", "第二条")
+    assert orchestrator.get_status_etag() != etag
+    etag = orchestrator.get_status_etag()
+    plan.get_task("t1").update_progress(50)
+    assert orchestrator.get_status_etag() != etag
+    etag = orchestrator.get_status_etag()
+    orchestrator._set_stage("planning", "制定执行计划...")
+    assert orchestrator.get_status_etag() != etag
+
+
+def test_status_tokens_are_scoped_to_the_session(stub_ai):
+    orchestrator, discussion, _ = _orchestrator(stub_ai)
+    other, _, _ = _orchestrator(stub_ai)
+    etag = orchestrator.get_status_etag()
+    # 其他会话的模型调用不影响本会话的状态和ETag
+    other.ai_service.generate("其他会话的调用")
+    assert orchestrator.get_status_etag() == etag
+    assert orchestrator.get_current_status()["total_tokens"] == 0
+
+    discussion.record_tokens(30)
+    assert orchestrator.get_status_etag() != etag
+    assert orchestrator.get_current_status()["total_tokens"] == 30
+
+
+def test_etag_ignores_ai_stats_which_are_not_in_status(stub_ai):
+    orchestrator, _, _ = _orchestrator(stub_ai)
+    status = orchestrator.get_current_status()
+    assert "ai_stats" not in status
+    etag = orchestrator.get_status_etag()
+    orchestrator.get_ai_stats()
+    assert orchestrator.get_status_etag() == etag
+
+
+def test_since_returns_only_changes(stub_ai):
+    orchestrator, discussion, plan = _orchestrator(stub_ai)
+    version = orchestrator.get_current_status()["version"]
+
+    status = orchestrator.get_current_status(since=version)
+    assert status["since"] == version
+    assert "team" not in status and "discussion" not in status and "plan" not in status
+
+    message = discussion.add_message("a2", "Bob", "新消息")
+    plan.get_task("t2").update_progress(30)
+    status = orchestrator.get_current_status(since=version)
+    assert [msg["id"] for msg in status["discussion"]["messages"]] == [message.id]
+    assert [task["id"] for task in status["plan"]["tasks"]] == ["t2"]
+    assert status["version"] > version
+
+
+def test_since_lists_removed_messages(stub_ai):
+    orchestrator, discussion, _ = _orchestrator(stub_ai)
+    message = discussion.start_message("a2", "Bob")
+    version = orchestrator.get_status_version()
+    discussion.discard_message(message)
+    status = orchestrator.get_current_status(since=version)
+    assert status["discussion"]["messages"] == []
+    assert status["discussion"]["removed_message_ids"] == [message.id]
+
+
+def test_status_endpoint_returns_304_for_matching_etag():
+    from presentation.api import app, session_manager
+
+    client = app.test_client()
+    first = client.get("/api/status")
+    assert first.status_code == 200 and first.headers["ETag"]
+    cached = client.get("/api/status", headers={"If-None-Match": first.headers["ETag"]})
+    assert cached.status_code == 304 and cached.data == b""
+
+    session_manager.get_or_create("default").orchestrator._set_stage("analyzing", "分析需求，创建团队...")
+    changed = client.get("/api/status", headers={"If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200 and changed.get_json()["stage"] == "analyzing"
+    # 同步、异步服务共享同一个核心，统计合并在一起
+    assert "total_tokens" in client.get("/api/ai-stats").get_json()
@@ -0,0 +1,97 @@
+"""
+流式意见生成测试
+"""
+import asyncio
+
+from application.workflow_engine import WorkflowEngine
+from domain.agent import Agent
+from domain.discussion import Discussion
+from infrastructure.ai_service import AIConfig, AIService, BaseAIService
+from infrastructure.async_ai_service import AsyncAIService
+
+
+def test_parse_stream_line():
+    assert BaseAIService._parse_stream_line('data: {"choices": [{"text": "你"}]}') == ("你", 0, False)
+    assert BaseAIService._parse_stream_line('data: {"choices": [], "usage": {"total_tokens": 7}}') == ("", 7, False)
+    assert BaseAIService._parse_stream_line("data: [DONE]") == ("", 0, True)
+    assert BaseAIService._parse_stream_line(": keep-alive") == ("", 0, False)
+
+
+def test_ai_service_generate_stream(completion_server):
+    service = AIService(AIConfig(base_url=completion_server.url, model="m", api_key="k"))
+    deltas = []
+    result = service.generate_stream("问题", deltas.append)
+    assert deltas == ["echo:", "问题"]
+    assert result == {"text": "echo:问题", "tokens": 5, "success": True, "error": None}
+    assert completion_server.requests[0]["stream"] is True
+    assert service.get_total_tokens() == 5
+
+
+def test_async_ai_service_generate_stream(completion_server):
+    service = AsyncAIService(AIConfig(base_url=completion_server.url, model="m", api_key="k"))
+    deltas = []
+
+    async def run():
+        try:
+            return await service.generate_stream("问题", deltas.append)
+        finally:
+            await service.close()
+
+    result = asyncio.run(run())
+    assert deltas == ["echo:", "问题"]
+    assert result["text"] == "echo:问题" and result["tokens"] == 5
+
+
+def test_stream_error_before_output_is_retried(completion_server):
+    statuses = [503]
+
+    def flaky(payload):
+        if statuses:
+            return statuses.pop(), {}
+        return 200, {"pieces": ["好"], "tokens": 1}
+
+    completion_server.responder = flaky
+    service = AIService(AIConfig(base_url=completion_server.url, model="m", api_key="k",
+                                 retry_backoff_base=0.01))
+    deltas = []
+    result = service.generate_stream("问题", deltas.append)
+    assert result["success"] and deltas == ["好"]
+    assert len(completion_server.requests) == 2
+
+
+def _agents():
+    return [Agent(id="a1", name="Alice", role="产品经理"), Agent(id="a2", name="Bob", role="工程师")]
+
+
+def test_streamed_opinions_are_written_incrementally(stub_ai):
+    stub_ai.sync.reply = lambda prompt: "未达成共识" if "判断是否达成共识" in prompt else "流式意见内容"
+    engine = WorkflowEngine(None, stub_ai, precheck_consensus=False, summary_memory=False)
+    discussion = Discussion(id="d", topic="主题", max_rounds=1)
+    deltas, events = [], []
+
+    asyncio.run(engine.arun_discussion_with_callback(
+        discussion, _agents(),
+        stream_callback=lambda d, message, delta: deltas.append((message.agent_name, delta)),
+        event_callback=lambda event_type, data: events.append(event_type)
+    ))
+
+    assert deltas == [("Alice", "流式意"), ("Alice", "见内容"), ("Bob", "流式意"), ("Bob", "见内容")]
+    assert [msg.content for msg in discussion.messages] == ["流式意见内容", "流式意见内容"]
+    assert not any(msg.streaming for msg in discussion.messages)
+    assert events[:5] == ["round_started", "message_added", "message_delta", "message_delta", "message_completed"]
+
+
+def test_failed_stream_message_is_removed(stub_ai):
+    stub_ai.sync.reply = lambda prompt: None if "Bob" in prompt else "意见"
+    engine = WorkflowEngine(None, stub_ai, precheck_consensus=False, summary_memory=False)
+    discussion = Discussion(id="d", topic="主题", max_rounds=1)
+    events = []
+
+    asyncio.run(engine.arun_discussion_with_callback(
+        discussion, _agents(), stream_callback=lambda d, message, delta: None,
+        event_callback=lambda event_type, data: events.append(event_type)
+    ))
+
+    assert [msg.agent_name for msg in discussion.messages] == ["Alice"]
+    assert "message_removed" in events
+    assert len(discussion.removed_message_ids) == 1
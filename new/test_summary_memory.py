@@ -0,0 +1,66 @@
+"""
+讨论滚动摘要测试
+"""
+import asyncio
+
+from application.round_policy import FixedRoundPolicy
+from application.workflow_engine import WorkflowEngine
+from domain.agent import Agent
+from domain.discussion import Discussion
+
+SUMMARY_PROMPT = "你负责维护一场团队讨论的摘要"
+
+
+def _reply(summary="摘要内容"):
+    def reply(prompt):
+        if SUMMARY_PROMPT in prompt:
+            return summary
+        if "判断是否达成共识" in prompt:
+            return "未达成共识"
+        return "意见"
+    return reply
+
+
+def _run(stub_ai, **kwargs):
+    engine = WorkflowEngine(None, stub_ai, precheck_consensus=False, round_policy=FixedRoundPolicy(), **kwargs)
+    discussion = Discussion(id="d", topic="主题", max_rounds=2)
+    agents = [Agent(id="a1", name="Alice", role="产品经理"), Agent(id="a2", name="Bob", role="工程师")]
+    asyncio.run(engine.arun_discussion_with_callback(discussion, agents))
+    return discussion
+
+
+def test_summary_memory_is_off_by_default(stub_ai):
+    stub_ai.sync.reply = _reply()
+    discussion = _run(stub_ai)
+    assert not any(SUMMARY_PROMPT in prompt for prompt in stub_ai.sync.prompts())
+    assert (discussion.summary, discussion.summary_round) == ("", 0)
+
+
+def test_rounds_are_merged_into_summary(stub_ai):
+    stub_ai.sync.reply = _reply()
+    discussion = _run(stub_ai, summary_memory=True)
+    assert (discussion.summary, discussion.summary_round) == ("摘要内容", 2)
+
+    round_two = [prompt for prompt in stub_ai.sync.prompts() if "当前轮次：第 2 轮" in prompt]
+    assert round_two and all("前1轮讨论摘要：摘要内容" in prompt for prompt in round_two)
+    summaries = [prompt for prompt in stub_ai.sync.prompts() if SUMMARY_PROMPT in prompt]
+    # 第二次合并以第一次的摘要为基础，只包含第2轮的意见
+    assert len(summaries) == 2
+    assert "已有摘要：\n摘要内容" in summaries[1] and "（第1轮）" not in summaries[1]
+    # 强制共识只使用摘要
+    forced = [prompt for prompt in stub_ai.sync.prompts() if "团队已经讨论了" in prompt]
+    assert "讨论摘要：摘要内容" in forced[0] and "Alice：" not in forced[0]
+
+
+def test_failed_summary_keeps_messages_for_next_merge(stub_ai):
+    stub_ai.sync.reply = _reply(summary=None)
+    discussion = _run(stub_ai, summary_memory=True)
+    assert (discussion.summary, discussion.summary_round) == ("", 0)
+    summaries = [prompt for prompt in stub_ai.sync.prompts() if SUMMARY_PROMPT in prompt]
+    assert "（第1轮）" in summaries[1] and "（第2轮）" in summaries[1]
+
+
+def test_summary_is_truncated(stub_ai):
+    stub_ai.sync.reply = _reply(summary="长" * 1000)
+    discussion = _run(stub_ai, summary_memory=True)
+    assert len(discussion.summary) == WorkflowEngine.SUMMARY_MAX_CHARS
@@ -0,0 +1,139 @@
+"""
+任务调度器测试
+"""
+import asyncio
+
+import pytest
+
+from application.task_scheduler import TaskScheduler
+from domain.task import Task
+
+
+def _task(task_id, depends_on=(), assignee="Alice"):
+    task = Task(id=task_id, description=f"任务{task_id}", depends_on=list(depends_on))
+    task.assign_to(assignee, assignee)
+    return task
+
+
+def _diamond():
+    # a → b、c → d，另有独立的e
+    return [_task("d", ["b", "c"]), _task("b", ["a"]), _task("c", ["a"]), _task("a"), _task("e")]
+
+
+def test_topological_order_respects_dependencies():
+    order = [task.id for task in TaskScheduler.topological_order(_diamond())]
+    assert sorted(order) == ["a", "b", "c", "d", "e"]
+    assert order.index("a") < order.index("b") < order.index("d")
+    assert order.index("c") < order.index("d")
+
+
+def test_dependencies_outside_scope_are_ignored():
+    order = TaskScheduler.topological_order([_task("b", ["missing"]), _task("c", ["b"])])
+    assert [task.id for task in order] == ["b", "c"]
+
+
+def test_cycle_raises_value_error():
+    with pytest.raises(ValueError, match="循环"):
+        TaskScheduler.topological_order([_task("a", ["c"]), _task("b", ["a"]), _task("c", ["b"])])
+
+
+def test_critical_path_lengths():
+    assert TaskScheduler.critical_path_lengths(_diamond()) == {"a": 3, "b": 2, "c": 2, "d": 1, "e": 1}
+
+
+class _Recorder:
+    """记录任务的开始、结束顺序和并发数"""
+
+    def __init__(self, fail=(), delay=0.01):
+        self.fail = set(fail)
+        self.delay = delay
+        self.events = []
+        self.upstream = {}
+        self.skipped = {}
+        self.active = 0
+        self.peak = 0
+
+    async def run(self, task, upstream):
+        self.events.append(("start", task.id))
+        self.upstream[task.id] = sorted(t.id for t in upstream)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        self.events.append(("end", task.id))
+        if task.id in self.fail:
+            return False
+        task.set_result(f"结果{task.id}")
+        return True
+
+    def skip(self, task, failed_upstream):
+        self.skipped[task.id] = sorted(t.id for t in failed_upstream)
+
+    def index(self, kind, task_id):
+        return self.events.index((kind, task_id))
+
+
+def test_dependents_start_after_dependencies_finish():
+    recorder = _Recorder()
+    results = asyncio.run(TaskScheduler(max_concurrency=4).run(_diamond(), recorder.run, recorder.skip))
+    assert results == dict.fromkeys("abcde", True)
+    assert recorder.index("end", "a") < recorder.index("start", "b")
+    assert recorder.index("end", "b") < recorder.index("start", "d")
+    assert recorder.index("end", "c") < recorder.index("start", "d")
+    assert recorder.upstream["d"] == ["b", "c"]
+
+
+def test_longest_chain_starts_first_and_concurrency_is_capped():
+    recorder = _Recorder()
+    asyncio.run(TaskScheduler(max_concurrency=1).run(_diamond(), recorder.run, recorder.skip))
+    assert recorder.peak == 1
+    # 只有一个名额时先执行关键路径最长的a，独立的e排在最后
+    assert [task_id for kind, task_id in recorder.events if kind == "start"] == ["a", "b", "c", "d", "e"]
+
+
+def test_per_assignee_limit():
+    tasks = [_task(str(n), assignee="Alice") for n in range(3)] + [_task("x", assignee="Bob")]
+    recorder = _Recorder()
+    asyncio.run(TaskScheduler(max_concurrency=4, max_per_assignee=1).run(tasks, recorder.run, recorder.skip))
+    assert recorder.peak == 2
+    assert recorder.index("end", "0") < recorder.index("start", "1")
+
+
+def test_failed_task_skips_transitive_dependents():
+    tasks = [_task("a"), _task("b", ["a"]), _task("c", ["b"]), _task("d")]
+    recorder = _Recorder(fail={"a"})
+    results = asyncio.run(TaskScheduler().run(tasks, recorder.run, recorder.skip))
+    assert results == {"a": False, "b": False, "c": False, "d": True}
+    assert recorder.skipped == {"b": ["a"], "c": ["b"]}
+    assert ("start", "b") not in recorder.events
+
+
+def test_results_of_tasks_outside_scope_are_passed_upstream():
+    done = _task("done")
+    done.set_result("已有结果")
+    rerun = _task("rerun", ["done"])
+    recorder = _Recorder()
+    asyncio.run(TaskScheduler().run([rerun], recorder.run, recorder.skip, all_tasks=[done, rerun]))
+    assert recorder.upstream["rerun"] == ["done"]
+
+
+def test_error_cancels_running_tasks():
+    cancelled = []
+
+    async def run(task, upstream):
+        if task.id == "boom":
+            raise RuntimeError("执行出错")
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(task.id)
+            raise
+        return True
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await TaskScheduler().run([_task("slow"), _task("boom")], run, lambda task, failed: None)
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert cancelled == ["slow"]